@@ -1,22 +1,531 @@
+import asyncio
+import hashlib
 import json
-from typing import Any, Optional
+import os
+import struct
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
+import orjson
 from redis.asyncio import Redis
-from fastapi.encoders import jsonable_encoder  # ✅ 新增
+
+from .metrics import record_cache
+
+CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", "30"))
+# 硬过期：超过软过期但未到硬过期的缓存先返回旧值、后台刷新
+CACHE_HARD_TTL_SECONDS = int(os.environ.get(
+    "CACHE_HARD_TTL_SECONDS", str(CACHE_TTL_SECONDS * 10)))
+
+# 按 cache_prefix 配置 (软TTL, 硬TTL)，最长前缀匹配
+# 缓存键里带了数据表的 generation，导入即失效，历史版本数据可以缓存很久
+# 环境变量 CACHE_TTLS 覆盖/追加，格式：home=300/86400,scene:latest=30/300
+CACHE_TTLS: Dict[str, Tuple[int, int]] = {
+    "home": (86400, 7 * 86400),
+    "scene:multi_version": (86400, 7 * 86400),
+}
+for _item in os.environ.get("CACHE_TTLS", "").split(","):
+    if "=" in _item:
+        _prefix, _ttls = _item.split("=", 1)
+        _soft, _, _hard = _ttls.partition("/")
+        CACHE_TTLS[_prefix.strip()] = (int(_soft), int(_hard or _soft))
+
+# 序列化后超过该字节数的缓存值做 zlib 压缩
+CACHE_COMPRESS_MIN_BYTES = int(os.environ.get("CACHE_COMPRESS_MIN_BYTES", "4096"))
+CACHE_COMPRESS_LEVEL = int(os.environ.get("CACHE_COMPRESS_LEVEL", "1"))
+
+# 缓存值格式：1 字节编码标记 + 8 字节软过期时间戳 + orjson 正文（可能压缩）
+_ENTRY_HEADER = struct.Struct(">cd")
+_CODEC_JSON = b"J"
+_CODEC_ZLIB = b"Z"
+
+# 进程内一级缓存（在 Redis 之前）：按 JSON 字节数计的容量上限、单条上限
+CACHE_LOCAL_MAX_BYTES = int(os.environ.get("CACHE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_LOCAL_MAX_ITEM_BYTES = int(os.environ.get(
+    "CACHE_LOCAL_MAX_ITEM_BYTES", str(CACHE_LOCAL_MAX_BYTES // 8)))
+# 进程内记住 generation 的时间；正常靠 pub/sub 即时失效，这里只是兜底
+CACHE_GEN_LOCAL_TTL_MS = int(os.environ.get("CACHE_GEN_LOCAL_TTL_MS", "1000"))
+# generation 变更广播频道
+GENERATION_CHANNEL = "cache:gen"
+
+# 跨 worker 的计算锁租期：持锁者挂掉后最多这么久其它 worker 会自己算
+CACHE_LOCK_LEASE_MS = int(os.environ.get("CACHE_LOCK_LEASE_MS", "5000"))
+# 未拿到锁时轮询缓存的间隔
+CACHE_LOCK_POLL_MS = int(os.environ.get("CACHE_LOCK_POLL_MS", "50"))
+
+# 只有持锁者（token 一致）才能删除锁
+_UNLOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# 本进程内正在计算的 key -> Task，同 key 的并发请求共享同一个结果
+_inflight: Dict[str, "asyncio.Task[Any]"] = {}
+# 后台刷新任务的引用，防止被 GC
+_background: Set["asyncio.Task[Any]"] = set()
+
+# 请求要求读最新数据（X-Read-Latest，见 db.READ_LATEST_HEADER）：不读缓存、不共享别的请求的计算，
+# 直接查主库，结果照常写回缓存
+read_latest: ContextVar[bool] = ContextVar("read_latest", default=False)
+# 本进程记住的 generation：namespace -> (value, 读取时间)
+_local_generations: Dict[str, Tuple[int, float]] = {}
+# 本进程最近一次得知 generation 变化的时间（time.time()），进程启动时视为刚变化过
+_generations_changed_at = time.time()
+
+
+class LocalCache:
+    """
+    进程内 LRU 缓存，存 JSON bytes 与软过期时间，按字节数淘汰
+
+    只返回软TTL内的条目；过了软TTL交给 Redis 层处理 stale-while-revalidate
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.size = 0
+        self._items: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        body, soft_expire = item
+        if time.time() >= soft_expire:
+            self.pop(key)
+            return None
+        self._items.move_to_end(key)
+        return body
+
+    def set(self, key: str, body: bytes, soft_expire: float) -> None:
+        if len(body) > self.max_item_bytes:
+            return
+        self.pop(key)
+        self._items[key] = (body, soft_expire)
+        self.size += len(body)
+        while self.size > self.max_bytes and self._items:
+            _, (old, _) = self._items.popitem(last=False)
+            self.size -= len(old)
+
+    def pop(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.size -= len(item[0])
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.size = 0
+
+
+local_cache = LocalCache(CACHE_LOCAL_MAX_BYTES, CACHE_LOCAL_MAX_ITEM_BYTES)
+
+
+def cache_ttls(cache_prefix: str) -> Tuple[int, int]:
+    """返回 cache_prefix 对应的 (软TTL, 硬TTL)"""
+    best = None
+    for prefix in CACHE_TTLS:
+        if cache_prefix == prefix or cache_prefix.startswith(prefix + ":"):
+            if best is None or len(prefix) > len(best):
+                best = prefix
+    if best is None:
+        return CACHE_TTL_SECONDS, max(CACHE_HARD_TTL_SECONDS, CACHE_TTL_SECONDS)
+    return CACHE_TTLS[best]
+
+
+def generation_key(namespace: str) -> str:
+    """namespace 形如 stop_bar_detail:x86，每次导入该表时 +1"""
+    return f"gen:{namespace}"
+
+
+async def cache_generations(r: Redis, namespaces: Sequence[str]) -> List[int]:
+    """
+    读取各 namespace 当前的 generation，未导入过为 0
+
+    优先用进程内记住的值（由 listen_generations 收到广播时清掉），避免每次请求都访问 Redis
+    """
+    if not namespaces:
+        return []
+    now = time.monotonic()
+    ttl = CACHE_GEN_LOCAL_TTL_MS / 1000
+    missing = [ns for ns in namespaces
+               if ns not in _local_generations or now - _local_generations[ns][1] >= ttl]
+    if missing:
+        values = await r.mget([generation_key(ns) for ns in missing])
+        for ns, v in zip(missing, values):
+            value = int(v) if v else 0
+            if ns in _local_generations and _local_generations[ns][0] != value:
+                _mark_generations_changed()
+            _local_generations[ns] = (value, now)
+    return [_local_generations[ns][0] for ns in namespaces]
+
+
+def _mark_generations_changed() -> None:
+    global _generations_changed_at
+    _generations_changed_at = time.time()
+
+
+def generations_changed_at() -> float:
+    """
+    本进程最近一次得知数据导入（generation 变化）的时间
+
+    只读副本回放到这个时间之后才会被使用，见 db.ReplicaSet
+    """
+    return _generations_changed_at
+
+
+async def bump_generations(r: Redis, namespaces: Iterable[str]) -> None:
+    """数据导入提交后调用：递增 generation 并广播，旧键自然失效"""
+    async with r.pipeline(transaction=False) as pipe:
+        for ns in namespaces:
+            pipe.incr(generation_key(ns))
+            pipe.publish(GENERATION_CHANNEL, ns)
+        await pipe.execute()
+
+
+async def listen_generations(r: Redis) -> None:
+    """
+    订阅 generation 广播：清掉进程内记住的 generation，下次请求重新读取，
+    一级缓存里旧 generation 的键随之不可达，按 LRU 淘汰
+    """
+    pubsub = r.pubsub()
+    await pubsub.subscribe(GENERATION_CHANNEL)
+    try:
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            ns = message["data"]
+            _local_generations.pop(ns.decode() if isinstance(ns, bytes) else ns, None)
+            _mark_generations_changed()
+    finally:
+        await pubsub.unsubscribe(GENERATION_CHANNEL)
+        await pubsub.close()
 
 
 def stable_dumps(obj: Any) -> str:
-    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    # default=str：参数里可能带 datetime（如 od_minute）
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
 
 
-async def cache_get(r: Redis, key: str) -> Optional[Any]:
+def cache_key_digest(cache_prefix: str, key_data: Any) -> str:
+    """缓存键 = 前缀 + key_data 稳定序列化后的短摘要，避免把整段 SQL 存进 Redis"""
+    digest = hashlib.blake2b(stable_dumps(key_data).encode(), digest_size=16).hexdigest()
+    return f"{cache_prefix}:{digest}"
+
+
+def _json_default(o: Any) -> Any:
+    # asyncpg 的 NUMERIC 是 Decimal：与 jsonable_encoder 一致，整数转 int，其余转 float
+    # NaN / Infinity 的 exponent 是字符串，JSON 里也没有对应的值，输出 null
+    if isinstance(o, Decimal):
+        if not o.is_finite():
+            return None
+        return int(o) if o.as_tuple().exponent >= 0 else float(o)
+    raise TypeError(f"Type is not JSON serializable: {type(o).__name__}")
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """payload -> JSON bytes（orjson，Decimal / datetime 均可）"""
+    return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def encode_entry(body: bytes, soft_expire: float) -> bytes:
+    """JSON bytes -> Redis 中的缓存值"""
+    codec = _CODEC_JSON
+    if len(body) >= CACHE_COMPRESS_MIN_BYTES:
+        body = zlib.compress(body, CACHE_COMPRESS_LEVEL)
+        codec = _CODEC_ZLIB
+    return _ENTRY_HEADER.pack(codec, soft_expire) + body
+
+
+def decode_entry(raw: bytes) -> Optional[Tuple[bytes, float]]:
+    """返回 (JSON bytes, 软过期时间戳)，无法识别的旧格式返回 None"""
+    if len(raw) < _ENTRY_HEADER.size:
+        return None
+    codec, soft_expire = _ENTRY_HEADER.unpack_from(raw)
+    body = raw[_ENTRY_HEADER.size:]
+    if codec == _CODEC_ZLIB:
+        return zlib.decompress(body), soft_expire
+    if codec == _CODEC_JSON:
+        return body, soft_expire
+    return None
+
+
+async def _get_body(r: Redis, key: str) -> Optional[Tuple[bytes, float]]:
     v = await r.get(key)
     if not v:
         return None
-    return json.loads(v)
+    return decode_entry(v)
+
+
+async def _set_body(
+    r: Optional[Redis],
+    key: str,
+    body: bytes,
+    ttls: Tuple[int, int],
+) -> None:
+    """同时写一级缓存与 Redis；没有 Redis 时不缓存（见 cache_get_or_compute_bytes）"""
+    if r is None:
+        return
+    soft_ttl, hard_ttl = ttls
+    soft_expire = time.time() + soft_ttl
+    local_cache.set(key, body, soft_expire)
+    await r.set(key, encode_entry(body, soft_expire), ex=hard_ttl)
+
+
+async def cache_get_bytes(r: Optional[Redis], key: str) -> Optional[bytes]:
+    """只读：返回软TTL内的缓存 bytes（先一级缓存后 Redis），不触发计算"""
+    if read_latest.get():
+        record_cache(key, "bypass")
+        return None
+    if r is None:
+        record_cache(key, "miss")
+        return None
+    body = local_cache.get(key)
+    if body is not None:
+        record_cache(key, "local_hit")
+        return body
+    entry = await _get_body(r, key)
+    if entry is None or time.time() >= entry[1]:
+        record_cache(key, "miss")
+        return None
+    record_cache(key, "hit")
+    local_cache.set(key, *entry)
+    return entry[0]
+
+
+async def cache_set_bytes(
+    r: Optional[Redis],
+    key: str,
+    body: bytes,
+    ttls: Tuple[int, int],
+) -> None:
+    """写入已编码好的 bytes（两级缓存）"""
+    await _set_body(r, key, body, ttls)
+
+
+async def cache_get_many_bytes(r: Optional[Redis], keys: Sequence[str]) -> List[Optional[bytes]]:
+    """批量只读：同 cache_get_bytes，一级缓存未命中的 key 用一次 MGET 取回"""
+    if read_latest.get():
+        for key in keys:
+            record_cache(key, "bypass")
+        return [None] * len(keys)
+    if r is None:
+        for key in keys:
+            record_cache(key, "miss")
+        return [None] * len(keys)
+    bodies = [local_cache.get(key) for key in keys]
+    missing = [i for i, body in enumerate(bodies) if body is None]
+    for i, body in enumerate(bodies):
+        if body is not None:
+            record_cache(keys[i], "local_hit")
+    raws = await r.mget([keys[i] for i in missing]) if missing else []
+    now = time.time()
+    for i, raw in zip(missing, raws):
+        entry = decode_entry(raw) if raw else None
+        if entry is not None and now < entry[1]:
+            record_cache(keys[i], "hit")
+            local_cache.set(keys[i], *entry)
+            bodies[i] = entry[0]
+        else:
+            record_cache(keys[i], "miss")
+    return bodies
+
+
+async def cache_set_many_bytes(
+    r: Optional[Redis],
+    items: Sequence[Tuple[str, bytes]],
+    ttls: Tuple[int, int],
+) -> None:
+    """批量写入已编码好的 bytes（两级缓存），Redis 用一次 pipeline；没有 Redis 时不缓存"""
+    if r is None or not items:
+        return
+    soft_ttl, hard_ttl = ttls
+    soft_expire = time.time() + soft_ttl
+    for key, body in items:
+        local_cache.set(key, body, soft_expire)
+    async with r.pipeline(transaction=False) as pipe:
+        for key, body in items:
+            pipe.set(key, encode_entry(body, soft_expire), ex=hard_ttl)
+        await pipe.execute()
+
+
+async def cache_get_entry(r: Redis, key: str) -> Optional[Tuple[Any, bool]]:
+    """返回 (value, 是否仍在软TTL内)，不存在返回 None"""
+    entry = await _get_body(r, key)
+    if entry is None:
+        return None
+    body, soft_expire = entry
+    return orjson.loads(body), time.time() < soft_expire
+
+
+async def cache_get(r: Redis, key: str) -> Optional[Any]:
+    entry = await cache_get_entry(r, key)
+    return None if entry is None else entry[0]
+
+
+async def cache_set(
+    r: Redis,
+    key: str,
+    value: Any,
+    ttl_seconds: int,
+    soft_ttl_seconds: Optional[int] = None,
+) -> None:
+    soft = ttl_seconds if soft_ttl_seconds is None else soft_ttl_seconds
+    await _set_body(r, key, dumps_bytes(value), (soft, ttl_seconds))
+
+
+async def cache_lock(r: Redis, key: str, lease_ms: int = CACHE_LOCK_LEASE_MS) -> Optional[str]:
+    """尝试获取 key 的计算锁，成功返回 token，失败返回 None"""
+    token = uuid.uuid4().hex
+    ok = await r.set(f"lock:{key}", token, nx=True, px=lease_ms)
+    return token if ok else None
+
+
+async def cache_unlock(r: Redis, key: str, token: str) -> None:
+    await r.eval(_UNLOCK_SCRIPT, 1, f"lock:{key}", token)
+
+
+async def _compute_body(
+    r: Optional[Redis],
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttls: Tuple[int, int],
+) -> bytes:
+    value = await compute()
+    # compute 可以直接返回已编码好的 bytes（如 arrow），否则按 JSON 序列化
+    body = value if isinstance(value, bytes) else dumps_bytes(value)
+    await _set_body(r, key, body, ttls)
+    return body
+
+
+async def _load_or_compute(
+    r: Optional[Redis],
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttls: Tuple[int, int],
+) -> bytes:
+    if r is None:
+        return await _compute_body(r, key, compute, ttls)
+
+    token = await cache_lock(r, key)
+    if token is None:
+        # 其它 worker 正在算：在租期内等它写回缓存，超时则自己算
+        deadline = time.monotonic() + CACHE_LOCK_LEASE_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_LOCK_POLL_MS / 1000)
+            entry = await _get_body(r, key)
+            if entry is not None:
+                local_cache.set(key, *entry)
+                return entry[0]
+    else:
+        # 拿到锁后再查一次，避免刚好有人写完
+        entry = await _get_body(r, key)
+        if entry is not None and time.time() < entry[1]:
+            await cache_unlock(r, key, token)
+            local_cache.set(key, *entry)
+            return entry[0]
+
+    try:
+        return await _compute_body(r, key, compute, ttls)
+    finally:
+        if token is not None:
+            await cache_unlock(r, key, token)
+
+
+async def _revalidate(
+    r: Redis,
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttls: Tuple[int, int],
+) -> None:
+    """后台刷新过了软TTL的缓存；拿不到锁说明别的 worker 在刷，直接放弃"""
+    token = await cache_lock(r, key)
+    if token is None:
+        return
+    try:
+        await _compute_body(r, key, compute, ttls)
+    except Exception:
+        # 刷新失败时继续使用旧值，直到硬TTL过期后由请求路径重新计算
+        pass
+    finally:
+        await cache_unlock(r, key, token)
+
+
+def _single_flight(key: str, make: Callable[[], Awaitable[Any]]) -> "asyncio.Task[Any]":
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return task
+
+
+async def single_flight(key: str, make: Callable[[], Awaitable[Any]]) -> Any:
+    """本进程内同一 key 的并发调用共享一次 make() 的结果（read_latest 的请求单独执行）"""
+    if read_latest.get():
+        return await make()
+    return await asyncio.shield(_single_flight(key, make))
+
+
+async def cache_get_or_compute_bytes(
+    r: Optional[Redis],
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttls: Tuple[int, int],
+) -> bytes:
+    """
+    带两级缓存、single-flight 与 stale-while-revalidate 的读缓存，返回 JSON bytes
+
+    - 一级缓存（进程内）软TTL内命中：直接返回，无网络开销
+    - Redis 软TTL内命中：回填一级缓存后返回
+    - Redis 软TTL外、硬TTL内：直接返回旧值，同时在后台刷新一次
+    - 未命中：同一 key 只有一个协程（跨 worker 通过 Redis 锁，只有一个 worker）
+      去执行 compute，其余等待结果
+    - read_latest：跳过以上所有，直接 compute 并写回缓存
+    - 没有 Redis：不缓存（也不用一级缓存），只合并本进程内同 key 的并发计算。
+      这时缓存键里没有 generation，导入后无从失效
+    """
+    if read_latest.get():
+        record_cache(key, "bypass")
+        return await _compute_body(r, key, compute, ttls)
+
+    if r is not None:
+        body = local_cache.get(key)
+        if body is not None:
+            record_cache(key, "local_hit")
+            return body
+
+        entry = await _get_body(r, key)
+        if entry is not None:
+            body, soft_expire = entry
+            if time.time() < soft_expire:
+                record_cache(key, "hit")
+                local_cache.set(key, body, soft_expire)
+                return body
+            record_cache(key, "stale")
+            if f"swr:{key}" not in _inflight:
+                task = _single_flight(
+                    f"swr:{key}", lambda: _revalidate(r, key, compute, ttls))
+                _background.add(task)
+                task.add_done_callback(_background.discard)
+            return body
+
+    record_cache(key, "miss")
+    task = _single_flight(key, lambda: _load_or_compute(r, key, compute, ttls))
+    # shield：某个请求被取消时不影响其它等待者
+    return await asyncio.shield(task)
 
 
-async def cache_set(r: Redis, key: str, value: Any, ttl_seconds: int) -> None:
-    # ✅ 关键：把 Decimal / datetime 等转成可 JSON 序列化的类型
-    safe_value = jsonable_encoder(value)
-    await r.set(key, json.dumps(safe_value, ensure_ascii=False), ex=ttl_seconds)
+async def cache_get_or_compute(
+    r: Optional[Redis],
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttls: Tuple[int, int],
+) -> Any:
+    """同 cache_get_or_compute_bytes，返回解码后的 payload"""
+    return orjson.loads(await cache_get_or_compute_bytes(r, key, compute, ttls))
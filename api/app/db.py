@@ -0,0 +1,346 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import asyncpg
+from fastapi import HTTPException
+
+from .cache import generations_changed_at, read_latest
+
+# 连接池大小
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+# 连接执行多少次查询 / 空闲多少秒后重建
+DB_POOL_MAX_QUERIES = int(os.environ.get("DB_POOL_MAX_QUERIES", "50000"))
+DB_POOL_MAX_INACTIVE_SECONDS = float(os.environ.get("DB_POOL_MAX_INACTIVE_SECONDS", "300"))
+# 每个连接缓存的 prepared statement 个数（asyncpg 默认 100），0 为关闭
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "100"))
+# 服务端 statement_timeout（毫秒，0 为不限制）与客户端等待查询结果的超时（秒）
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_COMMAND_TIMEOUT_SECONDS = float(os.environ.get("DB_COMMAND_TIMEOUT_SECONDS", "60"))
+# 从连接池拿连接的最长等待（秒），超时返回 503
+DB_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get("DB_ACQUIRE_TIMEOUT_SECONDS", "5"))
+
+# 只读副本（逗号分隔），为空时所有查询走主库
+DATABASE_REPLICA_URLS = [x.strip() for x in os.environ.get(
+    "DATABASE_REPLICA_URLS", "").split(",") if x.strip()]
+# 副本健康检查间隔与超时（秒）
+DB_REPLICA_CHECK_SECONDS = float(os.environ.get("DB_REPLICA_CHECK_SECONDS", "5"))
+DB_REPLICA_CHECK_TIMEOUT_SECONDS = float(os.environ.get("DB_REPLICA_CHECK_TIMEOUT_SECONDS", "2"))
+# 请求头带 X-Read-Latest: 1 时只读主库且不读缓存（如刚导入完要立刻看到新数据），见 cache.read_latest
+READ_LATEST_HEADER = "X-Read-Latest"
+
+# 副本状态：是否在恢复模式（是副本）、WAL 是否已全部回放、最后回放的事务时间
+REPLICA_HEALTH_SQL = """
+SELECT
+  pg_is_in_recovery() AS in_recovery,
+  pg_last_wal_receive_lsn() IS NOT DISTINCT FROM pg_last_wal_replay_lsn() AS caught_up,
+  EXTRACT(EPOCH FROM pg_last_xact_replay_timestamp())::float8 AS replay_ts
+"""
+
+# 路由类别 -> (并发上限, 排队超时毫秒)，只限制真正访问数据库的请求（缓存命中不占名额）
+# heavy 的上限小于连接池大小，给 light 留出连接，避免大查询把首页的小查询饿死
+# 环境变量 DB_CONCURRENCY 覆盖/追加，格式：light=10/1000,heavy=6/5000
+DB_CONCURRENCY: Dict[str, Tuple[int, int]] = {
+    "light": (DB_POOL_MAX_SIZE, 1000),
+    "heavy": (max(1, DB_POOL_MAX_SIZE * 6 // 10), 5000),
+}
+for _item in os.environ.get("DB_CONCURRENCY", "").split(","):
+    if "=" in _item:
+        _name, _limit = _item.split("=", 1)
+        _n, _, _ms = _limit.partition("/")
+        DB_CONCURRENCY[_name.strip()] = (int(_n), int(_ms or "1000"))
+
+# cache_prefix -> 路由类别，最长前缀匹配，未匹配的归为 heavy
+ROUTE_CLASSES: Dict[str, str] = {
+    "home": "light",
+    "od_versions": "light",
+    "scene:all": "light",
+    "selftest": "light",
+    "scene": "heavy",
+}
+
+
+def route_class(cache_prefix: str) -> str:
+    matched = [p for p in ROUTE_CLASSES if cache_prefix.startswith(p)]
+    return ROUTE_CLASSES[max(matched, key=len)] if matched else "heavy"
+
+
+class ConcurrencyLimiter:
+    """
+    带排队超时的信号量：名额用完时最多排队 queue_timeout_ms，超时返回 503
+    """
+
+    def __init__(self, name: str, limit: int, queue_timeout_ms: int):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout_ms = queue_timeout_ms
+        self._sem = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.queue_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503, detail=f"数据库繁忙（{self.name}），请稍后重试",
+                headers={"Retry-After": "1"})
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "queue_timeout_ms": self.queue_timeout_ms,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+class PoolStats:
+    """连接池使用情况：在用 / 等待中的连接数、获取连接的等待时间、超时次数"""
+
+    def __init__(self) -> None:
+        self.in_use = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+        self.routed: Dict[str, int] = {}
+
+    def record_wait(self, seconds: float) -> None:
+        self.acquired += 1
+        self.acquire_wait_total += seconds
+        self.acquire_wait_max = max(self.acquire_wait_max, seconds)
+
+
+pool_stats = PoolStats()
+limiters: Dict[str, ConcurrencyLimiter] = {}
+
+
+def get_limiter(name: str) -> ConcurrencyLimiter:
+    # 信号量要在事件循环里创建，所以第一次用到时再建
+    limiter = limiters.get(name)
+    if limiter is None:
+        limit, queue_ms = DB_CONCURRENCY.get(name, DB_CONCURRENCY["heavy"])
+        limiter = limiters[name] = ConcurrencyLimiter(name, limit, queue_ms)
+    return limiter
+
+
+async def create_pool(dsn: str) -> asyncpg.Pool:
+    server_settings = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_queries=DB_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_SECONDS,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        command_timeout=DB_COMMAND_TIMEOUT_SECONDS,
+        server_settings=server_settings,
+    )
+
+
+class Replica:
+    """一个只读副本的连接池与健康状态"""
+
+    def __init__(self, url: str):
+        self.url = url
+        parsed = urlparse(url)
+        self.name = f"{parsed.hostname}:{parsed.port or 5432}{parsed.path}"
+        self.pool: Optional[asyncpg.Pool] = None
+        self.healthy = False
+        # 副本数据新到什么时候（time.time()）：WAL 已全部回放时为检查时间，否则为最后回放的事务时间
+        self.fresh_as_of = 0.0
+        self.error: Optional[str] = None
+
+    def mark_down(self, error: Any) -> None:
+        self.healthy = False
+        self.error = str(error)
+
+    async def check(self) -> None:
+        started = time.time()
+        try:
+            if self.pool is None:
+                self.pool = await create_pool(self.url)
+            async with self.pool.acquire(timeout=DB_REPLICA_CHECK_TIMEOUT_SECONDS) as conn:
+                row = await conn.fetchrow(REPLICA_HEALTH_SQL, timeout=DB_REPLICA_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            self.mark_down(e)
+            return
+        if not row["in_recovery"]:
+            # 不是副本（例如被提升成了主库），数据不再跟随主库
+            self.mark_down("not in recovery")
+            return
+        self.healthy = True
+        self.error = None
+        self.fresh_as_of = started if row["caught_up"] else (row["replay_ts"] or 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            # 距离确认副本数据最新的时间，近似复制延迟的上限
+            "fresh_age_seconds": round(max(0.0, time.time() - self.fresh_as_of), 3)
+            if self.healthy else None,
+            "error": self.error,
+        }
+
+
+class ReplicaSet:
+    """
+    只读副本集合：后台定期健康检查，查询时轮询选一个可用副本
+
+    可用 = 健康，且数据新于本进程最近一次得知导入的时间（否则副本上的旧数据会以新
+    generation 写进缓存）；没有可用副本或请求要求读最新时返回 None，走主库
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._next = 0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def start(self) -> None:
+        await asyncio.gather(*[replica.check() for replica in self.replicas])
+        self._task = asyncio.create_task(self._check_loop())
+
+    async def _check_loop(self) -> None:
+        while True:
+            await asyncio.sleep(DB_REPLICA_CHECK_SECONDS)
+            await asyncio.gather(*[replica.check() for replica in self.replicas])
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+        for replica in self.replicas:
+            if replica.pool:
+                await replica.pool.close()
+
+    def pick(self) -> Optional[Replica]:
+        if read_latest.get():
+            return None
+        changed_at = generations_changed_at()
+        candidates = [r for r in self.replicas
+                      if r.healthy and r.pool is not None and r.fresh_as_of >= changed_at]
+        if not candidates:
+            return None
+        self._next = (self._next + 1) % len(candidates)
+        return candidates[self._next]
+
+    def pick_healthy(self) -> Optional[Replica]:
+        """任意一个健康的副本，不要求数据最新（如 EXPLAIN 采样只关心执行计划）"""
+        candidates = [r for r in self.replicas if r.healthy and r.pool is not None]
+        if not candidates:
+            return None
+        self._next = (self._next + 1) % len(candidates)
+        return candidates[self._next]
+
+    def stats(self) -> Dict[str, Any]:
+        return {replica.name: replica.stats() for replica in self.replicas}
+
+
+@asynccontextmanager
+async def acquire(
+    pool: asyncpg.Pool,
+    cache_prefix: str = "",
+    replicas: Optional[ReplicaSet] = None,
+) -> AsyncIterator[asyncpg.Connection]:
+    """
+    按 cache_prefix 对应的路由类别限流后拿一个只读查询用的连接
+
+    有可用副本时优先用副本，副本连不上（标记为不健康）或连接池满时退回主库；
+    排队或主库拿连接超时都返回 503
+    """
+    async with get_limiter(route_class(cache_prefix)).slot():
+        start = time.monotonic()
+        pool_stats.waiting += 1
+        conn = None
+        try:
+            replica = replicas.pick() if replicas else None
+            if replica is not None:
+                try:
+                    conn = await replica.pool.acquire(timeout=DB_ACQUIRE_TIMEOUT_SECONDS)
+                    target, target_name = replica.pool, replica.name
+                except asyncio.TimeoutError:
+                    pass
+                except Exception as e:
+                    replica.mark_down(e)
+            if conn is None:
+                target, target_name = pool, "primary"
+                conn = await pool.acquire(timeout=DB_ACQUIRE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pool_stats.acquire_timeouts += 1
+            raise HTTPException(status_code=503, detail="数据库连接池已满，请稍后重试",
+                                headers={"Retry-After": "1"})
+        finally:
+            pool_stats.waiting -= 1
+        pool_stats.record_wait(time.monotonic() - start)
+        pool_stats.routed[target_name] = pool_stats.routed.get(target_name, 0) + 1
+        pool_stats.in_use += 1
+        try:
+            yield conn
+        finally:
+            pool_stats.in_use -= 1
+            await target.release(conn)
+
+
+@asynccontextmanager
+async def profiling_connection(
+    pool: asyncpg.Pool,
+    replicas: Optional[ReplicaSet] = None,
+) -> AsyncIterator[asyncpg.Connection]:
+    """
+    EXPLAIN ANALYZE 采样用的连接：有健康的副本时用副本，否则用主库
+
+    不经过路由类别限流，不占用户请求的名额；同时在跑的采样数由 profiling.QUERY_PROFILE_MAX_CONCURRENT 限制
+    """
+    replica = replicas.pick_healthy() if replicas else None
+    target = replica.pool if replica is not None else pool
+    conn = await target.acquire(timeout=DB_ACQUIRE_TIMEOUT_SECONDS)
+    try:
+        yield conn
+    finally:
+        await target.release(conn)
+
+
+def pool_metrics(pool: Optional[asyncpg.Pool], replicas: Optional[ReplicaSet] = None) -> Dict[str, Any]:
+    """连接池与各路由类别并发情况，供 /health/pool 使用"""
+    size = pool.get_size() if pool else 0
+    max_size = pool.get_max_size() if pool else DB_POOL_MAX_SIZE
+    return {
+        "pool": {
+            "size": size,
+            "idle": pool.get_idle_size() if pool else 0,
+            "max_size": max_size,
+            "in_use": pool_stats.in_use,
+            "waiting": pool_stats.waiting,
+            "saturation": round(pool_stats.in_use / max_size, 4) if max_size else 0,
+            "acquired": pool_stats.acquired,
+            "acquire_timeouts": pool_stats.acquire_timeouts,
+            "acquire_wait_avg_ms": round(
+                pool_stats.acquire_wait_total / pool_stats.acquired * 1000, 3)
+            if pool_stats.acquired else 0,
+            "acquire_wait_max_ms": round(pool_stats.acquire_wait_max * 1000, 3),
+            "acquire_wait_total_seconds": pool_stats.acquire_wait_total,
+            "routed": dict(pool_stats.routed),
+        },
+        "replicas": replicas.stats() if replicas else {},
+        "limiters": {name: limiter.stats() for name, limiter in limiters.items()},
+    }
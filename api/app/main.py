@@ -1,16 +1,21 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import time
 from typing import Any, Dict, List, Optional
 
 import asyncpg
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from redis.asyncio import Redis
 
-from .routers import home, scene  # , self_test
-from .cache import cache_get, cache_set, stable_dumps
+from .routers import admin, home, scene, self_test
+from .cache import cache_get, cache_set, listen_generations, stable_dumps
+from .db import (DATABASE_REPLICA_URLS, READ_LATEST_HEADER, ReplicaSet, create_pool,
+                 pool_metrics, read_latest)
+from .metrics import CONTENT_TYPE_LATEST, REQUEST_LATENCY, register_pool_collector, render_metrics
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "")
 REDIS_URL = os.environ.get("REDIS_URL", "")
@@ -29,10 +34,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """按路由模板记录请求耗时（/metrics 自身不记录）"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method, getattr(route, "path", "unmatched"), str(status)
+        ).observe(time.perf_counter() - start)
+
+
+@app.middleware("http")
+async def read_latest_middleware(request: Request, call_next):
+    """X-Read-Latest: 1 的请求只读主库，不走只读副本，也不读缓存"""
+    token = read_latest.set(
+        request.headers.get(READ_LATEST_HEADER, "").lower() in ("1", "true", "yes"))
+    try:
+        return await call_next(request)
+    finally:
+        read_latest.reset(token)
+
+
 # 注册路由
 app.include_router(home.router)
 app.include_router(scene.router)
-# app.include_router(self_test.router)
+app.include_router(admin.router)
+app.include_router(self_test.router)
 
 
 @app.on_event("startup")
@@ -40,16 +75,31 @@ async def on_startup():
     if not DATABASE_URL:
         raise RuntimeError("DATABASE_URL is required")
 
-    app.state.pg = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+    # 连接池参数见 db.py（DB_POOL_* 等环境变量）
+    app.state.pg = await create_pool(DATABASE_URL)
+    # 只读副本：未配置 DATABASE_REPLICA_URLS 时为 None，所有查询走主库
+    app.state.replicas = ReplicaSet(DATABASE_REPLICA_URLS) if DATABASE_REPLICA_URLS else None
+    if app.state.replicas:
+        await app.state.replicas.start()
     app.state.redis = Redis.from_url(REDIS_URL) if REDIS_URL else None
+    # 导入后的 generation 广播，用于失效进程内一级缓存
+    app.state.gen_listener = asyncio.create_task(
+        listen_generations(app.state.redis)) if app.state.redis else None
 
     # 将app实例传递给路由
     home.router.app = app
     scene.router.app = app
+    self_test.router.app = app
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    listener = getattr(app.state, "gen_listener", None)
+    if listener:
+        listener.cancel()
+    replicas = getattr(app.state, "replicas", None)
+    if replicas:
+        await replicas.close()
     pg = getattr(app.state, "pg", None)
     if pg:
         await pg.close()
@@ -61,3 +111,19 @@ async def on_shutdown():
 @app.get("/health")
 async def health():
     return {"ok": True}
+
+
+register_pool_collector(lambda: pool_metrics(
+    getattr(app.state, "pg", None), getattr(app.state, "replicas", None)))
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/health/pool")
+async def health_pool():
+    """连接池饱和度、获取连接等待时间、只读副本状态与各路由类别的并发情况"""
+    return pool_metrics(getattr(app.state, "pg", None), getattr(app.state, "replicas", None))
@@ -0,0 +1,131 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+# 接口延迟：route 为路由模板（如 /api/scene/scene_data），不是实际路径
+REQUEST_LATENCY = Histogram(
+    "drill_http_request_duration_seconds", "HTTP 请求耗时",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+# 缓存：result 为 local_hit / hit / stale / miss
+CACHE_REQUESTS = Counter(
+    "drill_cache_requests_total", "缓存读取次数", ["prefix", "result"])
+
+# 数据库：template 为 SQL 模板名（默认 cache_prefix）
+DB_QUERY_LATENCY = Histogram(
+    "drill_db_query_duration_seconds", "数据库查询耗时（不含排队拿连接）", ["template"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+DB_ROWS = Histogram(
+    "drill_db_rows_returned", "每次查询返回的行数", ["template"],
+    buckets=(0, 1, 10, 100, 1000, 5000, 20000, 100000, 500000))
+
+# 序列化与响应大小
+SERIALIZE_LATENCY = Histogram(
+    "drill_serialize_duration_seconds", "查询结果编码耗时", ["prefix", "format"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+PAYLOAD_BYTES = Histogram(
+    "drill_payload_bytes", "响应正文字节数", ["prefix", "format"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864))
+
+
+def cache_prefix_of(key: str) -> str:
+    """缓存键形如 <cache_prefix>:<digest>，取出 cache_prefix 作为标签"""
+    return key.rsplit(":", 1)[0]
+
+
+def record_cache(key: str, result: str) -> None:
+    CACHE_REQUESTS.labels(cache_prefix_of(key), result).inc()
+
+
+@contextmanager
+def db_timer(template: str) -> Iterator[Dict[str, float]]:
+    """
+    记录一次查询的耗时与行数，用法：
+
+        with db_timer(template) as m:
+            rows = await conn.fetch(...)
+            m["rows"] = len(rows)
+
+    退出后 m["seconds"] 为查询耗时
+    """
+    m = {"rows": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    try:
+        yield m
+    finally:
+        m["seconds"] = time.perf_counter() - start
+        record_db(template, m["seconds"], m["rows"])
+
+
+def record_db(template: str, seconds: float, rows: int) -> None:
+    DB_QUERY_LATENCY.labels(template).observe(seconds)
+    DB_ROWS.labels(template).observe(rows)
+
+
+@contextmanager
+def serialize_timer(prefix: str, result_format: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SERIALIZE_LATENCY.labels(prefix, result_format).observe(time.perf_counter() - start)
+
+
+def record_payload(prefix: str, result_format: str, size: int) -> None:
+    PAYLOAD_BYTES.labels(prefix, result_format).observe(size)
+
+
+class PoolCollector:
+    """抓取时读取 db.pool_metrics()，导出连接池、只读副本与并发限制的当前状态"""
+
+    def __init__(self, get_metrics: Callable[[], Dict[str, Any]]):
+        self.get_metrics = get_metrics
+
+    def collect(self):
+        m = self.get_metrics()
+        pool = m["pool"]
+        for name in ("size", "idle", "max_size", "in_use", "waiting", "saturation"):
+            yield GaugeMetricFamily(f"drill_db_pool_{name}", f"连接池 {name}", value=pool[name])
+        yield CounterMetricFamily(
+            "drill_db_pool_acquire_timeouts", "拿连接超时次数", value=pool["acquire_timeouts"])
+        yield CounterMetricFamily(
+            "drill_db_pool_acquire_wait_seconds", "拿连接累计等待时间",
+            value=pool["acquire_wait_total_seconds"])
+        yield CounterMetricFamily(
+            "drill_db_pool_acquired", "拿到连接次数", value=pool["acquired"])
+
+        routed = CounterMetricFamily(
+            "drill_db_routed", "按目标库统计的查询次数", labels=["target"])
+        for target, n in pool["routed"].items():
+            routed.add_metric([target], n)
+        yield routed
+
+        healthy = GaugeMetricFamily(
+            "drill_db_replica_healthy", "只读副本是否可用", labels=["replica"])
+        for name, r in m["replicas"].items():
+            healthy.add_metric([name], 1 if r["healthy"] else 0)
+        yield healthy
+
+        for field in ("limit", "active", "waiting"):
+            g = GaugeMetricFamily(
+                f"drill_concurrency_{field}", f"路由类别并发 {field}", labels=["route_class"])
+            for name, s in m["limiters"].items():
+                g.add_metric([name], s[field])
+            yield g
+        rejected = CounterMetricFamily(
+            "drill_concurrency_rejected", "排队超时被拒绝的请求数", labels=["route_class"])
+        for name, s in m["limiters"].items():
+            rejected.add_metric([name], s["rejected"])
+        yield rejected
+
+
+def register_pool_collector(get_metrics: Callable[[], Dict[str, Any]]) -> None:
+    REGISTRY.register(PoolCollector(get_metrics))
+
+
+def render_metrics() -> bytes:
+    return generate_latest(REGISTRY)
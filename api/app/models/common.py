@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 
 class TimeRange(BaseModel):
@@ -7,6 +7,15 @@ class TimeRange(BaseModel):
     end: Optional[str] = None    # ISO string
 
 
+# 目前支持的平台（表名后缀）
+Platform = Literal["x86", "arm"]
+PLATFORMS = ("x86", "arm")
+
+
 class BaseInfo(BaseModel):
-    platform: str = 'x86'
+    platform: Platform = 'x86'
     data_fix: str = '_FK_'
+
+
+# 查询结果格式：json 为 {"rows": [...]}，columnar 为列式 + 字典编码，arrow 为 Arrow IPC stream
+ResultFormat = Literal["json", "columnar", "arrow"]
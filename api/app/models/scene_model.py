@@ -1,13 +1,33 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Literal, Optional, List
 from .common import *
 
 
 class SceneDataRequest(BaseModel):
     od_version: str = "latest"
+    num: Optional[int] = Field(default=None, ge=1, le=20)  # 每个场景取最近几个 run，默认 NUM
     baseinfo: BaseInfo = BaseInfo()
 
 
 class MultiVersionSceneDataRequest(BaseModel):
     od_versions: List[str]
     baseinfo: BaseInfo = BaseInfo()
+
+
+# bundle 子查询：场景列表 / stop bar 明细 / stop bar absolute / advance detection absolute
+BundlePart = Literal["scenes", "detail", "sp_summary", "ad_summary"]
+
+
+class SceneBundleRequest(BaseModel):
+    parts: List[BundlePart] = ["scenes", "detail"]
+    od_versions: List[str] = []  # 为空时取每个场景最近 num 个 run
+    num: Optional[int] = Field(default=None, ge=1, le=20)
+    baseinfo: BaseInfo = BaseInfo()
+
+
+class ScenePlatformCompareRequest(BaseModel):
+    platforms: List[Platform] = list(PLATFORMS)
+    part: Literal["detail", "sp_summary", "ad_summary"] = "detail"
+    od_versions: List[str] = []  # 为空时取每个场景最近 num 个 run
+    num: Optional[int] = Field(default=None, ge=1, le=20)
+    data_fix: str = '_FK_'
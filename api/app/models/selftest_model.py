@@ -4,6 +4,8 @@ from .common import *
 
 
 class ImportDataRequest(BaseModel):
+    # trigger 链接，多个用空格 / 逗号 / 换行分隔（同一个 od_tag）
     link_str: str
-    platform: str
-    key_str: str
+    platform: Platform
+    # 只导入某一类 CSV（如 stop_bar_statistic_with_time），为空时导入全部
+    key_str: Optional[str] = None
@@ -0,0 +1,101 @@
+import itertools
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+import orjson
+
+from .cache import stable_dumps
+
+# 慢查询采样（默认关闭）：超过阈值、或按比例抽样的查询，在后台用 EXPLAIN ANALYZE 重跑一次记录执行计划
+# 注意 EXPLAIN ANALYZE 会真正执行查询：被采到的查询数据库开销翻倍。配置了只读副本时重跑在副本上，
+# 否则在主库上（不占路由类别的限流名额，但占一个连接），见 services/query_services.maybe_explain
+QUERY_PROFILE = os.environ.get("QUERY_PROFILE", "0").lower() in ("1", "true", "yes")
+QUERY_PROFILE_SLOW_MS = float(os.environ.get("QUERY_PROFILE_SLOW_MS", "500"))
+QUERY_PROFILE_SAMPLE_RATE = float(os.environ.get("QUERY_PROFILE_SAMPLE_RATE", "0"))
+# 保留最近多少条执行计划
+QUERY_PROFILE_BUFFER = int(os.environ.get("QUERY_PROFILE_BUFFER", "100"))
+# 同时在跑的 EXPLAIN ANALYZE 上限，超出的直接跳过，避免采样本身把库压垮
+QUERY_PROFILE_MAX_CONCURRENT = int(os.environ.get("QUERY_PROFILE_MAX_CONCURRENT", "1"))
+
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+_plans: Deque[Dict[str, Any]] = deque(maxlen=QUERY_PROFILE_BUFFER)
+_ids = itertools.count(1)
+_running = 0
+
+
+def profile_trigger(seconds: float) -> Optional[str]:
+    """这次查询是否需要记录执行计划：返回 slow / sample，不需要时返回 None"""
+    if not QUERY_PROFILE or _running >= QUERY_PROFILE_MAX_CONCURRENT:
+        return None
+    if seconds * 1000 >= QUERY_PROFILE_SLOW_MS:
+        return "slow"
+    if QUERY_PROFILE_SAMPLE_RATE > 0 and random.random() < QUERY_PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def explain_started() -> None:
+    global _running
+    _running += 1
+
+
+def explain_finished() -> None:
+    global _running
+    _running -= 1
+
+
+def record_plan(
+    template: str,
+    cache_prefix: str,
+    params: Sequence[Any],
+    seconds: float,
+    trigger: str,
+    plan: Any = None,
+    error: Optional[str] = None,
+) -> None:
+    """把一次 EXPLAIN ANALYZE 的结果放进环形缓冲区；plan 为 FORMAT JSON 的输出"""
+    if isinstance(plan, str):
+        plan = orjson.loads(plan)
+    top = plan[0] if isinstance(plan, list) and plan else {}
+    _plans.append({
+        "id": next(_ids),
+        "captured_at": time.time(),
+        "template": template,
+        "cache_prefix": cache_prefix,
+        # datetime 等参数转成字符串
+        "params": json.loads(stable_dumps(list(params))),
+        "duration_ms": round(seconds * 1000, 3),
+        "trigger": trigger,
+        "planning_time_ms": top.get("Planning Time"),
+        "execution_time_ms": top.get("Execution Time"),
+        "plan": plan,
+        "error": error,
+    })
+
+
+def list_plans(template: Optional[str] = None, limit: int = 20, with_plan: bool = False) -> List[Dict[str, Any]]:
+    """最近的执行计划，新的在前；默认不带 plan 本身"""
+    items = [p for p in reversed(_plans) if template is None or p["template"] == template]
+    items = items[:limit]
+    if with_plan:
+        return items
+    return [{k: v for k, v in p.items() if k != "plan"} for p in items]
+
+
+def get_plan(plan_id: int) -> Optional[Dict[str, Any]]:
+    return next((p for p in _plans if p["id"] == plan_id), None)
+
+
+def profile_settings() -> Dict[str, Any]:
+    return {
+        "enabled": QUERY_PROFILE,
+        "slow_ms": QUERY_PROFILE_SLOW_MS,
+        "sample_rate": QUERY_PROFILE_SAMPLE_RATE,
+        "buffer": QUERY_PROFILE_BUFFER,
+        "stored": len(_plans),
+    }
@@ -1,24 +1,21 @@
 LASTEST_QUERY = """
 SELECT
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
   od_version,
-  to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+  to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
   scene_name,
-  SUM(tp) as tp,
-  SUM(fp) as fp,
-  SUM(fn) as fn,
-  CASE WHEN SUM(tp)+SUM(fp) = 0 THEN 0 ELSE ROUND(SUM(tp)*1.0/(SUM(tp)+SUM(fp)),4) END AS precision,
-  CASE WHEN SUM(tp)+SUM(fn) = 0 THEN 0 ELSE ROUND(SUM(tp)*1.0/(SUM(tp)+SUM(fn)),4) END AS recall
-FROM public.stop_bar_detail_{arch}
-WHERE od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') = $1 
-      AND scene_name like '%{data_fix}%'
-GROUP BY
-  od_version,
-  date_trunc('minute', od_time),
-  scene_name
+  tp,
+  fp,
+  fn,
+  CASE WHEN tp+fp = 0 THEN 0 ELSE ROUND(tp*1.0/(tp+fp),4) END AS precision,
+  CASE WHEN tp+fn = 0 THEN 0 ELSE ROUND(tp*1.0/(tp+fn),4) END AS recall
+FROM {stop_bar_detail_scene_rollup}
+WHERE od_version = $1
+      AND od_minute = $2
+      AND scene_name LIKE '%' || $3 || '%'
 ORDER BY
   od_version,
-  date_trunc('minute', od_time),
+  od_minute,
   scene_name;
 """
 
@@ -26,23 +23,19 @@ ORDER BY
 DIRECTION_PR_QUERY = """
     SELECT
       od_version,
-      to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+      to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
       scene_name,
       direction,
-      SUM(tp) AS tp,
-      SUM(fp) AS fp,
-      SUM(fn) AS fn,
-      ROUND(SUM(tp)::numeric / NULLIF(SUM(tp + fp), 0), 4) AS precision,
-      ROUND(SUM(tp)::numeric / NULLIF(SUM(tp + fn), 0), 4) AS recall
-    FROM public.stop_bar_detail_{arch}
+      tp,
+      fp,
+      fn,
+      ROUND(tp::numeric / NULLIF(tp + fp, 0), 4) AS precision,
+      ROUND(tp::numeric / NULLIF(tp + fn, 0), 4) AS recall
+    FROM {stop_bar_detail_direction_rollup}
     WHERE
-      od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') = $1
-      AND scene_name = $2
-    GROUP BY
-      od_version,
-      date_trunc('minute', od_time),
-      scene_name,
-      direction
+      od_version = $1
+      AND od_minute = $2
+      AND scene_name = $3
     ORDER BY
       direction;
     """
@@ -51,58 +44,45 @@ DIRECTION_PR_QUERY = """
 LANE_PR_QUERY = """
     SELECT
       od_version,
-      to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+      to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
       scene_name,
       direction,
       lane,
-      SUM(tp) AS tp,
-      SUM(fp) AS fp,
-      SUM(fn) AS fn,
-      ROUND(SUM(tp)::numeric / NULLIF(SUM(tp + fp), 0), 4) AS precision,
-      ROUND(SUM(tp)::numeric / NULLIF(SUM(tp + fn), 0), 4) AS recall
-    FROM public.stop_bar_detail_{arch}
+      tp,
+      fp,
+      fn,
+      ROUND(tp::numeric / NULLIF(tp + fp, 0), 4) AS precision,
+      ROUND(tp::numeric / NULLIF(tp + fn, 0), 4) AS recall
+    FROM {stop_bar_detail_lane_rollup}
     WHERE
-      od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') = $1
-      AND scene_name = $2
-      AND direction = $3
-    GROUP BY
-      od_version,
-      date_trunc('minute', od_time),
-      scene_name,
-      direction,
-      lane
+      od_version = $1
+      AND od_minute = $2
+      AND scene_name = $3
+      AND direction = $4
     ORDER BY
       lane;
     """
 
 
-ALL_SIMPL_OD = """
-SELECT 
-  DISTINCT od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
-  date_trunc('minute', od_time) AS od_time_minute
-FROM public.stop_bar_detail_x86
-
-UNION
-
-SELECT 
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
-  date_trunc('minute', od_time) AS od_time_minute
-FROM public.stop_bar_detail_arm
-
-UNION
-
-SELECT 
-  DISTINCT od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
-  date_trunc('minute', od_time) AS od_time_minute
-FROM public.stop_bar_summary_x86
-
-
-UNION
-
-SELECT 
-  DISTINCT od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
-  date_trunc('minute', od_time) AS od_time_minute
-FROM public.stop_bar_summary_arm
-
-ORDER BY od_time_minute DESC;
+# OD 版本列表：读 od_run 目录，keyset 分页
+# $1 平台数组，$2 since（可为 NULL），$3/$4 上一页最后一行的 (od_minute, od_version)（可为 NULL），$5 每页行数
+OD_VERSIONS_QUERY = """
+SELECT
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_minute AS od_time_minute,
+  array_agg(arch ORDER BY arch) AS platforms,
+  max(scene_count) AS scene_count,
+  max(imported_at) AS imported_at,
+  (SELECT array_agg(DISTINCT t ORDER BY t)
+     FROM public.od_run r2, unnest(r2.tables) AS t
+    WHERE r2.od_version = r.od_version
+      AND r2.od_minute = r.od_minute
+      AND r2.arch = ANY($1::text[])) AS tables
+FROM public.od_run r
+WHERE arch = ANY($1::text[])
+  AND ($2::timestamp IS NULL OR od_minute >= $2::timestamp)
+  AND ($3::timestamp IS NULL OR (od_minute, od_version) < ($3::timestamp, $4::text))
+GROUP BY od_minute, od_version
+ORDER BY od_minute DESC, od_version DESC
+LIMIT $5;
 """
@@ -1,43 +1,34 @@
+# latest 接口默认取每个场景最近 NUM 个 run，上限与 scene_recent_runs 保留的个数一致
 NUM = 5
+MAX_NUM = 20
 
 
 LASTEST_QUERY = """
 SELECT
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
   od_version,
-  to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+  to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
   scene_name,
   direction,
   lane,
-  sum(ground_truth) as gt,
-  SUM(tp) as tp,
-  SUM(fp) as fp,
-  SUM(fn) as fn
-FROM public.stop_bar_detail_{arch}
-WHERE (scene_name, od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI')) IN (
-    SELECT 
+  ground_truth as gt,
+  tp,
+  fp,
+  fn
+FROM {stop_bar_detail_lane_rollup}
+WHERE (scene_name, od_version, od_minute) IN (
+    SELECT
         scene_name,
-        od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute
-    FROM (
-        SELECT 
-            scene_name,
-            od_version,
-            date_trunc('minute', od_time) AS od_time_trunc,
-            row_number() OVER (PARTITION BY scene_name ORDER BY date_trunc('minute', od_time) DESC, od_version DESC) AS rn
-        FROM public.stop_bar_detail_{arch}
-        GROUP BY scene_name, od_version, date_trunc('minute', od_time)
-    ) t
-    WHERE t.rn <= 5
+        od_version,
+        od_minute
+    FROM public.scene_recent_runs
+    WHERE arch = $2
+      AND source = 'stop_bar_detail'
+      AND rn <= $1
 )
-GROUP BY
-  od_version,
-  date_trunc('minute', od_time),
-  scene_name,
-  direction,
-  lane
 ORDER BY
   scene_name,
-  date_trunc('minute', od_time) DESC,
+  od_minute DESC,
   od_version DESC,
   direction,
   lane;
@@ -47,32 +38,28 @@ ORDER BY
 SCENE_QUERY = """
 SELECT
   DISTINCT scene_name
-FROM public.stop_bar_detail_{arch}
+FROM {stop_bar_detail_scene_rollup}
 """
 
 MULTI_VERSION_QUERY = """
 SELECT
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
   od_version,
-  to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+  to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
   scene_name,
   direction,
   lane,
-  sum(ground_truth) as gt,
-  SUM(tp) as tp,
-  SUM(fp) as fp,
-  SUM(fn) as fn
-FROM public.stop_bar_detail_{arch}
-WHERE od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') IN ({version_placeholders})
-GROUP BY
-  od_version,
-  date_trunc('minute', od_time),
-  scene_name,
-  direction,
-  lane
+  ground_truth as gt,
+  tp,
+  fp,
+  fn
+FROM {stop_bar_detail_lane_rollup}
+WHERE (od_version, od_minute) IN (
+    SELECT * FROM unnest($1::text[], $2::timestamp[])
+)
 ORDER BY
   scene_name,
-  date_trunc('minute', od_time) DESC,
+  od_minute DESC,
   od_version DESC,
   direction,
   lane;
@@ -81,39 +68,28 @@ ORDER BY
 
 LASTEST_QUERY_SP_SUMMARY = """
 SELECT
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
   od_version,
-  to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+  to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
   scene_name,
   direction,
   lane,
-  sum(ground_truth) as gt,
-  SUM(zone_counted) as zone_counted
-FROM public.stop_bar_summary_{arch}
-WHERE (scene_name, od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI')) IN (
-    SELECT 
+  ground_truth as gt,
+  zone_counted
+FROM {stop_bar_summary_lane_rollup}
+WHERE (scene_name, od_version, od_minute) IN (
+    SELECT
         scene_name,
-        od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute
-    FROM (
-        SELECT 
-            scene_name,
-            od_version,
-            date_trunc('minute', od_time) AS od_time_trunc,
-            row_number() OVER (PARTITION BY scene_name ORDER BY date_trunc('minute', od_time) DESC, od_version DESC) AS rn
-        FROM public.stop_bar_detail_{arch}
-        GROUP BY scene_name, od_version, date_trunc('minute', od_time)
-    ) t
-    WHERE t.rn <= 5
+        od_version,
+        od_minute
+    FROM public.scene_recent_runs
+    WHERE arch = $2
+      AND source = 'stop_bar_detail'
+      AND rn <= $1
 )
-GROUP BY
-  od_version,
-  date_trunc('minute', od_time),
-  scene_name,
-  direction,
-  lane
 ORDER BY
   scene_name,
-  date_trunc('minute', od_time) DESC,
+  od_minute DESC,
   od_version DESC,
   direction,
   lane;
@@ -122,25 +98,21 @@ ORDER BY
 
 MULTI_VERSION_QUERY_SP_SUMMARY = """
 SELECT
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
   od_version,
-  to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+  to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
   scene_name,
   direction,
   lane,
-  sum(ground_truth) as gt,
-  SUM(zone_counted) as zone_counted
-FROM public.stop_bar_summary_{arch}
-WHERE od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') IN ({version_placeholders})
-GROUP BY
-  od_version,
-  date_trunc('minute', od_time),
-  scene_name,
-  direction,
-  lane
+  ground_truth as gt,
+  zone_counted
+FROM {stop_bar_summary_lane_rollup}
+WHERE (od_version, od_minute) IN (
+    SELECT * FROM unnest($1::text[], $2::timestamp[])
+)
 ORDER BY
   scene_name,
-  date_trunc('minute', od_time) DESC,
+  od_minute DESC,
   od_version DESC,
   direction,
   lane;
@@ -149,39 +121,28 @@ ORDER BY
 
 LASTEST_QUERY_AD_SUMMARY = """
 SELECT
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
   od_version,
-  to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+  to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
   scene_name,
   direction,
   zone_name,
-  sum(ground_truth) as gt,
-  SUM(zone_counted) as zone_counted
-FROM public.advance_detection_summary_{arch}
-WHERE (scene_name, od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI')) IN (
-    SELECT 
+  ground_truth as gt,
+  zone_counted
+FROM {advance_detection_summary_zone_rollup}
+WHERE (scene_name, od_version, od_minute) IN (
+    SELECT
         scene_name,
-        od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute
-    FROM (
-        SELECT 
-            scene_name,
-            od_version,
-            date_trunc('minute', od_time) AS od_time_trunc,
-            row_number() OVER (PARTITION BY scene_name ORDER BY date_trunc('minute', od_time) DESC, od_version DESC) AS rn
-        FROM public.advance_detection_summary_{arch}
-        GROUP BY scene_name, od_version, date_trunc('minute', od_time)
-    ) t
-    WHERE t.rn <= 5
+        od_version,
+        od_minute
+    FROM public.scene_recent_runs
+    WHERE arch = $2
+      AND source = 'advance_detection_summary'
+      AND rn <= $1
 )
-GROUP BY
-  od_version,
-  date_trunc('minute', od_time),
-  scene_name,
-  direction,
-  zone_name
 ORDER BY
   scene_name,
-  date_trunc('minute', od_time) DESC,
+  od_minute DESC,
   od_version DESC,
   direction,
   zone_name;
@@ -190,25 +151,21 @@ ORDER BY
 
 MULTI_VERSION_QUERY_AD_SUMMARY = """
 SELECT
-  od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
+  od_version || '-' || to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_version_minute,
   od_version,
-  to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
+  to_char(od_minute, 'YYYY-MM-DD_HH24:MI') AS od_time_minute,
   scene_name,
   direction,
   zone_name,
-  sum(ground_truth) as gt,
-  SUM(zone_counted) as zone_counted
-FROM public.advance_detection_summary_{arch}
-WHERE od_version || '-' || to_char(date_trunc('minute', od_time), 'YYYY-MM-DD_HH24:MI') IN ({version_placeholders})
-GROUP BY
-  od_version,
-  date_trunc('minute', od_time),
-  scene_name,
-  direction,
-  zone_name
+  ground_truth as gt,
+  zone_counted
+FROM {advance_detection_summary_zone_rollup}
+WHERE (od_version, od_minute) IN (
+    SELECT * FROM unnest($1::text[], $2::timestamp[])
+)
 ORDER BY
   scene_name,
-  date_trunc('minute', od_time) DESC,
+  od_minute DESC,
   od_version DESC,
   direction,
   zone_name;
@@ -13,3 +13,173 @@ precision = EXCLUDED.precision,
 recall = EXCLUDED.recall,
 update_time = CURRENT_TIMESTAMP
 """
+
+
+# ---------------------------------------------------------------------
+# 批量导入（services/bulk_load.py）：COPY 进 *_staging，再按 load_id 合并进正式表
+# 同一批里重复的唯一键只保留一行（DISTINCT ON），否则 ON CONFLICT 会报同一行被更新两次
+# ---------------------------------------------------------------------
+
+MERGE_SQL = {
+    "stop_bar_detail": """
+INSERT INTO {stop_bar_detail}
+(od_version, scene_name, direction, lane,
+ground_truth, tp, fp, fn, precision, recall, od_time)
+SELECT DISTINCT ON (od_version, scene_name, direction, lane, od_time)
+  od_version, scene_name, direction, lane,
+  ground_truth, tp, fp, fn,
+  round(precision::numeric, 2), round(recall::numeric, 2), od_time
+FROM public.stop_bar_detail_staging
+WHERE load_id = $1
+ON CONFLICT (od_version, scene_name, direction, lane, od_time)
+DO UPDATE SET
+ground_truth = EXCLUDED.ground_truth,
+tp = EXCLUDED.tp,
+fp = EXCLUDED.fp,
+fn = EXCLUDED.fn,
+precision = EXCLUDED.precision,
+recall = EXCLUDED.recall,
+update_time = CURRENT_TIMESTAMP
+""",
+    "stop_bar_summary": """
+INSERT INTO {stop_bar_summary}
+(od_version, scene_name, direction, lane,
+ground_truth, zone_counted, abs_rate, od_time)
+SELECT DISTINCT ON (od_version, scene_name, direction, lane, od_time)
+  od_version, scene_name, direction, lane,
+  ground_truth, zone_counted, round(abs_rate::numeric, 2), od_time
+FROM public.stop_bar_summary_staging
+WHERE load_id = $1
+ON CONFLICT (od_version, scene_name, direction, lane, od_time)
+DO UPDATE SET
+ground_truth = EXCLUDED.ground_truth,
+zone_counted = EXCLUDED.zone_counted,
+abs_rate = EXCLUDED.abs_rate,
+update_time = CURRENT_TIMESTAMP
+""",
+    "advance_detection_summary": """
+INSERT INTO {advance_detection_summary}
+(od_version, scene_name, zone_name, direction,
+ground_truth, zone_counted, abs_rate, od_time)
+SELECT DISTINCT ON (od_version, scene_name, zone_name, direction, od_time)
+  od_version, scene_name, zone_name, direction,
+  ground_truth, zone_counted, round(abs_rate::numeric, 2), od_time
+FROM public.advance_detection_summary_staging
+WHERE load_id = $1
+ON CONFLICT (od_version, scene_name, zone_name, direction, od_time)
+DO UPDATE SET
+ground_truth = EXCLUDED.ground_truth,
+zone_counted = EXCLUDED.zone_counted,
+abs_rate = EXCLUDED.abs_rate,
+update_time = CURRENT_TIMESTAMP
+""",
+}
+
+# 这一批涉及到的 run（与正式表 od_minute 生成列的算法一致）
+STAGING_RUNS_SQL = """
+SELECT DISTINCT od_version, date_trunc('minute', od_time AT TIME ZONE 'UTC') AS od_minute
+FROM public.{staging}
+WHERE load_id = $1
+"""
+
+DELETE_STAGING_SQL = """
+DELETE FROM public.{staging} WHERE load_id = $1
+"""
+
+# 合并前核对中转表里还有多少行（UNLOGGED 表在崩溃恢复时会被清空）
+COUNT_STAGING_SQL = """
+SELECT count(*) FROM public.{staging} WHERE load_id = $1
+"""
+
+# 合并之后按 run 增量重算汇总表（见 db/init.sql: refresh_run_rollups）
+REFRESH_RUN_ROLLUPS_SQL = """
+SELECT public.refresh_run_rollups($1, $2, $3)
+"""
+
+
+# ---------------------------------------------------------------------
+# 导入任务（db/init.sql: import_job，services/import_jobs.py）
+# ---------------------------------------------------------------------
+
+IMPORT_JOB_COLUMNS = """
+id, trigger_urls, platform, tables, load_id, status, stage, progress, od_version, error,
+attempts, max_attempts, run_after, worker, heartbeat_at,
+created_at, started_at, finished_at, updated_at
+"""
+
+CREATE_IMPORT_JOB_SQL = f"""
+INSERT INTO public.import_job (trigger_urls, platform, tables, max_attempts)
+VALUES ($1, $2, $3, $4)
+RETURNING {IMPORT_JOB_COLUMNS}
+"""
+
+GET_IMPORT_JOB_SQL = f"""
+SELECT {IMPORT_JOB_COLUMNS}
+FROM public.import_job
+WHERE id = $1
+"""
+
+LIST_IMPORT_JOBS_SQL = f"""
+SELECT {IMPORT_JOB_COLUMNS}
+FROM public.import_job
+WHERE ($1::text IS NULL OR status = $1)
+ORDER BY id DESC
+LIMIT $2
+"""
+
+# 领取一个任务：排队中且到了重试时间的，或心跳超时（worker 挂掉）的运行中任务
+# SKIP LOCKED：多个 worker 同时领取时互不等待、不会领到同一个
+CLAIM_IMPORT_JOB_SQL = f"""
+UPDATE public.import_job
+SET status = 'running',
+    attempts = attempts + 1,
+    worker = $1,
+    error = NULL,
+    started_at = COALESCE(started_at, now()),
+    heartbeat_at = now(),
+    updated_at = now()
+WHERE id = (
+  SELECT id FROM public.import_job
+  WHERE (status = 'queued' AND run_after <= now())
+     OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => $2))
+  ORDER BY id
+  FOR UPDATE SKIP LOCKED
+  LIMIT 1
+)
+RETURNING {IMPORT_JOB_COLUMNS}
+"""
+
+# 以下更新都带 worker 条件：任务被其他 worker 接管后，旧 worker 的写入不生效
+UPDATE_IMPORT_JOB_PROGRESS_SQL = """
+UPDATE public.import_job
+SET stage = $3, progress = $4::jsonb, od_version = COALESCE($5, od_version),
+    heartbeat_at = now(), updated_at = now()
+WHERE id = $1 AND worker = $2 AND status = 'running'
+"""
+
+FINISH_IMPORT_JOB_SQL = """
+UPDATE public.import_job
+SET status = 'succeeded', stage = NULL, progress = $3::jsonb,
+    finished_at = now(), updated_at = now()
+WHERE id = $1 AND worker = $2 AND status = 'running'
+"""
+
+# 失败：没用完重试次数时延迟 $5 秒后重新排队，否则标记为 failed
+FAIL_IMPORT_JOB_SQL = """
+UPDATE public.import_job
+SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+    run_after = now() + make_interval(secs => $5),
+    progress = $3::jsonb, error = $4,
+    finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE now() END,
+    updated_at = now()
+WHERE id = $1 AND worker = $2 AND status = 'running'
+"""
+
+# 手动重试失败的任务：从失败的阶段继续（progress 保留）
+RETRY_IMPORT_JOB_SQL = f"""
+UPDATE public.import_job
+SET status = 'queued', attempts = 0, run_after = now(), error = NULL,
+    finished_at = NULL, updated_at = now()
+WHERE id = $1 AND status = 'failed'
+RETURNING {IMPORT_JOB_COLUMNS}
+"""
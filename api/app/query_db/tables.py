@@ -0,0 +1,31 @@
+from ..models.common import PLATFORMS
+
+# SQL 模板里允许出现的表（不带平台后缀），模板中写成 {stop_bar_detail_lane_rollup} 这样的占位符
+TABLE_BASES = (
+    "stop_bar_detail",
+    "stop_bar_summary",
+    "advance_detection_summary",
+    "stop_bar_detail_scene_rollup",
+    "stop_bar_detail_direction_rollup",
+    "stop_bar_detail_lane_rollup",
+    "stop_bar_summary_scene_rollup",
+    "stop_bar_summary_direction_rollup",
+    "stop_bar_summary_lane_rollup",
+    "advance_detection_summary_scene_rollup",
+    "advance_detection_summary_direction_rollup",
+    "advance_detection_summary_zone_rollup",
+)
+
+# 平台 -> {占位符: 完整表名}，只有这里列出的表名会被拼进 SQL
+TABLE_NAMES = {
+    platform: {base: f"public.{base}_{platform}" for base in TABLE_BASES}
+    for platform in PLATFORMS
+}
+
+
+def render_sql(template: str, platform: str) -> str:
+    """把 SQL 模板里的表名占位符替换成该平台的表名，平台不在白名单内时抛 ValueError"""
+    tables = TABLE_NAMES.get(platform)
+    if tables is None:
+        raise ValueError(f"不支持的平台：{platform}")
+    return template.format_map(tables)
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Optional
+import os
+from ..profiling import get_plan, list_plans, profile_settings
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+# 设置后管理接口需要带 X-Admin-Token 请求头
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+def check_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="需要管理员 token")
+
+
+@router.get("/query_plans", dependencies=[Depends(check_admin_token)])
+async def api_query_plans(
+    template: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=1000),
+    with_plan: bool = False,
+):
+    """最近采样到的执行计划（新的在前），with_plan=true 时带完整的 EXPLAIN JSON"""
+    return {"settings": profile_settings(), "rows": list_plans(template, limit, with_plan)}
+
+
+@router.get("/query_plans/{plan_id}", dependencies=[Depends(check_admin_token)])
+async def api_query_plan(plan_id: int):
+    """单条执行计划"""
+    plan = get_plan(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="执行计划不存在或已被淘汰")
+    return plan
@@ -1,14 +1,28 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
 import os
 from ..cache import cache_get, cache_set, stable_dumps
 from ..query_db.home_query import *
+from ..query_db.tables import render_sql
+from ..models.common import PLATFORMS, Platform
 from ..models.home_model import HomeSeriesRequest, SceneDirectionPRRequest, DirectionLanesPRRequest
-from ..services.query_services import execute_cached_query
+from ..services.query_services import execute_cached_query, split_od_version_minute, table_namespaces
 
 router = APIRouter(prefix="/api/home", tags=["home"])
 
 CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", "30"))
+# /od_versions 默认每页行数与上限
+OD_VERSIONS_PAGE_SIZE = int(os.environ.get("OD_VERSIONS_PAGE_SIZE", "200"))
+OD_VERSIONS_MAX_PAGE_SIZE = 1000
+
+
+def parse_od_version(od_version: str):
+    """拆分请求里的 od_version_minute，格式不对时返回 400"""
+    try:
+        return split_od_version_minute(od_version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/series")
@@ -16,11 +30,11 @@ async def api_home_series(req: HomeSeriesRequest):
     """使用特定的 od_version 进行筛选"""
     payload = await execute_cached_query(
         router=router,
-        sql=LASTEST_QUERY.format(
-            arch=req.baseinfo.platform, data_fix=req.baseinfo.data_fix),
+        sql=render_sql(LASTEST_QUERY, req.baseinfo.platform),
         cache_prefix="home",
-        params=(req.od_version,),
-        request_data=req.model_dump()
+        params=(*parse_od_version(req.od_version), req.baseinfo.data_fix),
+        request_data=req.model_dump(),
+        tables=table_namespaces(req.baseinfo.platform, "stop_bar_detail")
     )
     return payload
 
@@ -29,12 +43,12 @@ async def api_home_series(req: HomeSeriesRequest):
 async def api_scene_directions_pr(req: SceneDirectionPRRequest):
     """场景方向PR数据查询"""
     payload = await execute_cached_query(
-        sql=DIRECTION_PR_QUERY.format(
-            arch=req.baseinfo.platform),
+        sql=render_sql(DIRECTION_PR_QUERY, req.baseinfo.platform),
         router=router,
         cache_prefix="home:dir_pr",
-        params=(req.od_version, req.scene_name),
-        request_data=req.model_dump()
+        params=(*parse_od_version(req.od_version), req.scene_name),
+        request_data=req.model_dump(),
+        tables=table_namespaces(req.baseinfo.platform, "stop_bar_detail")
     )
     return payload
 
@@ -44,21 +58,52 @@ async def api_direction_lanes_pr(req: DirectionLanesPRRequest):
     """方向车道PR数据查询"""
     payload = await execute_cached_query(
         router=router,
-        sql=LANE_PR_QUERY.format(arch=req.baseinfo.platform),
+        sql=render_sql(LANE_PR_QUERY, req.baseinfo.platform),
         cache_prefix="home:lane_pr",
-        params=(req.od_version, req.scene_name, req.direction),
-        request_data=req.model_dump()
+        params=(*parse_od_version(req.od_version),
+                req.scene_name, req.direction),
+        request_data=req.model_dump(),
+        tables=table_namespaces(req.baseinfo.platform, "stop_bar_detail")
     )
     return payload
 
 
+def parse_since(since: Optional[str]) -> Optional[datetime]:
+    """since 形如 2026-01-08_22:09 或 ISO 时间（UTC），格式不对时返回 400"""
+    if not since:
+        return None
+    try:
+        dt = datetime.fromisoformat(since.strip().replace("_", " "))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"since 格式错误：{since}")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
 @router.get("/od_versions")
-async def api_od_versions():
-    """获取所有OD版本列表"""
+async def api_od_versions(
+    platforms: List[Platform] = Query(list(PLATFORMS)),
+    since: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(OD_VERSIONS_PAGE_SIZE, ge=1, le=OD_VERSIONS_MAX_PAGE_SIZE),
+):
+    """
+    获取OD版本列表（按时间倒序，keyset 分页）
+
+    platforms 为出现过该版本的平台；下一页把本页最后一行的 od_version_minute 作为 after 传入，
+    返回行数小于 limit 时表示没有更多；since 只返回该时间（UTC）之后的版本
+    """
+    after_version, after_minute = parse_od_version(after) if after else (None, None)
+    platforms = sorted(set(platforms))
     payload = await execute_cached_query(
         router=router,
-        sql=ALL_SIMPL_OD,
+        sql=OD_VERSIONS_QUERY,
         cache_prefix="od_versions",
-        request_data={}
+        params=(platforms, parse_since(since), after_minute, after_version, limit),
+        request_data={},
+        tables=[ns for platform in platforms
+                for ns in table_namespaces(platform, "stop_bar_detail", "stop_bar_summary",
+                                           "advance_detection_summary")]
     )
     return payload
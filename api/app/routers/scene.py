@@ -1,128 +1,224 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from typing import Any, Dict, List, Optional
+import asyncio
 import os
 from ..cache import cache_get, cache_set, stable_dumps
 from ..query_db.scene_query import *
+from ..query_db.tables import render_sql
 from ..models.scene_model import *
-from ..services.query_services import execute_cached_query
+from ..models.common import ResultFormat
+from ..metrics import record_payload
+from ..services.result_format import arrow_available
+from ..services.query_services import (execute_cached_query, execute_cached_query_bytes,
+                                       execute_platform_query, split_od_version_minutes,
+                                       table_namespaces)
 
 router = APIRouter(prefix="/api/scene", tags=["scene"])
 
 CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", "30"))
 
+# 各类场景数据的 SQL 与所依赖的数据表
+LATEST_QUERIES = {
+    "detail": (LASTEST_QUERY, ("stop_bar_detail",)),
+    "sp_summary": (LASTEST_QUERY_SP_SUMMARY, ("stop_bar_detail", "stop_bar_summary")),
+    "ad_summary": (LASTEST_QUERY_AD_SUMMARY, ("advance_detection_summary",)),
+}
+MULTI_VERSION_QUERIES = {
+    "detail": (MULTI_VERSION_QUERY, ("stop_bar_detail",)),
+    "sp_summary": (MULTI_VERSION_QUERY_SP_SUMMARY, ("stop_bar_summary",)),
+    "ad_summary": (MULTI_VERSION_QUERY_AD_SUMMARY, ("advance_detection_summary",)),
+}
+
+
+def parse_od_versions(od_versions: List[str]):
+    """拆分多版本请求里的 od_version_minute 列表，格式不对时返回 400"""
+    if not od_versions:
+        raise HTTPException(status_code=400, detail="od_versions不能为空")
+    try:
+        return split_od_version_minutes(od_versions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/all_scenes")
-async def api_all_scenes(platform: str):
-    """获取所有场景列表"""
-    payload = await execute_cached_query(
-        router=router,
-        sql=SCENE_QUERY.format(arch=platform),
+
+def check_format(format: ResultFormat, stream: bool = False) -> ResultFormat:
+    """arrow 依赖可选的 pyarrow，未安装时返回 400；流式只支持 json / columnar"""
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="服务端未安装 pyarrow，不支持 format=arrow")
+    if format == "arrow" and stream:
+        raise HTTPException(status_code=400, detail="stream=true 只支持 format=json / columnar")
+    return format
+
+
+def scenes_query(platform: str) -> Dict[str, Any]:
+    """场景列表查询的 execute_cached_query 参数"""
+    return dict(
+        sql=render_sql(SCENE_QUERY, platform),
         cache_prefix="scene:all",
-        request_data={}
+        request_data={},
+        tables=table_namespaces(platform, "stop_bar_detail"),
     )
+
+
+def latest_query(kind: str, req: SceneDataRequest) -> Dict[str, Any]:
+    """每个场景最近 num 个 run 的查询参数，kind 见 LATEST_QUERIES"""
+    sql, sources = LATEST_QUERIES[kind]
+    return dict(
+        sql=render_sql(sql, req.baseinfo.platform),
+        cache_prefix="scene:latest",
+        params=(min(req.num or NUM, MAX_NUM), req.baseinfo.platform),
+        request_data=req.model_dump(),
+        tables=table_namespaces(req.baseinfo.platform, *sources),
+        template=f"scene:latest:{kind}",
+    )
+
+
+def multi_version_query(kind: str, req: MultiVersionSceneDataRequest) -> Dict[str, Any]:
+    """指定多个版本的查询参数，kind 见 MULTI_VERSION_QUERIES；非流式时按 run 拆分缓存"""
+    sql, sources = MULTI_VERSION_QUERIES[kind]
+    return dict(
+        sql=render_sql(sql, req.baseinfo.platform),
+        cache_prefix="scene:multi_version",
+        params=parse_od_versions(req.od_versions),
+        request_data=req.model_dump(),
+        tables=table_namespaces(req.baseinfo.platform, *sources),
+        per_run=True,
+        template=f"scene:multi_version:{kind}",
+    )
+
+
+@router.get("/all_scenes")
+async def api_all_scenes(platform: Platform):
+    """获取所有场景列表"""
+    payload = await execute_cached_query(router=router, **scenes_query(platform))
     return payload
 
 
 @router.post("/scene_data")
-async def api_scene_data(req: SceneDataRequest):
+async def api_scene_data(req: SceneDataRequest, format: ResultFormat = "json"):
     """获取所有场景的数据"""
     payload = await execute_cached_query(
         router=router,
-        sql=LASTEST_QUERY.format(
-            arch=req.baseinfo.platform),
-        cache_prefix="scene:latest",
-        request_data=req.model_dump()
+        **latest_query("detail", req),
+        result_format=check_format(format)
     )
     return payload
 
 
 @router.post("/multi_version_scene_data")
-async def api_multi_version_scene_data(req: MultiVersionSceneDataRequest):
+async def api_multi_version_scene_data(req: MultiVersionSceneDataRequest, format: ResultFormat = "json", stream: bool = False):
     """获取多版本场景数据"""
-    if not req.od_versions:
-        raise HTTPException(status_code=400, detail="od_versions不能为空")
-
-    # 构建版本占位符
-    version_placeholders = ", ".join(
-        [f"'{version}'" for version in req.od_versions])
-
     payload = await execute_cached_query(
         router=router,
-        sql=MULTI_VERSION_QUERY.format(
-            arch=req.baseinfo.platform,
-            version_placeholders=version_placeholders
-        ),
-        cache_prefix="scene:multi_version",
-        request_data=req.model_dump()
+        **multi_version_query("detail", req),
+        result_format=check_format(format, stream),
+        stream=stream
     )
     return payload
 
 
 @router.post("/scene_data_sp_summary")
-async def api_scene_data_sp_summary(req: SceneDataRequest):
+async def api_scene_data_sp_summary(req: SceneDataRequest, format: ResultFormat = "json"):
     """获取所有场景的数据"""
     payload = await execute_cached_query(
         router=router,
-        sql=LASTEST_QUERY_SP_SUMMARY.format(
-            arch=req.baseinfo.platform),
-        cache_prefix="scene:latest",
-        request_data=req.model_dump()
+        **latest_query("sp_summary", req),
+        result_format=check_format(format)
     )
     return payload
 
 
 @router.post("/multi_version_scene_data_sp_summary")
-async def api_multi_version_scene_data_sp_summary(req: MultiVersionSceneDataRequest):
+async def api_multi_version_scene_data_sp_summary(req: MultiVersionSceneDataRequest, format: ResultFormat = "json", stream: bool = False):
     """获取多版本场景数据"""
-    if not req.od_versions:
-        raise HTTPException(status_code=400, detail="od_versions不能为空")
-
-    # 构建版本占位符
-    version_placeholders = ", ".join(
-        [f"'{version}'" for version in req.od_versions])
-
     payload = await execute_cached_query(
         router=router,
-        sql=MULTI_VERSION_QUERY_SP_SUMMARY.format(
-            arch=req.baseinfo.platform,
-            version_placeholders=version_placeholders
-        ),
-        cache_prefix="scene:multi_version",
-        request_data=req.model_dump()
+        **multi_version_query("sp_summary", req),
+        result_format=check_format(format, stream),
+        stream=stream
     )
     return payload
 
 
 @router.post("/scene_data_ad_summary")
-async def api_scene_data_ad_summary(req: SceneDataRequest):
+async def api_scene_data_ad_summary(req: SceneDataRequest, format: ResultFormat = "json"):
     """获取所有场景的数据"""
     payload = await execute_cached_query(
         router=router,
-        sql=LASTEST_QUERY_AD_SUMMARY.format(
-            arch=req.baseinfo.platform),
-        cache_prefix="scene:latest",
-        request_data=req.model_dump()
+        **latest_query("ad_summary", req),
+        result_format=check_format(format)
     )
     return payload
 
 
 @router.post("/multi_version_scene_data_ad_summary")
-async def api_multi_version_scene_data_ad_summary(req: MultiVersionSceneDataRequest):
+async def api_multi_version_scene_data_ad_summary(req: MultiVersionSceneDataRequest, format: ResultFormat = "json", stream: bool = False):
     """获取多版本场景数据"""
-    if not req.od_versions:
-        raise HTTPException(status_code=400, detail="od_versions不能为空")
+    payload = await execute_cached_query(
+        router=router,
+        **multi_version_query("ad_summary", req),
+        result_format=check_format(format, stream),
+        stream=stream
+    )
+    return payload
 
-    # 构建版本占位符
-    version_placeholders = ", ".join(
-        [f"'{version}'" for version in req.od_versions])
 
-    payload = await execute_cached_query(
+@router.post("/bundle")
+async def api_scene_bundle(req: SceneBundleRequest, format: ResultFormat = "json"):
+    """
+    一次请求取回看板需要的多个子查询（场景列表、明细、SP/AD summary）
+
+    子查询各自走缓存、各自占用一个连接池连接并发执行，缓存键与单独的接口一致；
+    format 只作用于数据类子查询，场景列表始终是 {"rows": [...]}
+    """
+    if format == "arrow":
+        raise HTTPException(status_code=400, detail="bundle 只支持 format=json / columnar")
+    if not req.parts:
+        raise HTTPException(status_code=400, detail="parts不能为空")
+
+    parts = list(dict.fromkeys(req.parts))
+    queries = []
+    for part in parts:
+        if part == "scenes":
+            queries.append((scenes_query(req.baseinfo.platform), "json"))
+        elif req.od_versions:
+            sub = MultiVersionSceneDataRequest(
+                od_versions=req.od_versions, baseinfo=req.baseinfo)
+            queries.append((multi_version_query(part, sub), format))
+        else:
+            sub = SceneDataRequest(num=req.num, baseinfo=req.baseinfo)
+            queries.append((latest_query(part, sub), format))
+
+    bodies = await asyncio.gather(*[
+        execute_cached_query_bytes(router=router, **q, result_format=fmt)
+        for q, fmt in queries
+    ])
+    # 直接拼接各子查询缓存里的 JSON bytes，不再解码
+    content = b"{" + b",".join(
+        b'"' + part.encode() + b'":' + body for part, body in zip(parts, bodies)) + b"}"
+    record_payload("scene:bundle", format, len(content))
+    return Response(content=content, media_type="application/json")
+
+
+@router.post("/platform_compare")
+async def api_scene_platform_compare(req: ScenePlatformCompareRequest):
+    """
+    多平台对比：各平台并发查询同一类场景数据，合并后每行带 platform 字段
+
+    各平台的结果与单平台接口共用缓存
+    """
+    if not req.platforms:
+        raise HTTPException(status_code=400, detail="platforms不能为空")
+
+    def make_query(platform: str) -> Dict[str, Any]:
+        baseinfo = BaseInfo(platform=platform, data_fix=req.data_fix)
+        if req.od_versions:
+            return multi_version_query(req.part, MultiVersionSceneDataRequest(
+                od_versions=req.od_versions, baseinfo=baseinfo))
+        return latest_query(req.part, SceneDataRequest(num=req.num, baseinfo=baseinfo))
+
+    payload = await execute_platform_query(
         router=router,
-        sql=MULTI_VERSION_QUERY_AD_SUMMARY.format(
-            arch=req.baseinfo.platform,
-            version_placeholders=version_placeholders
-        ),
-        cache_prefix="scene:multi_version",
-        request_data=req.model_dump()
+        platforms=req.platforms,
+        make_query=make_query
     )
     return payload
@@ -1,93 +1,119 @@
-# from fastapi import APIRouter, HTTPException
-# from typing import Any, Dict, List, Optional
-# import os
-# import asyncio
-# from ..cache import cache_get, cache_set, stable_dumps
-# from ..models.selftest_model import ImportDataRequest
-# from ..query_db.selftest_query import INSERT_SQL
-# from ..services.download_from_jenkins import get_result_url
-# from ..services.import_data import import_data
-# from ..services.query_services import insert_data_to_db
-
-
-# router = APIRouter(prefix="/api/selftest", tags=["selftest"])
-
-# CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", "30"))
-
-# # 存储导入进度的全局字典
-# import_progress = {}
-
-
-# @router.get("/import_data")
-# async def api_import_data(req: ImportDataRequest):
-#     """根据trigger link将数据导入数据库"""
-#     import_id = f"{req.link_str}_{req.key_str}_{req.platform}"
-#     import_progress[import_id] = {
-#         "status": "starting", "progress": 0, "message": "开始导入数据..."}
-
-#     urls = [req.link_str]
-#     save_dir = "./datatmp/"
-#     os.makedirs(save_dir, exist_ok=True)
-#     records = []
-
-#     try:
-#         # 步骤1: 下载文件
-#         import_progress[import_id] = {
-#             "status": "downloading", "progress": 20, "message": "正在下载文件..."}
-#         get_result_url(urls, save_dir=save_dir)
-
-#         # 步骤2: 处理文件
-#         import_progress[import_id] = {
-#             "status": "processing", "progress": 40, "message": "正在处理文件..."}
-#         dirs = os.listdir(save_dir)
-#         total_dirs = len(dirs)
-
-#         for i, dir_name in enumerate(dirs):
-#             progress = 40 + int((i / total_dirs) * 30)
-#             import_progress[import_id] = {
-#                 "status": "processing",
-#                 "progress": progress,
-#                 "message": f"正在处理文件 {i+1}/{total_dirs}..."
-#             }
-#             records.extend(import_data(os.path.join(
-#                 save_dir, dir_name), req.key_str, req.platform))
-#             await asyncio.sleep(0.1)  # 模拟处理时间
-
-#         # 步骤3: 导入数据库
-#         import_progress[import_id] = {
-#             "status": "importing", "progress": 80, "message": "正在导入数据库..."}
-#         if records:
-#             result = insert_data_to_db(router, INSERT_SQL, records)
-#             if result["success"]:
-#                 import_progress[import_id] = {
-#                     "status": "completed", "progress": 100, "message": "数据导入成功"}
-#                 return {"status_code": 200, "message": "Data imported successfully", "import_id": import_id}
-#             else:
-#                 import_progress[import_id] = {
-#                     "status": "error", "progress": 0, "message": result['message']}
-#                 raise HTTPException(status_code=500, detail=result['message'])
-#         else:
-#             import_progress[import_id] = {
-#                 "status": "error", "progress": 0, "message": "没有可导入的记录"}
-#             raise HTTPException(status_code=400, detail="No records to import")
-
-#     except Exception as e:
-#         import_progress[import_id] = {
-#             "status": "error", "progress": 0, "message": str(e)}
-#         raise HTTPException(status_code=500, detail=str(e))
-#     finally:
-#         # 清理临时目录
-#         if os.path.exists(save_dir):
-#             for item in os.listdir(save_dir):
-#                 item_path = os.path.join(save_dir, item)
-#                 if os.path.isfile(item_path):
-#                     os.remove(item_path)
-#             os.rmdir(save_dir)
-
-
-# @router.get("/import_progress/{import_id}")
-# async def get_import_progress(import_id: str):
-#     """获取数据导入进度"""
-#     progress = import_progress.get(
-#         import_id, {"status": "unknown", "progress": 0, "message": "导入任务不存在"})
-#     return progress
\ No newline at end of file
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import os
+import re
+from ..cache import dumps_bytes
+from ..db import acquire
+from ..models.selftest_model import ImportDataRequest
+from ..services.download_from_jenkins import CSV_MEMBERS
+from ..services.import_jobs import (FINISHED_STATUSES, create_job, get_job, list_jobs,
+                                    retry_job)
+from .admin import check_admin_token
+
+router = APIRouter(prefix="/api/selftest", tags=["selftest"])
+
+# SSE 推送任务状态时查库的间隔，以及没有变化时发送保活注释的间隔（秒）
+IMPORT_JOB_EVENTS_INTERVAL_SECONDS = float(os.environ.get("IMPORT_JOB_EVENTS_INTERVAL_SECONDS", "1"))
+IMPORT_JOB_EVENTS_KEEPALIVE_SECONDS = 15
+
+# 任务表读写走主库，按 light 类别限流（见 db.ROUTE_CLASSES）
+JOBS_CACHE_PREFIX = "selftest:import_jobs"
+
+
+def db_conn():
+    return acquire(router.app.state.pg, JOBS_CACHE_PREFIX)
+
+
+@router.post("/import_jobs", status_code=202, dependencies=[Depends(check_admin_token)])
+async def api_create_import_job(req: ImportDataRequest):
+    """
+    新建导入任务：下载、解析与写库由 worker 进程（python -m app.worker）在后台完成，
+    通过 GET /import_jobs/{job_id} 或 /import_jobs/{job_id}/events 查看进度
+    """
+    urls = [u for u in re.split(r"[\s,]+", req.link_str) if u]
+    if not urls:
+        raise HTTPException(status_code=400, detail="link_str不能为空")
+    urls = [u if u.endswith("/") else u + "/" for u in urls]
+
+    tables = None
+    if req.key_str:
+        tables = [t for key, t in CSV_MEMBERS.items() if key == req.key_str]
+        if not tables:
+            raise HTTPException(
+                status_code=400, detail=f"key_str 只支持：{', '.join(CSV_MEMBERS)}")
+
+    async with db_conn() as conn:
+        return await create_job(conn, urls, req.platform, tables)
+
+
+@router.get("/import_jobs")
+async def api_list_import_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+):
+    """最近的导入任务（新的在前）"""
+    async with db_conn() as conn:
+        return {"rows": await list_jobs(conn, status, limit)}
+
+
+@router.get("/import_jobs/{job_id}")
+async def api_get_import_job(job_id: int):
+    """导入任务状态与各阶段进度"""
+    async with db_conn() as conn:
+        job = await get_job(conn, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return job
+
+
+@router.post("/import_jobs/{job_id}/retry", dependencies=[Depends(check_admin_token)])
+async def api_retry_import_job(job_id: int):
+    """重试失败的任务：已完成的阶段不重做（stage 完成后失败的任务只重做 merge）"""
+    async with db_conn() as conn:
+        job = await retry_job(conn, job_id)
+    if job is None:
+        raise HTTPException(status_code=409, detail="只有 failed 状态的任务可以重试")
+    return job
+
+
+@router.get("/import_jobs/{job_id}/events")
+async def api_import_job_events(job_id: int):
+    """
+    Server-Sent Events：任务有变化时推送一条 data（与 GET /import_jobs/{job_id} 相同），
+    任务结束（succeeded / failed）后关闭；任务被删除时推送 event: gone 后关闭
+    """
+    async with db_conn() as conn:
+        if await get_job(conn, job_id) is None:
+            raise HTTPException(status_code=404, detail="导入任务不存在")
+
+    async def events():
+        last_updated = None
+        last_sent = asyncio.get_running_loop().time()
+        while True:
+            try:
+                async with db_conn() as conn:
+                    job = await get_job(conn, job_id)
+                if job is None:
+                    # 任务已被删除
+                    yield b"event: gone\ndata: null\n\n"
+                    return
+            except HTTPException:
+                # 连接池忙（503），下一轮再查
+                job = None
+            now = asyncio.get_running_loop().time()
+            if job is not None and job["updated_at"] != last_updated:
+                last_updated = job["updated_at"]
+                last_sent = now
+                yield b"data: " + dumps_bytes(job) + b"\n\n"
+                if job["status"] in FINISHED_STATUSES:
+                    return
+            elif now - last_sent >= IMPORT_JOB_EVENTS_KEEPALIVE_SECONDS:
+                last_sent = now
+                yield b": keepalive\n\n"
+            await asyncio.sleep(IMPORT_JOB_EVENTS_INTERVAL_SECONDS)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
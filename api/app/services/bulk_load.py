@@ -0,0 +1,158 @@
+import time
+import uuid
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+import asyncpg
+from redis.asyncio import Redis
+
+from ..cache import bump_generations
+from ..query_db.selftest_query import (COUNT_STAGING_SQL, DELETE_STAGING_SQL, MERGE_SQL,
+                                       REFRESH_RUN_ROLLUPS_SQL, STAGING_RUNS_SQL)
+from ..query_db.tables import render_sql
+
+# 各数据表对应的中转表，以及 COPY 写入的列（load_id 之后的部分，与正式表一致）
+STAGING_TABLES = {
+    "stop_bar_detail": "stop_bar_detail_staging",
+    "stop_bar_summary": "stop_bar_summary_staging",
+    "advance_detection_summary": "advance_detection_summary_staging",
+}
+STAGING_COLUMNS = {
+    "stop_bar_detail": ("od_version", "scene_name", "direction", "lane",
+                        "ground_truth", "tp", "fp", "fn", "precision", "recall", "od_time"),
+    "stop_bar_summary": ("od_version", "scene_name", "direction", "lane",
+                         "ground_truth", "zone_counted", "abs_rate", "od_time"),
+    "advance_detection_summary": ("od_version", "scene_name", "zone_name", "direction",
+                                  "ground_truth", "zone_counted", "abs_rate", "od_time"),
+}
+
+
+class StagingMismatch(RuntimeError):
+    """中转表里的行数与写入时不一致：中转数据已丢失（如崩溃恢复清空了 UNLOGGED 表），需要重新写入"""
+
+
+def staging_rows(
+    load_id: uuid.UUID,
+    kind: str,
+    records: Iterable[Tuple],
+    fields: Optional[Sequence[str]] = None,
+) -> Iterable[Tuple]:
+    """
+    给 records 加上 load_id，按 STAGING_COLUMNS 的顺序输出
+
+    fields 为 records 的字段顺序（如 import_data.RECORD_FIELDS[kind]，可能多出 plat_form），
+    省略时认为与 STAGING_COLUMNS[kind] 一致
+    """
+    columns = STAGING_COLUMNS[kind]
+    if fields is None or tuple(fields) == columns:
+        return ((load_id, *r) for r in records)
+    idx = [list(fields).index(c) for c in columns]
+    return ((load_id, *[r[i] for i in idx]) for r in records)
+
+
+async def stage_records(
+    conn: asyncpg.Connection,
+    load_id: uuid.UUID,
+    batches: Mapping[str, Iterable[Tuple]],
+    fields: Optional[Mapping[str, Sequence[str]]] = None,
+) -> Dict[str, int]:
+    """COPY 各表的 records 进中转表（不单独开事务），返回各表写入的行数"""
+    unknown = [k for k in batches if k not in STAGING_TABLES]
+    if unknown:
+        raise ValueError(f"未知的数据表：{unknown}")
+    fields = fields or {}
+    rows: Dict[str, int] = {}
+    for kind, records in batches.items():
+        result = await conn.copy_records_to_table(
+            STAGING_TABLES[kind],
+            records=staging_rows(load_id, kind, records, fields.get(kind)),
+            columns=("load_id",) + STAGING_COLUMNS[kind],
+            schema_name="public",
+        )
+        # 返回形如 "COPY 12345"
+        rows[kind] = int(result.split()[-1])
+    return rows
+
+
+async def clear_staged(conn: asyncpg.Connection, load_id: uuid.UUID) -> None:
+    """删掉 load_id 在各中转表里的数据（重新导入前清理上次残留）"""
+    for staging in STAGING_TABLES.values():
+        await conn.execute(DELETE_STAGING_SQL.format(staging=staging), load_id)
+
+
+async def merge_staged(
+    conn: asyncpg.Connection,
+    platform: str,
+    load_id: uuid.UUID,
+    kinds: Sequence[str],
+    expected: Optional[Mapping[str, int]] = None,
+) -> int:
+    """
+    把 load_id 在中转表里的数据合并进正式表，重算涉及到的 run 的汇总表，再删掉这些中转数据
+
+    不单独开事务，需在调用方的事务里执行；返回 run 数。
+    expected 为 stage_records 当时写入的各表行数（中转数据在之前的事务里提交时传入），
+    合并前核对，对不上时什么都不做，抛 StagingMismatch
+    """
+    if expected is not None:
+        for kind in kinds:
+            staged = await conn.fetchval(
+                COUNT_STAGING_SQL.format(staging=STAGING_TABLES[kind]), load_id)
+            if staged != expected.get(kind, 0):
+                raise StagingMismatch(
+                    f"{STAGING_TABLES[kind]} 里 load_id={load_id} 有 {staged} 行，"
+                    f"写入时为 {expected.get(kind, 0)} 行")
+
+    runs = set()
+    for kind in kinds:
+        staging = STAGING_TABLES[kind]
+        await conn.execute(render_sql(MERGE_SQL[kind], platform), load_id)
+        for r in await conn.fetch(STAGING_RUNS_SQL.format(staging=staging), load_id):
+            runs.add((r["od_version"], r["od_minute"]))
+        await conn.execute(DELETE_STAGING_SQL.format(staging=staging), load_id)
+
+    if runs:
+        await conn.executemany(
+            REFRESH_RUN_ROLLUPS_SQL, [(platform, v, m) for v, m in sorted(runs)])
+    return len(runs)
+
+
+async def invalidate_loaded(redis: Optional[Redis], platform: str, kinds: Sequence[str]) -> None:
+    """提交之后调用：递增导入过的表的 generation，API 缓存随之失效"""
+    if redis is not None and kinds:
+        await bump_generations(redis, [f"{k}:{platform}" for k in kinds])
+
+
+async def bulk_load(
+    conn: asyncpg.Connection,
+    platform: str,
+    batches: Mapping[str, Iterable[Tuple]],
+    fields: Optional[Mapping[str, Sequence[str]]] = None,
+    redis: Optional[Redis] = None,
+) -> Dict[str, Any]:
+    """
+    批量导入一个平台的数据：batches 为 {数据表: records}，数据表见 STAGING_TABLES
+
+    在一个事务里：COPY 进中转表 -> 每张表一条 INSERT ... SELECT ... ON CONFLICT 合并
+    -> 重算涉及到的 run 的汇总表 -> 删掉本批中转数据；
+    提交之后递增这些表的 generation（传了 redis 时），API 缓存随之失效
+
+    conn 必须是主库连接；返回各表行数、run 数与耗时
+    """
+    load_id = uuid.uuid4()
+    start = time.perf_counter()
+
+    async with conn.transaction():
+        rows = await stage_records(conn, load_id, batches, fields)
+        loaded = [k for k, n in rows.items() if n]
+        runs = await merge_staged(conn, platform, load_id, loaded)
+    await invalidate_loaded(redis, platform, loaded)
+
+    seconds = time.perf_counter() - start
+    total = sum(rows.values())
+    return {
+        "load_id": str(load_id),
+        "rows": rows,
+        "runs": runs,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(total / seconds) if seconds > 0 else total,
+    }
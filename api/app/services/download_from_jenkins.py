@@ -1,20 +1,78 @@
+import logging
 import requests
 import os
+import threading
 import zipfile
 import pandas as pd
 import warnings
 import shutil
 import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+logger = logging.getLogger(__name__)
+
 RESULT_KEY = "od_perception_check"
 PERCEPTION_KEY = "od_perception"
 DEPLOY_KEY = "od_deploy"
 
+JENKINS_AUTH = (os.environ.get("JENKINS_USER", "qi_zhang"),
+                os.environ.get("JENKINS_PASSWORD", "123"))
+# 并发请求 / 下载的线程数，也是 keep-alive 连接池大小
+JENKINS_WORKERS = int(os.environ.get("JENKINS_WORKERS", "8"))
+# 连接失败、5xx、429 的重试次数与退避（0.5s, 1s, 2s ...）
+JENKINS_RETRIES = int(os.environ.get("JENKINS_RETRIES", "3"))
+JENKINS_BACKOFF_SECONDS = float(os.environ.get("JENKINS_BACKOFF_SECONDS", "0.5"))
+# 单次请求的连接 / 读取超时
+JENKINS_TIMEOUT_SECONDS = float(os.environ.get("JENKINS_TIMEOUT_SECONDS", "60"))
+
+_session = None
+_executor = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """所有线程共用的 requests.Session：keep-alive 连接池 + 带退避的重试"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=JENKINS_RETRIES,
+                backoff_factor=JENKINS_BACKOFF_SECONDS,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=JENKINS_WORKERS, pool_maxsize=JENKINS_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.auth = JENKINS_AUTH
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def get_executor():
+    """
+    所有线程共用的线程池（JENKINS_WORKERS 个线程，与连接池大小一致），并发导入时总请求数也不超过连接池
+
+    池里的任务不能再往池里提交任务并等待结果，否则会互相等死
+    """
+    global _executor
+    with _session_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=JENKINS_WORKERS, thread_name_prefix="jenkins")
+        return _executor
+
 
 def request_url(url):
     try:
-        response = requests.get(url, auth=('qi_zhang', '123'))
+        response = get_session().get(url, timeout=JENKINS_TIMEOUT_SECONDS)
         response.raise_for_status()
         return response
     except requests.exceptions.RequestException as e:
@@ -22,20 +80,43 @@ def request_url(url):
         return None
 
 
-def get_scene_name_from_url(url):
+def fetch_text(url, cache=None):
+    """
+    读取页面文本，失败时返回 None
+
+    cache 为一次解析内共用的 {URL: 文本}（同一个 consoleFull 多处会读），只缓存成功的结果
+    """
+    if cache is not None:
+        text = cache.get(url)
+        if text is not None:
+            return text
+    response = request_url(url)
+    if response is None:
+        return None
+    text = response.text
+    if cache is not None:
+        cache[url] = text
+    return text
+
+
+def fetch_console(url, cache=None):
+    """Jenkins 构建的 consoleFull（url 为构建地址，以 / 结尾）"""
+    return fetch_text(url.strip() + 'consoleFull', cache)
+
+
+def get_scene_name_from_url(url, cache=None):
     key_str = "-m src.perception.od_perception"
     split_str = "--inno_pc_path="
-    con_url = url.strip() + 'consoleFull'
-    response = request_url(con_url)
-    if response is None:
+    text = fetch_console(url, cache)
+    if text is None:
         return None
-    for i in response.text.split('\n'):
+    for i in text.split('\n'):
         if key_str in i:
             items = i.replace(key_str, '').split(split_str)[-1]
             items = items.strip().split(' ')[0].strip()
             return items
     key_str = "INNO_PC_PATH="
-    for i in response.text.split('\n'):
+    for i in text.split('\n'):
         if key_str in i:
             items = i.replace(key_str, '').split('/')[-1].strip()
             return items
@@ -50,73 +131,103 @@ def formater_name(name):
     return name
 
 
-def extract_od_perception_check_urls(url):
-    try:
-        response = request_url(url)
-        if response is None:
-            return [], [], None, f"get {url} consoleFull failed"
-        od_tag = get_od_tag(url)
-
-        urls_perception = []   # (url, base_name)
-        urls_check = []   # (url, base_name)
-        for i in response.text.split('\n'):
-            if RESULT_KEY not in i:
-                continue
+def parse_trigger_console(text):
+    """从 trigger 页面里找出各场景 od_perception / od_perception_check 子任务的地址"""
+    check_item_urls = []
+    perception_item_urls = []
+    for i in text.split('\n'):
+        if RESULT_KEY not in i:
+            continue
 
-            c = i.split('</div></div>')
-            for j in c:
-                if RESULT_KEY not in j:
-                    continue
-                if f'{DEPLOY_KEY}: :&nbsp;' in j:
-                    all_scene = j.split(f'{DEPLOY_KEY}: :&nbsp;')
-                elif f'{DEPLOY_KEY}_arm: :&nbsp;' in j:
-                    all_scene = j.split(f'{DEPLOY_KEY}_arm: :&nbsp;')
-                elif f'{DEPLOY_KEY}_x86: :&nbsp;' in j:
-                    all_scene = j.split(f'{DEPLOY_KEY}_x86: :&nbsp;')
-                else:
-                    continue
-                for scene in all_scene[1:]:
-                    items = scene.split('<br>')
-                    item_url = None
-                    for item in items:
-                        if item.strip() and RESULT_KEY in item:
-                            item_url = item.strip().replace(
-                                f'{RESULT_KEY}: :&nbsp; ', '')
-                            item_name = get_data_name_from_url(item_url)
-                            item_name = formater_name(item_name)
-                            urls_check.append((item_url, item_name))
-                        elif item.strip():
-                            tmp_key = PERCEPTION_KEY
-                            if tmp_key in item:
-                                pass
-                            elif f'{PERCEPTION_KEY}_arm' in item:
-                                tmp_key = f'{PERCEPTION_KEY}_arm'
-                            else:
-                                tmp_key = f'{PERCEPTION_KEY}_x86'
-                            replace_str = f'{tmp_key}: :&nbsp; '
-                            item_url = item.strip().replace(replace_str, '')
-                            item_name = get_scene_name_from_url(item_url)
-                            item_name = formater_name(item_name)
-                            urls_perception.append((item_url, item_name))
+        c = i.split('</div></div>')
+        for j in c:
+            if RESULT_KEY not in j:
+                continue
+            if f'{DEPLOY_KEY}: :&nbsp;' in j:
+                all_scene = j.split(f'{DEPLOY_KEY}: :&nbsp;')
+            elif f'{DEPLOY_KEY}_arm: :&nbsp;' in j:
+                all_scene = j.split(f'{DEPLOY_KEY}_arm: :&nbsp;')
+            elif f'{DEPLOY_KEY}_x86: :&nbsp;' in j:
+                all_scene = j.split(f'{DEPLOY_KEY}_x86: :&nbsp;')
+            else:
+                continue
+            for scene in all_scene[1:]:
+                items = scene.split('<br>')
+                item_url = None
+                for item in items:
+                    if item.strip() and RESULT_KEY in item:
+                        item_url = item.strip().replace(
+                            f'{RESULT_KEY}: :&nbsp; ', '')
+                        check_item_urls.append(item_url)
+                    elif item.strip():
+                        tmp_key = PERCEPTION_KEY
+                        if tmp_key in item:
+                            pass
+                        elif f'{PERCEPTION_KEY}_arm' in item:
+                            tmp_key = f'{PERCEPTION_KEY}_arm'
+                        else:
+                            tmp_key = f'{PERCEPTION_KEY}_x86'
+                        replace_str = f'{tmp_key}: :&nbsp; '
+                        item_url = item.strip().replace(replace_str, '')
+                        perception_item_urls.append(item_url)
+    return perception_item_urls, check_item_urls
+
+
+def extract_triggers(trigger_urls, cache=None):
+    """
+    解析多个 trigger，按传入顺序返回各自的 (urls_perception, urls_check, od_tag, msg)
+
+    先并发读各 trigger 页面，再把所有 trigger 的 od_tag 与子任务名字（各读一次子任务的 consoleFull）
+    放进同一个线程池里取，不嵌套线程池；cache 见 fetch_text，省略时只在本次调用内共用
+    """
+    cache = {} if cache is None else cache
+    executor = get_executor()
+    texts = list(executor.map(lambda u: fetch_text(u, cache), trigger_urls))
+    parsed = [parse_trigger_console(t) if t is not None else ([], []) for t in texts]
+
+    jobs = []
+    for url, text, (perception_item_urls, check_item_urls) in zip(trigger_urls, texts, parsed):
+        if text is None:
+            continue
+        jobs.append((get_od_tag, url))
+        jobs.extend((get_data_name_from_url, u) for u in check_item_urls)
+        jobs.extend((get_scene_name_from_url, u) for u in perception_item_urls)
+    results = iter(list(executor.map(lambda job: job[0](job[1], cache), jobs)))
+
+    extracted = []
+    for url, text, (perception_item_urls, check_item_urls) in zip(trigger_urls, texts, parsed):
+        if text is None:
+            extracted.append(([], [], None, f"get {url} consoleFull failed"))
+            continue
+        od_tag = next(results)
+        check_names = [next(results) for _ in check_item_urls]
+        perception_names = [next(results) for _ in perception_item_urls]
+        urls_perception = [(u, formater_name(n))
+                           for u, n in zip(perception_item_urls, perception_names)]   # (url, base_name)
+        urls_check = [(u, formater_name(n))
+                      for u, n in zip(check_item_urls, check_names)]   # (url, base_name)
+        msg = ''
         if len(urls_perception) != len(urls_check):
             all_uc = [i[1] for i in urls_check]
             all_u = [i[1] for i in urls_perception]
             faile_u = [i for i in all_u if i not in all_uc]
             msg = f"check {PERCEPTION_KEY} name not match:{faile_u}"
-        return urls_perception, urls_check, od_tag, msg
-    except requests.exceptions.RequestException as e:
-        mag = f"get {url} consoleFull failed: {e}"
-        return [], [], None, msg
+        extracted.append((urls_perception, urls_check, od_tag, msg))
+    return extracted
 
 
-def get_od_tag(url):
+def extract_od_perception_check_urls(url, cache=None):
+    """解析单个 trigger，见 extract_triggers；不能在 get_executor() 的任务里调用"""
+    return extract_triggers([url], cache)[0]
+
+
+def get_od_tag(url, cache=None):
     od_tag = None
     job_jira = None
-    con_url = url.strip() + 'consoleFull'
-    response = request_url(con_url)
-    if response is None:
+    text = fetch_console(url, cache)
+    if text is None:
         return None
-    for i in response.text.split('\n'):
+    for i in text.split('\n'):
         if 'od_tag' in i:
             items = i.split(' ')
             for item in items:
@@ -129,92 +240,137 @@ def get_od_tag(url):
     return None
 
 
-def unzip_file(zip_file_path, extract_dir, base_name):
-    target_path = os.path.join(extract_dir, base_name)
-    try:
-        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-            for i in zip_ref.namelist():
-                old_name = os.path.join(extract_dir, i)
-                if os.path.exists(old_name):
-                    os.rename(old_name, target_path)
-                    break
-        if os.path.exists(target_path):
-            return target_path
-    except Exception as e:
-        pass
-        # print(f"unzip {zip_file_path} failed: {e}")
+# 压缩包里需要解析的 CSV：文件名关键字 -> 数据表（见 import_data.CSV_KINDS）
+CSV_MEMBERS = {
+    "stop_bar_statistic_with_time": "stop_bar_detail",
+    "stop_bar_statistic_without_time": "stop_bar_summary",
+    "advance_detection_statistic_without_time": "advance_detection_summary",
+}
+# 下载的压缩包在内存里最多缓冲多少字节，超过后才写到临时文件
+ARCHIVE_SPOOL_BYTES = int(os.environ.get("ARCHIVE_SPOOL_BYTES", str(32 * 1024 * 1024)))
+
+
+def csv_kind(name):
+    """按文件名判断 CSV 属于哪张表，不需要的文件返回 None"""
+    if not name.endswith('.csv'):
+        return None
+    for key, kind in CSV_MEMBERS.items():
+        if key in name:
+            return kind
     return None
 
 
-def read_files(filepath, save_dir, base_name):
-    stop_bar_df = None
-    stop_bar_df_no_time = None
-    ad_df = None
-    perception_dir = None
-    files_dir = unzip_file(filepath, save_dir, base_name)
-    if files_dir is None:
-        return stop_bar_df, stop_bar_df_no_time, ad_df, perception_dir
-    for file in os.listdir(files_dir):
-        file_path = os.path.join(files_dir, file)
-        if file.endswith('.csv'):
-            if 'stop_bar_statistic_with_time' in file:
-                stop_bar_df = pd.read_csv(file_path)
-            elif 'stop_bar_statistic_without_time' in file:
-                stop_bar_df_no_time = pd.read_csv(file_path)
-            elif 'advance_detection_statistic_without_time' in file:
-                ad_df = pd.read_csv(file_path)
-        elif file.endswith('.tar.gz'):
-            perception_dir = extract_tar_gz(file_path, files_dir)
-    return stop_bar_df, stop_bar_df_no_time, ad_df, perception_dir
-
-
-def extract_tar_gz(file_path, target_dir):
-    new_dir = os.path.join(target_dir, os.path.basename(
-        file_path).replace('.tar.gz', ''))
-    os.makedirs(new_dir, exist_ok=True)
-    with tarfile.open(file_path, "r:gz") as tar:
-        tar.extractall(path=new_dir)
-    return new_dir
-
-
-def download_file(url, save_dir, base_name):
+def iter_archive_csvs(archive):
+    """
+    逐个打开压缩包里需要的 CSV，不解压到磁盘，yield (数据表, 文件名, 文件对象)
+
+    archive 为 zip 路径或文件对象；yield 出的文件对象只在下一次迭代前有效
+    """
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = os.path.basename(info.filename)
+            kind = None if info.is_dir() else csv_kind(name)
+            if kind is None:
+                continue
+            with zf.open(info) as f:
+                yield kind, name, f
+
+
+def extract_perception(archive, target_dir):
+    """需要感知结果时才调用：把压缩包里的 *.tar.gz 流式解到 target_dir 下，tar.gz 本身不落盘"""
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if not info.filename.endswith('.tar.gz'):
+                continue
+            new_dir = os.path.join(target_dir, os.path.basename(
+                info.filename).replace('.tar.gz', ''))
+            os.makedirs(new_dir, exist_ok=True)
+            with zf.open(info) as f, tarfile.open(fileobj=f, mode="r|gz") as tar:
+                tar.extractall(path=new_dir)
+            return new_dir
+    return None
+
+
+def read_files(archive, save_dir=None, base_name=None, with_perception=False):
+    """
+    直接从 SummaryResults.zip 里读三类 CSV；with_perception 时把感知结果解到 save_dir/base_name 下
+    """
+    frames = {}
     try:
-        zip_path = os.path.join(save_dir, f'{base_name}.zip')
+        for kind, name, f in iter_archive_csvs(archive):
+            frames[kind] = pd.read_csv(f)
+    except zipfile.BadZipFile as e:
+        # print(f"read {archive} failed: {e}")
+        return None, None, None, None
+    perception_dir = None
+    if with_perception:
+        perception_dir = extract_perception(archive, os.path.join(save_dir, base_name))
+    return (frames.get("stop_bar_detail"), frames.get("stop_bar_summary"),
+            frames.get("advance_detection_summary"), perception_dir)
+
 
-        response = requests.get(url, stream=True, auth=('qi_zhang', '123'))
+def fetch_archive(url):
+    """下载压缩包到 SpooledTemporaryFile（不大时只在内存里），失败时返回 None；用完需 close"""
+    archive = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES)
+    try:
+        response = get_session().get(url, stream=True, timeout=JENKINS_TIMEOUT_SECONDS)
         response.raise_for_status()
 
-        with open(zip_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        return zip_path
+        with response:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                archive.write(chunk)
+        archive.seek(0)
+        return archive
     except requests.exceptions.RequestException as e:
         # print(f"download {url} failed: {e}")
+        archive.close()
         return None
 
 
-def download_files(urls, zip_dir, unzip_dir):
-    for url, base_name in urls:
-        if base_name is None or base_name == 'None':
-            continue
-        zip_url = f'{url}artifact/SummaryResults.zip'
-        zip_path = download_file(
-            zip_url, save_dir=zip_dir, base_name=base_name)
-        if zip_path is None or not os.path.exists(zip_path):
-            continue
-        read_files(zip_path, unzip_dir, base_name)
-
-
-def get_data_name_from_url(url):
+def download_scene(url, base_name, handle):
+    archive = fetch_archive(f'{url}artifact/SummaryResults.zip')
+    if archive is None:
+        return False, None
+    with archive:
+        try:
+            return True, handle(base_name, archive)
+        except (zipfile.BadZipFile, OSError) as e:
+            # 压缩包损坏只丢掉这个场景，不影响同一次导入的其它场景
+            logger.warning("跳过场景 %s，压缩包无法读取（%s）：%s", base_name, url, e)
+            return False, None
+
+
+def download_files(urls, handle):
+    """
+    并发下载各场景的 SummaryResults.zip，在下载线程里调用 handle(场景名, 压缩包文件对象)
+
+    返回 {场景名: handle 的返回值}，下载失败或压缩包损坏的场景不在其中
+    """
+    urls = [(url, base_name) for url, base_name in urls
+            if base_name is not None and base_name != 'None']
+    done = list(get_executor().map(lambda u: download_scene(u[0], u[1], handle), urls))
+    return {base_name: result for (_, base_name), (ok, result) in zip(urls, done) if ok}
+
+
+def save_archive_csvs(unzip_dir):
+    """get_result_url 用的 handle：只把需要的 CSV 写到 unzip_dir/<场景名>/ 下，供 import_data 读取"""
+    def handle(base_name, archive):
+        scene_dir = os.path.join(unzip_dir, base_name)
+        os.makedirs(scene_dir, exist_ok=True)
+        for _, name, f in iter_archive_csvs(archive):
+            with open(os.path.join(scene_dir, name), 'wb') as out:
+                shutil.copyfileobj(f, out)
+        return scene_dir
+    return handle
+
+
+def get_data_name_from_url(url, cache=None):
     key_str = "Archive:  /home/demo/jenkins_dir/workspace/PS_IntegrationTest/od_perception_check"
     split_str = "/mnt/ODPerceptionResult/"
-    con_url = url.strip() + 'consoleFull'
-    response = requests.get(con_url, auth=('qi_zhang', '123'))
-    response = request_url(con_url)
-    if response is None:
+    text = fetch_console(url, cache)
+    if text is None:
         return None
-    for i in response.text.split('\n'):
+    for i in text.split('\n'):
         if key_str in i:
             items = i.replace(key_str, '').split(split_str)[-1]
             items = items.strip().split('/')[0].strip()
@@ -224,16 +380,22 @@ def get_data_name_from_url(url):
     return None
 
 
-def get_result_url(trigger_urls, save_dir='./data/'):
+def collect_check_urls(trigger_urls):
+    """
+    解析各 trigger，返回 (od_tag, dir_name, od_perception_check_urls, msg)
+
+    失败时 od_tag 为 None，msg 为原因；dir_name 为各 trigger 的构建号用 _ 连接
+    """
     od_perception_check_urls = None
     od_tag = None
     dir_name = None
     msg = ''
-    for s_url in trigger_urls:
+    # 各 trigger 并发解析，结果按传入顺序处理；consoleFull 只在本次调用内缓存
+    extracted = extract_triggers(trigger_urls)
+    for s_url, s_extracted in zip(trigger_urls, extracted):
         dir_name = s_url.split(
             '/')[-2] if dir_name is None else dir_name + f'_{s_url.split("/")[-2]}'
-        s_od_perception_urls, s_od_perception_check_urls, s_od_tag, s_url_msg = extract_od_perception_check_urls(
-            s_url)
+        s_od_perception_urls, s_od_perception_check_urls, s_od_tag, s_url_msg = s_extracted
         if s_od_tag is None or len(s_od_perception_check_urls) == 0:
             msg += f"\n {s_url_msg}"
             continue
@@ -242,10 +404,18 @@ def get_result_url(trigger_urls, save_dir='./data/'):
             od_perception_check_urls = s_od_perception_check_urls
         else:
             if od_tag.split('-job-')[0] != s_od_tag.split('-job-')[0]:
-                return f"od_tag not match: {od_tag} != {s_od_tag}"
+                return None, dir_name, [], f"od_tag not match: {od_tag} != {s_od_tag}"
             od_perception_check_urls.extend(s_od_perception_check_urls)
     if od_tag is None or len(od_perception_check_urls) == 0:
-        return f"can not extract od_perception_check URL or od_tag: {trigger_urls}, len(s_od_perception_check_urls)={len(od_perception_check_urls)}, s_od_tag={od_tag}"
+        return None, dir_name, [], f"can not extract od_perception_check URL or od_tag: {trigger_urls}, len(s_od_perception_check_urls)={len(od_perception_check_urls or [])}, s_od_tag={od_tag}{msg}"
+    return od_tag, dir_name, od_perception_check_urls, msg
+
+
+def get_result_url(trigger_urls, save_dir='./data/'):
+    """下载各场景的结果，只把需要的 CSV 写到 save_dir/<od_tag>_<dir_name>/unzip/<场景名>/ 下"""
+    od_tag, dir_name, od_perception_check_urls, msg = collect_check_urls(trigger_urls)
+    if od_tag is None:
+        return msg
 
     dir_name = f'{od_tag}_{dir_name}'
     final_dir = os.path.join(save_dir, dir_name)
@@ -253,11 +423,9 @@ def get_result_url(trigger_urls, save_dir='./data/'):
         shutil.rmtree(final_dir)
     os.makedirs(final_dir, exist_ok=True)
 
-    zip_dir = os.path.join(final_dir, 'org')
     unzip_dir = os.path.join(final_dir, 'unzip')
-    os.makedirs(zip_dir, exist_ok=True)
     os.makedirs(unzip_dir, exist_ok=True)
-    download_files(od_perception_check_urls, zip_dir, unzip_dir)
+    download_files(od_perception_check_urls, save_archive_csvs(unzip_dir))
 
 
 if __name__ == "__main__":
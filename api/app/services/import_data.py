@@ -1,17 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import logging
 import os
 import re
+import threading
 from datetime import datetime
-from config import conn
 from zoneinfo import ZoneInfo
 import pandas as pd
-import psycopg2
-from psycopg2.extras import execute_values
+from .download_from_jenkins import collect_check_urls, csv_kind, download_files, iter_archive_csvs
 
 DEFAULT_TZ_NAME = "Asia/Singapore"
 
+logger = logging.getLogger(__name__)
+
 
 def infer_time_from_filename(path: str, tz_name: str = DEFAULT_TZ_NAME) -> datetime:
     """
@@ -29,6 +31,18 @@ def infer_time_from_filename(path: str, tz_name: str = DEFAULT_TZ_NAME) -> datet
     return dt
 
 
+def infer_run_time(names) -> datetime:
+    """
+    目录名里没有时间的版本：同一次触发的所有场景、所有数据表共用结果 CSV 文件名里最早的时间
+
+    import_data 与 import_from_jenkins 都按这个规则，同一次触发不会因导入方式不同落到不同的 od_time
+    """
+    times = [infer_time_from_filename(name) for name in names]
+    if not times:
+        raise ValueError("没有可推断时间的结果 CSV")
+    return min(times)
+
+
 def infer_prefix_from_filename(path: str) -> str:
     """
     取文件名前缀：xxx_stop_bar_statistic... -> xxx
@@ -72,86 +86,240 @@ def get_od_version(dir_name: str, tz_name: str = DEFAULT_TZ_NAME) -> str:
         return od_version, None
 
 
-def import_data(csv_dir: str, key_str: str, platform: str):
+# 各类 CSV：列名 -> 表字段，以及哪些字段是计数 / 百分比、哪一列的 total 行要过滤
+# stop_bar_summary / advance_detection_summary 的列名是按 stop_bar 明细 CSV 的命名习惯推测的，
+# 仓库里还没有这两类的实际文件，拿到后在这里核对（列名比较时忽略大小写和首尾空白）；
+# 对不上的文件在 Jenkins 导入时跳过，某类文件全部对不上时整个导入失败（见 import_from_jenkins）
+CSV_KINDS = {
+    # stop bar 明细（有 TP/FP/FN）
+    "stop_bar_detail": {
+        "columns": {
+            "Direction": "direction",
+            "Lane": "lane",
+            "Ground Truth": "ground_truth",
+            "Zone Counted Times - TP": "tp",
+            "Zone Counted Times - FP": "fp",
+            "Zone Counted Times - FN": "fn",
+            "Precision": "precision",
+            "Recall": "recall",
+        },
+        "total_column": "lane",
+        "counts": ("ground_truth", "tp", "fp", "fn"),
+        "percents": ("precision", "recall"),
+    },
+    # stop bar absolute（只有计数次数）
+    "stop_bar_summary": {
+        "columns": {
+            "Direction": "direction",
+            "Lane": "lane",
+            "Ground Truth": "ground_truth",
+            "Zone Counted Times": "zone_counted",
+            "Absolute Rate": "abs_rate",
+        },
+        "total_column": "lane",
+        "counts": ("ground_truth", "zone_counted"),
+        "percents": ("abs_rate",),
+    },
+    # advance detection absolute（按检测区域）
+    "advance_detection_summary": {
+        "columns": {
+            "Zone Name": "zone_name",
+            "Direction": "direction",
+            "Ground Truth": "ground_truth",
+            "Zone Counted Times": "zone_counted",
+            "Absolute Rate": "abs_rate",
+        },
+        "total_column": "zone_name",
+        "counts": ("ground_truth", "zone_counted"),
+        "percents": ("abs_rate",),
+    },
+}
+
+# 每类 records 的字段顺序（与对应表的列一致）
+# stop_bar_detail 多一列 plat_form，与 selftest_query.INSERT_SQL 一致
+RECORD_FIELDS = {
+    "stop_bar_detail": ("od_version", "plat_form", "scene_name", "direction", "lane",
+                        "ground_truth", "tp", "fp", "fn", "precision", "recall", "od_time"),
+    "stop_bar_summary": ("od_version", "scene_name", "direction", "lane",
+                         "ground_truth", "zone_counted", "abs_rate", "od_time"),
+    "advance_detection_summary": ("od_version", "scene_name", "zone_name", "direction",
+                                  "ground_truth", "zone_counted", "abs_rate", "od_time"),
+}
+
+
+def to_int_series(s: pd.Series) -> pd.Series:
+    """计数列转 int（可能是 0.0/1.0 这种 float），四舍五入"""
+    x = pd.to_numeric(s, errors="coerce").fillna(0)
+    return x.round(0).astype(int)
+
+
+def to_pct_series(s: pd.Series) -> pd.Series:
+    """百分比列：NUMERIC(5,2)，范围 [0,100]"""
+    x = pd.to_numeric(s, errors="coerce").fillna(0.0)
+    return x.clip(lower=0.0, upper=100.0).round(2)
+
+
+def normalize_column(name) -> str:
+    return str(name).strip().lower()
+
+
+def read_kind_csv(csv_path, kind: str) -> pd.DataFrame:
+    """
+    只读取该类 CSV 需要的列，缺列时报错；csv_path 也可以是已打开的文件对象
+
+    列名忽略大小写和首尾空白，读出后统一改成 CSV_KINDS 里的写法
+    """
+    columns = {normalize_column(c): c for c in CSV_KINDS[kind]["columns"]}
+    header = []
+
+    def use_column(c):
+        header.append(c)
+        return normalize_column(c) in columns
+
+    df = pd.read_csv(csv_path, usecols=use_column)
+    df = df.rename(columns=lambda c: columns[normalize_column(c)])
+    missing = [c for c in columns.values() if c not in df.columns]
+    if missing:
+        raise ValueError(f"CSV 缺少列: {missing}，实际列为: {list(dict.fromkeys(header))}")
+    return df
+
+
+def build_records(df: pd.DataFrame, kind: str, od_version: str, platform: str,
+                  scene_name: str, stat_time: datetime) -> list:
+    """
+    把一个 CSV 的 DataFrame 转成 records（字段顺序见 RECORD_FIELDS[kind]）
+
+    清洗全部按列向量化完成，最后按列取出 Python 列表再 zip 成 tuple，不逐行访问 DataFrame
+    """
+    spec = CSV_KINDS[kind]
+    df = df.rename(columns=spec["columns"])
+
+    # 过滤 total/Total 行（忽略大小写 & 去掉空格）
+    total_col = spec["total_column"]
+    df[total_col] = df[total_col].astype(str).str.strip()
+    df = df[df[total_col].str.lower() != "total"]
+
+    if total_col == "lane":
+        # lane 转 int（表里是 INTEGER），非数字的行丢掉
+        lane = pd.to_numeric(df["lane"], errors="coerce")
+        df = df[lane.notna()].assign(lane=lane[lane.notna()].astype(int))
+
+    df = df.assign(
+        direction=df["direction"].astype(str).str.strip(),
+        **{c: to_int_series(df[c]) for c in spec["counts"]},
+        **{c: to_pct_series(df[c]) for c in spec["percents"]},
+    )
+
+    constants = {"od_version": od_version, "plat_form": platform,
+                 "scene_name": scene_name, "od_time": stat_time}
+    fields = RECORD_FIELDS[kind]
+    columns = [[constants[f]] * len(df) if f in constants else df[f].tolist() for f in fields]
+    return list(zip(*columns))
+
+
+def import_data(csv_dir: str, key_str: str, platform: str, kind: str = "stop_bar_detail"):
     """
     从 CSV 导入数据到数据库
+
+    csv_dir/unzip 下每个子目录是一个场景，文件名包含 key_str 的 CSV 按 kind 解析，
+    返回 records（字段顺序见 RECORD_FIELDS[kind]）
     """
+    if kind not in CSV_KINDS:
+        raise ValueError(f"未知的 CSV 类型：{kind}")
     dir_name = os.path.basename(csv_dir)
     od_version, stat_time = get_od_version(dir_name)
     csv_sub_dir = "unzip"
     search_dir = os.path.join(csv_dir, csv_sub_dir)
-    records = []
-    for sub_dir in os.listdir(search_dir):
-        for sub_dir in os.listdir(search_dir):
-            scene_name = sub_dir
-            scene_abs_dir = os.path.join(search_dir, sub_dir)
-            for i_file in os.listdir(scene_abs_dir):
-                if key_str not in i_file:
-                    continue
-                csv_path = os.path.join(scene_abs_dir, i_file)
-                if stat_time is None:
-                    stat_time = infer_time_from_filename(csv_path)
-                # 读 CSV
-                df = pd.read_csv(csv_path)
-                # 兼容列名（你文件里列名如下）
-                col_direction = "Direction"
-                col_lane = "Lane"
-                col_gt = "Ground Truth"
-                col_tp = "Zone Counted Times - TP"
-                col_fp = "Zone Counted Times - FP"
-                col_fn = "Zone Counted Times - FN"
-                col_precision = "Precision"
-                col_recall = "Recall"
-
-                for c in [col_direction, col_lane, col_gt, col_tp, col_fp, col_fn, col_precision, col_recall]:
-                    if c not in df.columns:
-                        raise ValueError(
-                            f"CSV 缺少列: {c}，实际列为: {list(df.columns)}")
-
-                # 过滤 lane=total/Total（忽略大小写 & 去掉空格）
-                lane_str = df[col_lane].astype(str).str.strip()
-                df = df[~(lane_str.str.lower() == "total")].copy()
-
-                # lane 转 int（表里是 INTEGER）
-                df["lane_int"] = pd.to_numeric(df[col_lane], errors="coerce")
-                df = df[df["lane_int"].notna()].copy()
-                df["lane_int"] = df["lane_int"].astype(int)
-
-                # 计数列转 int（FP/FN 可能是 float：0.0/1.0）
-                def to_int_series(s: pd.Series) -> pd.Series:
-                    x = pd.to_numeric(s, errors="coerce").fillna(0)
-                    # 允许 0.0/1.0 这种，取四舍五入后转 int
-                    return x.round(0).astype(int)
-
-                df["gt"] = to_int_series(df[col_gt])
-                df["tp"] = to_int_series(df[col_tp])
-                df["fp"] = to_int_series(df[col_fp])
-                df["fn"] = to_int_series(df[col_fn])
-
-                # precision/recall：NUMERIC(5,2)，范围 [0,100]
-                def to_pct(s: pd.Series) -> pd.Series:
-                    x = pd.to_numeric(s, errors="coerce").fillna(0.0)
-                    x = x.clip(lower=0.0, upper=100.0)
-                    return x.round(2)
-
-                df["precision"] = to_pct(df[col_precision])
-                df["recall"] = to_pct(df[col_recall])
-
-                # 组装 records
-                for _, r in df.iterrows():
-                    records.append((
-                        od_version,
-                        platform,
-                        scene_name,
-                        str(r[col_direction]).strip(),
-                        int(r["lane_int"]),
-                        int(r["gt"]),
-                        int(r["tp"]),
-                        int(r["fp"]),
-                        int(r["fn"]),
-                        float(r["precision"]),
-                        float(r["recall"]),
-                        stat_time,
-                    ))
+    scenes = {}
+    for scene_name in sorted(os.listdir(search_dir)):
+        scene_abs_dir = os.path.join(search_dir, scene_name)
+        if os.path.isdir(scene_abs_dir):
+            scenes[scene_name] = sorted(os.listdir(scene_abs_dir))
+    names = [name for files in scenes.values() for name in files if csv_kind(name)]
+    if stat_time is None and names:
+        stat_time = infer_run_time(names)
 
+    records = []
+    for scene_name, files in scenes.items():
+        for i_file in files:
+            if key_str not in i_file:
+                continue
+            csv_path = os.path.join(search_dir, scene_name, i_file)
+            df = read_kind_csv(csv_path, kind)
+            records.extend(build_records(
+                df, kind, od_version, platform, scene_name, stat_time))
     return records
+
+
+def read_archive_frames(scene_name: str, archive) -> list:
+    """
+    download_files 的 handle：在下载线程里直接从压缩包解析 CSV，返回 [(数据表, 文件名, DataFrame)]
+
+    列与 CSV_KINDS 对不上的文件记日志后跳过（DataFrame 为 None，文件名仍参与时间推断），
+    不影响同一压缩包里其它 CSV 的导入
+    """
+    frames = []
+    for kind, name, f in iter_archive_csvs(archive):
+        try:
+            df = read_kind_csv(f, kind)
+        except ValueError as e:
+            logger.warning("跳过 %s/%s（%s）：%s", scene_name, name, kind, e)
+            df = None
+        frames.append((kind, name, df))
+    return frames
+
+
+def import_from_jenkins(trigger_urls, platform: str, on_progress=None, kinds=None):
+    """
+    不落盘的导入：并发下载各场景的 SummaryResults.zip，直接从压缩包里解析 CSV
+
+    返回 (od_version, {数据表: records})，records 的字段顺序见 RECORD_FIELDS；
+    od_version / 时间的推断规则与 import_data 读取 get_result_url 目录时一致（见 infer_run_time）；
+    on_progress(已完成场景数, 场景总数) 在下载线程里调用。
+    kinds 为要导入的数据表（默认全部），其中某类的文件全部解析失败时报错，而不是少导一张表
+    """
+    od_tag, dir_name, check_urls, msg = collect_check_urls(trigger_urls)
+    if od_tag is None:
+        raise ValueError(msg)
+    od_version, stat_time = get_od_version(f"{od_tag}_{dir_name}")
+
+    handle = read_archive_frames
+    if on_progress is not None:
+        total = len(check_urls)
+        done = [0]
+        lock = threading.Lock()
+        on_progress(0, total)
+
+        def handle(scene_name, archive):
+            try:
+                return read_archive_frames(scene_name, archive)
+            finally:
+                with lock:
+                    done[0] += 1
+                    on_progress(done[0], total)
+
+    frames = download_files(check_urls, handle)
+    names = [name for items in frames.values() for _, name, _ in items]
+    if not names:
+        raise ValueError(f"没有可导入的 CSV：{trigger_urls}")
+    if stat_time is None:
+        stat_time = infer_run_time(names)
+
+    if kinds is None:
+        kinds = list(CSV_KINDS)
+    records = {}
+    rejected = {}
+    for scene_name in sorted(frames):
+        for kind, name, df in frames[scene_name]:
+            if kind not in kinds:
+                continue
+            if df is None:
+                rejected.setdefault(kind, []).append(f"{scene_name}/{name}")
+                continue
+            records.setdefault(kind, []).extend(build_records(
+                df, kind, od_version, platform, scene_name, stat_time))
+    failed = {kind: files for kind, files in rejected.items() if kind not in records}
+    if failed:
+        detail = "；".join(f"{kind}: {', '.join(files)}" for kind, files in failed.items())
+        raise ValueError(f"以下类型的 CSV 全部与 CSV_KINDS 的列不符（详见日志）：{detail}")
+    return od_version, records
@@ -0,0 +1,99 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import asyncpg
+import orjson
+
+from ..query_db.selftest_query import (CLAIM_IMPORT_JOB_SQL, CREATE_IMPORT_JOB_SQL,
+                                       FAIL_IMPORT_JOB_SQL, FINISH_IMPORT_JOB_SQL,
+                                       GET_IMPORT_JOB_SQL, LIST_IMPORT_JOBS_SQL,
+                                       RETRY_IMPORT_JOB_SQL, UPDATE_IMPORT_JOB_PROGRESS_SQL)
+
+# 每个任务自动重试的次数，以及重试前等待的秒数（乘以已尝试次数）
+IMPORT_JOB_MAX_ATTEMPTS = int(os.environ.get("IMPORT_JOB_MAX_ATTEMPTS", "3"))
+IMPORT_JOB_RETRY_DELAY_SECONDS = float(os.environ.get("IMPORT_JOB_RETRY_DELAY_SECONDS", "30"))
+# worker 写心跳（连同进度）的间隔；超过 IMPORT_JOB_STALE_SECONDS 没有心跳的运行中任务由其他 worker 接管
+IMPORT_JOB_HEARTBEAT_SECONDS = float(os.environ.get("IMPORT_JOB_HEARTBEAT_SECONDS", "5"))
+IMPORT_JOB_STALE_SECONDS = float(os.environ.get("IMPORT_JOB_STALE_SECONDS", "120"))
+
+# 任务依次经过的阶段，见 db/init.sql: import_job
+JOB_STAGES = ("fetch", "stage", "merge")
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+def job_payload(row: asyncpg.Record) -> Dict[str, Any]:
+    """数据库行 -> 接口返回的任务；progress 在库里是 JSONB 文本"""
+    job = dict(row)
+    progress = job.get("progress")
+    job["progress"] = orjson.loads(progress) if isinstance(progress, (str, bytes)) else (progress or {})
+    job["load_id"] = str(job["load_id"])
+    return job
+
+
+async def create_job(
+    conn: asyncpg.Connection,
+    trigger_urls: Sequence[str],
+    platform: str,
+    tables: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    row = await conn.fetchrow(
+        CREATE_IMPORT_JOB_SQL, list(trigger_urls), platform,
+        list(tables) if tables else None, IMPORT_JOB_MAX_ATTEMPTS)
+    return job_payload(row)
+
+
+async def get_job(conn: asyncpg.Connection, job_id: int) -> Optional[Dict[str, Any]]:
+    row = await conn.fetchrow(GET_IMPORT_JOB_SQL, job_id)
+    return job_payload(row) if row else None
+
+
+async def list_jobs(conn: asyncpg.Connection, status: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    return [job_payload(r) for r in await conn.fetch(LIST_IMPORT_JOBS_SQL, status, limit)]
+
+
+async def retry_job(conn: asyncpg.Connection, job_id: int) -> Optional[Dict[str, Any]]:
+    """失败的任务重新排队，从失败的阶段继续；任务不存在或不是 failed 时返回 None"""
+    row = await conn.fetchrow(RETRY_IMPORT_JOB_SQL, job_id)
+    return job_payload(row) if row else None
+
+
+async def claim_job(conn: asyncpg.Connection, worker: str) -> Optional[Dict[str, Any]]:
+    """领取一个可执行的任务（排队中，或 worker 心跳超时的），没有时返回 None"""
+    row = await conn.fetchrow(CLAIM_IMPORT_JOB_SQL, worker, IMPORT_JOB_STALE_SECONDS)
+    return job_payload(row) if row else None
+
+
+async def update_progress(
+    conn: asyncpg.Connection,
+    job_id: int,
+    worker: str,
+    stage: Optional[str],
+    progress: Dict[str, Any],
+    od_version: Optional[str] = None,
+) -> bool:
+    """写回进度并续心跳；任务已被其他 worker 接管时返回 False"""
+    status = await conn.execute(
+        UPDATE_IMPORT_JOB_PROGRESS_SQL, job_id, worker, stage,
+        orjson.dumps(progress).decode(), od_version)
+    return status.endswith(" 1")
+
+
+async def finish_job(conn: asyncpg.Connection, job_id: int, worker: str, progress: Dict[str, Any]) -> bool:
+    status = await conn.execute(
+        FINISH_IMPORT_JOB_SQL, job_id, worker, orjson.dumps(progress).decode())
+    return status.endswith(" 1")
+
+
+async def fail_job(
+    conn: asyncpg.Connection,
+    job_id: int,
+    worker: str,
+    progress: Dict[str, Any],
+    error: str,
+    attempts: int,
+) -> bool:
+    """记录失败：还有重试次数时延迟后重新排队，否则标记为 failed"""
+    status = await conn.execute(
+        FAIL_IMPORT_JOB_SQL, job_id, worker, orjson.dumps(progress).decode(), error,
+        IMPORT_JOB_RETRY_DELAY_SECONDS * max(1, attempts))
+    return status.endswith(" 1")
@@ -1,23 +1,209 @@
-from fastapi import APIRouter
-from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from datetime import datetime
+import asyncio
 import os
+import re
+import time
+import orjson
 # from psycopg2.extras import execute_values
-from ..cache import cache_get, cache_set, stable_dumps
-from ..models.common import TimeRange
+from ..cache import (cache_generations, cache_get_bytes, cache_get_many_bytes,
+                     cache_get_or_compute_bytes, cache_key_digest, cache_set_bytes,
+                     cache_set_many_bytes, cache_ttls, dumps_bytes, single_flight)
+from ..db import acquire, profiling_connection
+from ..metrics import db_timer, record_db, record_payload, serialize_timer
+from ..profiling import (EXPLAIN_PREFIX, explain_started, explain_finished, profile_trigger,
+                         record_plan)
+from ..models.common import ResultFormat, TimeRange
+from .result_format import encode_result, media_type_of, to_columnar
 
 CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", "30"))
+# 流式查询每批从服务端游标取的行数
+QUERY_STREAM_BATCH_ROWS = int(os.environ.get("QUERY_STREAM_BATCH_ROWS", "2000"))
+# 流式结果累计超过该字节数就不再写缓存，保证单请求内存有上限
+CACHE_STREAM_MAX_BYTES = int(os.environ.get("CACHE_STREAM_MAX_BYTES", str(32 * 1024 * 1024)))
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
-async def execute_cached_query(
+# 按 run 拆分缓存时用来识别每行属于哪个 run 的列
+RUN_COLUMNS = ("od_version", "od_time_minute")
+
+# od_version_minute 形如 daily_build-2026-01-08_22:09，版本名本身可能带 '-'
+OD_VERSION_MINUTE_RE = re.compile(r"^(.+)-(\d{4}-\d{2}-\d{2}_\d{2}:\d{2})$")
+
+
+def db_connection(router: APIRouter, cache_prefix: str):
+    """只读查询的连接：按路由类别限流，有可用只读副本时走副本，见 db.acquire"""
+    state = router.app.state
+    return acquire(state.pg, cache_prefix, getattr(state, "replicas", None))
+
+
+# 后台 EXPLAIN 任务的引用，防止被 GC
+_explain_tasks: Set["asyncio.Task[None]"] = set()
+
+
+def maybe_explain(
+    router: APIRouter,
+    cache_prefix: str,
+    template: str,
+    sql: str,
+    params: Sequence[Any],
+    seconds: float,
+) -> None:
+    """
+    开启 QUERY_PROFILE 时，对慢查询或抽中的查询在后台用 EXPLAIN ANALYZE 重跑一次，
+    执行计划记录到 profiling 的环形缓冲区，不阻塞当前请求
+
+    重跑优先在只读副本上执行，且不占路由类别的限流名额，见 db.profiling_connection
+    """
+    trigger = profile_trigger(seconds)
+    if trigger is None:
+        return
+    explain_started()
+
+    async def run() -> None:
+        try:
+            state = router.app.state
+            async with profiling_connection(state.pg, getattr(state, "replicas", None)) as conn:
+                plan = await conn.fetchval(EXPLAIN_PREFIX + sql, *params)
+            record_plan(template, cache_prefix, params, seconds, trigger, plan)
+        except Exception as e:
+            record_plan(template, cache_prefix, params, seconds, trigger, error=str(e))
+        finally:
+            explain_finished()
+
+    task = asyncio.create_task(run())
+    _explain_tasks.add(task)
+    task.add_done_callback(_explain_tasks.discard)
+
+
+def table_namespaces(platform: str, *sources: str) -> List[str]:
+    """生成 execute_cached_query 的 tables 参数，如 stop_bar_detail:x86"""
+    return [f"{source}:{platform}" for source in sources]
+
+
+def split_od_version_minute(od_version_minute: str) -> Tuple[str, datetime]:
+    """
+    将前端传入的 od_version_minute 拆成 (od_version, od_minute)
+
+    od_minute 与表中的生成列一致：UTC、截断到分钟、不带时区
+    """
+    m = OD_VERSION_MINUTE_RE.match(od_version_minute.strip())
+    if not m:
+        raise ValueError(
+            f"od_version 格式错误（需要 <version>-YYYY-MM-DD_HH:MI）：{od_version_minute}")
+    return m.group(1), datetime.strptime(m.group(2), "%Y-%m-%d_%H:%M")
+
+
+def split_od_version_minutes(od_version_minutes: List[str]) -> Tuple[List[str], List[datetime]]:
+    """批量拆分，返回可直接作为 unnest($1::text[], $2::timestamp[]) 参数的两个数组"""
+    pairs = [split_od_version_minute(x) for x in od_version_minutes]
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+async def build_cache_key(
+    r,
+    sql: str,
+    cache_prefix: str,
+    params: Tuple[Any, ...],
+    time_range: Optional[TimeRange],
+    request_data: Optional[Dict[str, Any]],
+    tables: Sequence[str],
+    result_format: str,
+) -> str:
+    """构建缓存键（无 Redis 时也用于进程内 single-flight）"""
+    cache_data = {"sql": sql, "params": params, "format": result_format}
+    if time_range:
+        cache_data["time_range"] = time_range.model_dump() if hasattr(
+            time_range, 'model_dump') else time_range
+    if request_data:
+        cache_data["request"] = request_data
+    if r and tables:
+        cache_data["gen"] = await cache_generations(r, tables)
+    return cache_key_digest(cache_prefix, cache_data)
+
+
+async def execute_per_run_query_bytes(
+    router: APIRouter,
+    sql: str,
+    cache_prefix: str,
+    params: Tuple[List[str], List[datetime]],
+    tables: Sequence[str] = (),
+    result_format: ResultFormat = "json",
+    template: Optional[str] = None
+) -> bytes:
+    """
+    多版本查询按 run 拆分缓存：每个 (od_version, od_minute) 的行单独一条缓存
+
+    缓存键只包含 sql（已确定平台与表）、run 和数据表 generation，与其它 run 怎么组合无关；
+    缺的 run 合并成一次查询取回，结果按请求里 run 的顺序拼接（run 内按 SQL 的 ORDER BY）。
+    sql 的参数须为 unnest($1::text[], $2::timestamp[])，结果须包含 RUN_COLUMNS
+    """
+    r = router.app.state.redis if hasattr(router, 'app') else None
+    runs = list(dict.fromkeys(zip(*params)))
+    gens = await cache_generations(r, tables) if r and tables else []
+    keys = [cache_key_digest(f"{cache_prefix}:run", {"sql": sql, "run": run, "gen": gens})
+            for run in runs]
+    ttls = cache_ttls(cache_prefix)
+
+    async def fetch_runs(missing: List[int]) -> Dict[str, bytes]:
+        grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {
+            (runs[i][0], runs[i][1].strftime("%Y-%m-%d_%H:%M")): [] for i in missing}
+        run_params = ([runs[i][0] for i in missing], [runs[i][1] for i in missing])
+        async with db_connection(router, cache_prefix) as conn:
+            with db_timer(template or cache_prefix) as m:
+                rows = await conn.fetch(sql, *run_params)
+                m["rows"] = len(rows)
+        maybe_explain(router, cache_prefix, template or cache_prefix, sql, run_params, m["seconds"])
+        with serialize_timer(cache_prefix, "json"):
+            for row in rows:
+                grouped[tuple(row[c] for c in RUN_COLUMNS)].append(dict(row))
+            bodies = {keys[i]: dumps_bytes(part) for i, part in zip(missing, grouped.values())}
+        await cache_set_many_bytes(r, list(bodies.items()), ttls)
+        return bodies
+
+    bodies = await cache_get_many_bytes(r, keys)
+    missing = [i for i, body in enumerate(bodies) if body is None]
+    if missing:
+        fetched = await single_flight(
+            cache_key_digest(f"{cache_prefix}:runs", [keys[i] for i in missing]),
+            lambda: fetch_runs(missing))
+        for i in missing:
+            bodies[i] = fetched[keys[i]]
+
+    if result_format == "json":
+        # 每个 run 的缓存是 JSON 数组，去掉方括号直接拼接
+        return b'{"rows":[' + b",".join(body[1:-1] for body in bodies if body != b"[]") + b"]}"
+    rows = [row for body in bodies for row in orjson.loads(body)]
+    if rows:
+        columns = list(rows[0])
+    else:
+        # 空结果也要带上列名（与 execute_cached_query_bytes 一致），从 prepared statement 取
+        async with db_connection(router, cache_prefix) as conn:
+            stmt = await conn.prepare(sql)
+            columns = [a.name for a in stmt.get_attributes()]
+    with serialize_timer(cache_prefix, result_format):
+        payload = encode_result(result_format, columns, [[row[c] for c in columns] for row in rows])
+        return payload if isinstance(payload, bytes) else dumps_bytes(payload)
+
+
+async def execute_cached_query_bytes(
     router: APIRouter,
     sql: str,
     cache_prefix: str,
     params: Tuple[Any, ...] = (),
     time_range: Optional[TimeRange] = None,
-    request_data: Optional[Dict[str, Any]] = None
-) -> Dict[str, Any]:
+    request_data: Optional[Dict[str, Any]] = None,
+    tables: Sequence[str] = (),
+    result_format: ResultFormat = "json",
+    per_run: bool = False,
+    template: Optional[str] = None
+) -> bytes:
     """
-    执行带缓存的数据库查询
+    执行带缓存的数据库查询，返回 JSON bytes
+
+    未命中时查询结果只用 orjson 序列化一次，命中时直接返回缓存里的 bytes
 
     Args:
         sql: SQL查询语句
@@ -25,38 +211,198 @@ async def execute_cached_query(
         params: SQL查询参数
         time_range: 时间范围（用于缓存键）
         request_data: 请求数据（用于缓存键）
+        tables: 查询依赖的数据表 namespace（如 stop_bar_detail:x86），
+            其 generation 会写进缓存键，导入后自动失效
+        result_format: 结果格式，见 services/result_format.py
+        per_run: 多版本查询按 run 拆分缓存，见 execute_per_run_query_bytes
+        template: SQL 模板名，用于 /metrics 里的查询耗时与行数，默认为 cache_prefix
 
     Returns:
-        查询结果字典
+        按 result_format 编码的结果 bytes
     """
+    if per_run:
+        return await execute_per_run_query_bytes(
+            router, sql, cache_prefix, params, tables, result_format, template)
     r = router.app.state.redis if hasattr(router, 'app') else None
-    cache_key = None
+    cache_key = await build_cache_key(
+        r, sql, cache_prefix, params, time_range, request_data, tables, result_format)
+
+    async def run_query() -> bytes:
+        # conn.fetch 走 asyncpg 每个连接的 prepared statement 缓存（同一 SQL 只 Parse 一次）；
+        # 空结果拿不到列名，这时再单独 prepare 一次
+        async with db_connection(router, cache_prefix) as conn:
+            with db_timer(template or cache_prefix) as m:
+                rows = await conn.fetch(sql, *params)
+                m["rows"] = len(rows)
+            if rows:
+                columns = list(rows[0].keys())
+            else:
+                stmt = await conn.prepare(sql)
+                columns = [a.name for a in stmt.get_attributes()]
+        maybe_explain(router, cache_prefix, template or cache_prefix, sql, params, m["seconds"])
+        with serialize_timer(cache_prefix, result_format):
+            payload = encode_result(result_format, columns, rows)
+            return payload if isinstance(payload, bytes) else dumps_bytes(payload)
+
+    return await cache_get_or_compute_bytes(r, cache_key, run_query, cache_ttls(cache_prefix))
 
-    # 构建缓存键
-    if r:
-        cache_data = {"sql": sql, "params": params}
-        if time_range:
-            cache_data["time_range"] = time_range.model_dump() if hasattr(
-                time_range, 'model_dump') else time_range
-        if request_data:
-            cache_data["request"] = request_data
 
-        cache_key = f"{cache_prefix}:" + stable_dumps(cache_data)
-        cached = await cache_get(r, cache_key)
-        if cached is not None:
-            return cached
+async def execute_streaming_query(
+    router: APIRouter,
+    sql: str,
+    cache_prefix: str,
+    params: Tuple[Any, ...] = (),
+    time_range: Optional[TimeRange] = None,
+    request_data: Optional[Dict[str, Any]] = None,
+    tables: Sequence[str] = (),
+    result_format: ResultFormat = "json",
+    per_run: bool = False,
+    template: Optional[str] = None
+) -> Response:
+    """
+    流式执行查询，响应为 NDJSON（整体缓存，忽略 per_run）
+
+    json 格式每行一条记录，columnar 格式每行一个列式批次。通过服务端游标每次取
+    QUERY_STREAM_BATCH_ROWS 行，边取边发；结果不超过 CACHE_STREAM_MAX_BYTES 时
+    整体写入缓存，下次直接返回
+    """
+    if result_format == "arrow":
+        raise ValueError("流式查询只支持 json / columnar 格式")
+    r = router.app.state.redis if hasattr(router, 'app') else None
+    cache_key = await build_cache_key(
+        r, sql, cache_prefix, params, time_range, request_data, tables,
+        f"ndjson:{result_format}")
 
-    # 执行数据库查询
-    async with router.app.state.pg.acquire() as conn:
-        rows = await conn.fetch(sql, *params)
+    payload_format = f"ndjson:{result_format}"
+    cached = await cache_get_bytes(r, cache_key)
+    if cached is not None:
+        record_payload(cache_prefix, payload_format, len(cached))
+        return Response(content=cached, media_type=NDJSON_MEDIA_TYPE)
 
-    payload = {"rows": [dict(x) for x in rows]}
+    async def stream() -> AsyncIterator[bytes]:
+        buffered: Optional[List[bytes]] = []
+        size = 0
+        async with db_connection(router, cache_prefix) as conn:
+            async with conn.transaction():
+                # conn.cursor 同样复用连接上缓存的 prepared statement
+                # 查询耗时按游标取数的累计时间计，不含把数据发给客户端的时间
+                start = time.perf_counter()
+                cursor = await conn.cursor(sql, *params)
+                db_seconds = time.perf_counter() - start
+                total_rows = 0
+                columns: List[str] = []
+                while True:
+                    start = time.perf_counter()
+                    batch = await cursor.fetch(QUERY_STREAM_BATCH_ROWS)
+                    db_seconds += time.perf_counter() - start
+                    total_rows += len(batch)
+                    if not batch:
+                        break
+                    if not columns:
+                        columns = list(batch[0].keys())
+                    with serialize_timer(cache_prefix, payload_format):
+                        if result_format == "columnar":
+                            chunk = dumps_bytes(to_columnar(columns, batch)) + b"\n"
+                        else:
+                            chunk = b"".join(dumps_bytes(dict(zip(columns, x))) + b"\n"
+                                             for x in batch)
+                    size += len(chunk)
+                    if buffered is not None:
+                        if size > CACHE_STREAM_MAX_BYTES:
+                            buffered = None
+                        else:
+                            buffered.append(chunk)
+                    yield chunk
+                record_db(template or cache_prefix, db_seconds, total_rows)
+        maybe_explain(router, cache_prefix, template or cache_prefix, sql, params, db_seconds)
+        record_payload(cache_prefix, payload_format, size)
+        if buffered is not None:
+            await cache_set_bytes(r, cache_key, b"".join(buffered), cache_ttls(cache_prefix))
 
-    # 设置缓存
-    if r and cache_key:
-        await cache_set(r, cache_key, payload, CACHE_TTL_SECONDS)
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
 
-    return payload
+
+async def execute_cached_query(*args: Any, stream: bool = False, **kwargs: Any) -> Response:
+    """
+    执行带缓存的数据库查询，参数同 execute_cached_query_bytes
+
+    直接用 JSON bytes 构造响应，跳过 FastAPI 的 jsonable_encoder + json.dumps；
+    stream=True 时改为 execute_streaming_query
+    """
+    if stream:
+        return await execute_streaming_query(*args, **kwargs)
+    body = await execute_cached_query_bytes(*args, **kwargs)
+    result_format = kwargs.get("result_format", "json")
+    record_payload(kwargs.get("cache_prefix", ""), result_format, len(body))
+    return Response(content=body, media_type=media_type_of(result_format))
+
+
+def merge_platform_rows(
+    platforms: Sequence[str],
+    bodies: Sequence[bytes],
+    distinct_on: Optional[str] = None,
+    order_by: Optional[str] = None,
+    descending: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    合并各平台的 {"rows": [...]} 结果
+
+    默认每行加上 platform 字段后按 platforms 顺序拼接；指定 distinct_on 时按该列去重，
+    同一行出现在多个平台时合并成一行，platforms 字段记录出现过的平台
+    """
+    merged: List[Dict[str, Any]] = []
+    seen: Dict[Any, Dict[str, Any]] = {}
+    for platform, body in zip(platforms, bodies):
+        for row in orjson.loads(body)["rows"]:
+            if distinct_on is None:
+                row["platform"] = platform
+                merged.append(row)
+                continue
+            key = row.get(distinct_on)
+            if key in seen:
+                seen[key]["platforms"].append(platform)
+            else:
+                row["platforms"] = [platform]
+                seen[key] = row
+                merged.append(row)
+    if order_by:
+        # 排序列为 null 的行放在最后
+        valued = [x for x in merged if x.get(order_by) is not None]
+        valued.sort(key=lambda x: x[order_by], reverse=descending)
+        merged = valued + [x for x in merged if x.get(order_by) is None]
+    return merged
+
+
+async def execute_platform_query(
+    router: APIRouter,
+    platforms: Sequence[str],
+    make_query: Callable[[str], Dict[str, Any]],
+    distinct_on: Optional[str] = None,
+    order_by: Optional[str] = None,
+    descending: bool = False,
+) -> Response:
+    """
+    跨平台查询：对每个平台并发执行同一查询，在服务端合并结果
+
+    每个平台的部分结果单独走 execute_cached_query_bytes 缓存（缓存键里只有该平台
+    数据表的 generation），某个平台导入新数据只会让它自己的部分失效；合并本身很便宜，
+    不单独缓存
+
+    Args:
+        platforms: 要查询的平台，重复的会去掉
+        make_query: platform -> execute_cached_query_bytes 的参数（sql / cache_prefix / params 等）
+        distinct_on / order_by / descending: 见 merge_platform_rows
+    """
+    platforms = list(dict.fromkeys(platforms))
+    bodies = await asyncio.gather(*[
+        execute_cached_query_bytes(router=router, **make_query(platform))
+        for platform in platforms
+    ])
+    with serialize_timer("platform", "json"):
+        rows = merge_platform_rows(platforms, bodies, distinct_on, order_by, descending)
+        body = dumps_bytes({"rows": rows})
+    record_payload("platform", "json", len(body))
+    return Response(content=body, media_type=media_type_of("json"))
 
 
 # async def insert_data_to_db(
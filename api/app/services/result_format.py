@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Sequence
+
+try:  # 可选依赖：未安装 pyarrow 时不提供 arrow 格式
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def media_type_of(result_format: str) -> str:
+    return ARROW_MEDIA_TYPE if result_format == "arrow" else JSON_MEDIA_TYPE
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _is_str_column(values: List[Any]) -> bool:
+    return bool(values) and all(v is None or isinstance(v, str) for v in values)
+
+
+def to_rows(columns: Sequence[str], records: Sequence[Any]) -> Dict[str, Any]:
+    """默认格式：{"rows": [{col: value}, ...]}"""
+    return {"rows": [dict(zip(columns, r)) for r in records]}
+
+
+def to_columnar(columns: Sequence[str], records: Sequence[Any]) -> Dict[str, Any]:
+    """
+    列式格式：每列一个数组，字符串列做字典编码
+
+    {
+      "format": "columnar",
+      "length": 行数,
+      "columns": [列名, ...],
+      "data": {列名: [值或字典下标, ...]},
+      "dicts": {字符串列名: [去重后的值, ...]}
+    }
+    字典编码列中的 null 仍为 null
+    """
+    data: Dict[str, List[Any]] = {}
+    dicts: Dict[str, List[str]] = {}
+    for i, col in enumerate(columns):
+        values = [r[i] for r in records]
+        if _is_str_column(values):
+            index: Dict[str, int] = {}
+            data[col] = [None if v is None else index.setdefault(v, len(index))
+                         for v in values]
+            dicts[col] = list(index)
+        else:
+            data[col] = values
+    return {
+        "format": "columnar",
+        "length": len(records),
+        "columns": list(columns),
+        "data": data,
+        "dicts": dicts,
+    }
+
+
+def to_arrow_ipc(columns: Sequence[str], records: Sequence[Any]) -> bytes:
+    """Apache Arrow IPC stream，字符串列用 dictionary 类型"""
+    arrays = []
+    for i, _ in enumerate(columns):
+        values = [r[i] for r in records]
+        arr = pa.array(values)
+        if _is_str_column(values):
+            arr = arr.dictionary_encode()
+        arrays.append(arr)
+    table = pa.Table.from_arrays(arrays, names=list(columns))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_result(result_format: str, columns: Sequence[str], records: Sequence[Any]) -> Any:
+    """按格式把查询结果转成 payload（json / columnar 为 dict，arrow 为 bytes）"""
+    if result_format == "columnar":
+        return to_columnar(columns, records)
+    if result_format == "arrow":
+        return to_arrow_ipc(columns, records)
+    return to_rows(columns, records)
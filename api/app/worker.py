@@ -0,0 +1,244 @@
+"""
+导入任务 worker：python -m app.worker
+
+从 import_job 表领取任务，在独立进程里完成下载、解析（线程池）与写库，不占用 API 进程的事件循环
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict, Optional
+
+import asyncpg
+from redis.asyncio import Redis
+
+from .db import create_pool
+from .services.bulk_load import (StagingMismatch, clear_staged, invalidate_loaded, merge_staged,
+                                 stage_records)
+from .services.import_data import RECORD_FIELDS, import_from_jenkins
+from .services.import_jobs import (IMPORT_JOB_HEARTBEAT_SECONDS, claim_job, fail_job, finish_job,
+                                   update_progress)
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+REDIS_URL = os.environ.get("REDIS_URL", "")
+# 没有任务时多久查一次
+IMPORT_WORKER_POLL_SECONDS = float(os.environ.get("IMPORT_WORKER_POLL_SECONDS", "2"))
+# 每个 worker 进程同时执行的任务数
+IMPORT_WORKER_CONCURRENCY = int(os.environ.get("IMPORT_WORKER_CONCURRENCY", "1"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# python -m 运行时 __name__ 是 __main__，这里写死模块名
+logger = logging.getLogger("app.worker")
+
+# 心跳写库时可以忽略、下次再写的错误（连接断开、数据库暂时不可用、拿连接超时）
+TRANSIENT_ERRORS = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+
+
+class JobTakenOver(RuntimeError):
+    """任务已被其他 worker 接管（本 worker 心跳超时过），本 worker 应立即停止执行"""
+
+
+class JobRun:
+    """
+    一次任务执行的进度：各阶段在内存里更新（下载线程里也会更新），由心跳定期写回数据库
+
+    progress 形如 {"fetch": {"status": "done", "done": 12, "total": 12, "rows": 3400,
+    "seconds": 3.2, "rows_per_second": 1062}, "stage": {...}, "merge": {...}}
+    """
+
+    def __init__(self, pool: asyncpg.Pool, job: Dict[str, Any]):
+        self.pool = pool
+        self.job = job
+        self.progress: Dict[str, Any] = job["progress"]
+        self.stage: Optional[str] = job["stage"]
+        self.od_version: Optional[str] = job["od_version"]
+        self._started: Dict[str, float] = {}
+        # 执行 run_job 的 Task，心跳发现任务被接管时取消它
+        self.task: Optional["asyncio.Task[Any]"] = None
+        self.taken_over = False
+
+    def start_stage(self, stage: str) -> None:
+        self.stage = stage
+        self._started[stage] = time.perf_counter()
+        self.progress[stage] = {"status": "running", "attempt": self.job["attempts"]}
+
+    def update_stage(self, stage: str, **values: Any) -> None:
+        """也在下载线程里调用：任务已被接管时抛错，让下载线程尽早停下"""
+        if self.taken_over:
+            raise JobTakenOver(f"任务 {self.job['id']} 已不属于 {WORKER_ID}")
+        self.progress[stage].update(values)
+
+    def finish_stage(self, stage: str, rows: Optional[int] = None, **values: Any) -> None:
+        seconds = time.perf_counter() - self._started[stage]
+        self.progress[stage].update(values, status="done", seconds=round(seconds, 3))
+        if rows is not None:
+            self.progress[stage].update(
+                rows=rows, rows_per_second=round(rows / seconds) if seconds > 0 else rows)
+
+    def fail_stage(self, error: str) -> None:
+        if self.stage in self.progress:
+            self.progress[self.stage].update(status="failed", error=error)
+
+    def stage_done(self, stage: str) -> bool:
+        return self.progress.get(stage, {}).get("status") == "done"
+
+    async def flush(self) -> None:
+        """写回进度；任务已被其他 worker 接管（本 worker 心跳超时过）时抛错，不再继续"""
+        async with self.pool.acquire() as conn:
+            ok = await update_progress(
+                conn, self.job["id"], WORKER_ID, self.stage, self.progress, self.od_version)
+        if not ok:
+            self.taken_over = True
+            raise JobTakenOver(f"任务 {self.job['id']} 已不属于 {WORKER_ID}")
+
+    async def heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(IMPORT_JOB_HEARTBEAT_SECONDS)
+            try:
+                await self.flush()
+            except JobTakenOver:
+                # 不再与新的 worker 同时执行：取消正在进行的下载 / 合并（合并的事务随之回滚）
+                if self.task is not None:
+                    self.task.cancel()
+                return
+            except TRANSIENT_ERRORS as e:
+                # 暂时写不进去不影响任务本身，下次再写
+                logger.warning("import job %s heartbeat failed: %s", self.job["id"], e)
+
+
+async def fetch_and_stage(pool: asyncpg.Pool, run: JobRun) -> None:
+    """fetch：下载并解析（线程池）-> stage：清掉上次残留的中转数据，COPY 进中转表并提交"""
+    job = run.job
+    run.start_stage("fetch")
+    await run.flush()
+    od_version, records = await asyncio.to_thread(
+        import_from_jenkins, job["trigger_urls"], job["platform"],
+        lambda done, total: run.update_stage("fetch", done=done, total=total),
+        job["tables"] or None)
+    run.od_version = od_version
+    run.finish_stage("fetch", rows=sum(len(v) for v in records.values()))
+    if not any(records.values()):
+        raise ValueError("没有可导入的记录")
+
+    run.start_stage("stage")
+    await run.flush()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await clear_staged(conn, job["load_id"])
+            staged = await stage_records(conn, job["load_id"], records, RECORD_FIELDS)
+    run.finish_stage("stage", rows=sum(staged.values()), tables=staged)
+
+
+async def merge(pool: asyncpg.Pool, redis: Optional[Redis], run: JobRun) -> None:
+    """merge：核对中转数据还在，合并 + 重算汇总（一个事务），提交后让 API 缓存失效"""
+    job = run.job
+    staged = run.progress["stage"]["tables"]
+    tables = [k for k, n in staged.items() if n]
+    run.start_stage("merge")
+    await run.flush()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            runs = await merge_staged(conn, job["platform"], job["load_id"], tables, staged)
+    run.finish_stage("merge", rows=run.progress["stage"]["rows"], runs=runs)
+    await invalidate_loaded(redis, job["platform"], tables)
+
+
+async def run_job(pool: asyncpg.Pool, redis: Optional[Redis], job: Dict[str, Any]) -> None:
+    """
+    fetch -> stage -> merge，见 fetch_and_stage / merge
+
+    stage 已完成的任务（上次在 merge 失败）直接从 merge 继续；中转数据已不在时
+    （UNLOGGED 表在数据库崩溃恢复时会被清空）从 fetch 重新来。
+    任务被其他 worker 接管时立即停止，不再写回状态
+    """
+    run = JobRun(pool, job)
+    run.task = asyncio.current_task()
+    heartbeat = asyncio.create_task(run.heartbeat())
+    try:
+        resumed = run.stage_done("stage")
+        if not resumed:
+            await fetch_and_stage(pool, run)
+        try:
+            await merge(pool, redis, run)
+        except StagingMismatch as e:
+            if not resumed:
+                raise
+            logger.warning("import job %s: %s, fetching again", job["id"], e)
+            await fetch_and_stage(pool, run)
+            await merge(pool, redis, run)
+
+        async with pool.acquire() as conn:
+            await finish_job(conn, job["id"], WORKER_ID, run.progress)
+        logger.info("import job %s succeeded: %s", job["id"], run.progress)
+    except asyncio.CancelledError:
+        if not run.taken_over:
+            raise
+        logger.warning("import job %s taken over by another worker, stopped at %s", job["id"], run.stage)
+    except JobTakenOver:
+        logger.warning("import job %s taken over by another worker, stopped at %s", job["id"], run.stage)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        run.fail_stage(error)
+        logger.exception("import job %s failed at %s", job["id"], run.stage)
+        try:
+            async with pool.acquire() as conn:
+                await fail_job(conn, job["id"], WORKER_ID, run.progress, error, job["attempts"])
+        except Exception:
+            # 写不回去时任务停在 running，心跳超时后会被重新领取
+            logger.exception("import job %s: recording failure failed", job["id"])
+    finally:
+        heartbeat.cancel()
+
+
+async def main() -> None:
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is required")
+    pool = await create_pool(DATABASE_URL)
+    redis = Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    slots = asyncio.Semaphore(IMPORT_WORKER_CONCURRENCY)
+    running = set()
+    logger.info("import worker %s started", WORKER_ID)
+    try:
+        while not stop.is_set():
+            await slots.acquire()
+            try:
+                async with pool.acquire() as conn:
+                    job = await claim_job(conn, WORKER_ID)
+            except Exception as e:
+                job = None
+                logger.warning("claim import job failed: %s", e)
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(stop.wait(), IMPORT_WORKER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info("import job %s claimed (attempt %s)", job["id"], job["attempts"])
+            task = asyncio.create_task(run_job(pool, redis, job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+        # 停止时等正在执行的任务结束；被强制结束的任务心跳超时后由其他 worker 接管
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    finally:
+        await pool.close()
+        if redis:
+            await redis.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO"),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+本地的 Jenkins 桩服务：只实现导入会用到的几个页面（trigger 页面、consoleFull、SummaryResults.zip）
+
+    with JenkinsStub() as jenkins:
+        trigger = jenkins.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA", "SceneB"])
+        collect_check_urls([trigger])
+        jenkins.hits["/job/c/77-0/consoleFull"]
+"""
+import io
+import threading
+import time
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DETAIL_CSV = (
+    "Direction,Lane,Ground Truth,Zone Counted Times - TP,Zone Counted Times - FP,"
+    "Zone Counted Times - FN,Precision,Recall\n"
+    "N,1,10,9,1,1,90.0,90.0\n"
+    "N,Total,10,9,1,1,90.0,90.0\n"
+)
+# 两类汇总 CSV 的表头按 import_data.CSV_KINDS 写
+STOP_BAR_SUMMARY_CSV = (
+    "Direction,Lane,Ground Truth,Zone Counted Times,Absolute Rate\n"
+    "N,1,10,8,80.0\n"
+    "N,Total,10,8,80.0\n"
+)
+ADVANCE_SUMMARY_CSV = (
+    "Zone Name,Direction,Ground Truth,Zone Counted Times,Absolute Rate\n"
+    "Z1,N,20,19,95.0\n"
+    "Total,N,20,19,95.0\n"
+)
+
+
+def summary_zip(scene, stat_time="2026-01-08-23-06-20", files=None):
+    """
+    SummaryResults.zip：files 为 {文件名关键字: CSV 内容}，默认三类 CSV 各一个
+    """
+    if files is None:
+        files = {
+            "stop_bar_statistic_with_time": DETAIL_CSV,
+            "stop_bar_statistic_without_time": STOP_BAR_SUMMARY_CSV,
+            "advance_detection_statistic_without_time": ADVANCE_SUMMARY_CSV,
+        }
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("SummaryResults/", "")
+        for key, body in files.items():
+            zf.writestr(f"SummaryResults/{scene}_{key}_{stat_time}.csv", body)
+    return buf.getvalue()
+
+
+class JenkinsStub:
+    def __init__(self):
+        # path -> body；fail[path] 为还要返回 503 的次数，delay[path] 为响应前等待的秒数
+        self.pages = {}
+        self.fail = Counter()
+        self.delay = {}
+        self.hits = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_trigger(self, build, od_tag, ticket, scenes):
+        """
+        注册一个 trigger 及其各场景的 od_perception / od_perception_check 子任务，返回 trigger 地址
+
+        子任务地址为 /job/p/<build>-<i>/ 与 /job/c/<build>-<i>/
+        """
+        trigger = f"/job/OD_X86_trigger/{build}/"
+        rows = []
+        for i, scene in enumerate(scenes):
+            perception = f"/job/p/{build}-{i}/"
+            check = f"/job/c/{build}-{i}/"
+            rows.append(f"od_deploy: :&nbsp;<br>od_perception: :&nbsp; {self.url}{perception}"
+                        f"<br>od_perception_check: :&nbsp; {self.url}{check}<br>")
+            self.pages[perception + "consoleFull"] = f"INNO_PC_PATH=/data/{scene}\n"
+            self.pages[check + "consoleFull"] = (
+                "Archive:  /home/demo/jenkins_dir/workspace/PS_IntegrationTest/od_perception_check"
+                f"/mnt/ODPerceptionResult/{build}_{scene}/SummaryResults.zip\n")
+            self.pages[check + "artifact/SummaryResults.zip"] = summary_zip(scene)
+        self.pages[trigger] = "<div>" + "</div></div>".join(rows) + "</div></div>\n"
+        self.pages[trigger + "consoleFull"] = f'export od_tag="{od_tag}" integration_ticket="{ticket}"\n'
+        return self.url + trigger
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.hits[self.path] += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    failing = stub.fail[self.path] > 0
+                    if failing:
+                        stub.fail[self.path] -= 1
+                try:
+                    time.sleep(stub.delay.get(self.path, 0))
+                    body = stub.pages.get(self.path)
+                    if failing or body is None:
+                        self.send_response(503 if failing else 404)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    if isinstance(body, str):
+                        body = body.encode()
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app import cache
+
+
+class FakeRedis:
+    """cache_get_or_compute_bytes 用到的 Redis 子集：get / set / eval（锁）"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token.encode() or self.data.get(key) == token:
+            del self.data[key]
+        return 1
+
+
+@pytest.fixture(autouse=True)
+def empty_local_cache(monkeypatch):
+    monkeypatch.setattr(cache, "local_cache", cache.LocalCache(1024 * 1024, 64 * 1024))
+
+
+def counter():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"n": len(calls)}
+
+    return calls, compute
+
+
+def test_without_redis_every_call_recomputes():
+    calls, compute = counter()
+
+    async def run():
+        first = await cache.cache_get_or_compute_bytes(None, "home:k", compute, (86400, 86400))
+        second = await cache.cache_get_or_compute_bytes(None, "home:k", compute, (86400, 86400))
+        return first, second
+
+    assert asyncio.run(run()) == (b'{"n":1}', b'{"n":2}')
+    assert cache.local_cache.size == 0
+
+
+def test_without_redis_reads_and_writes_are_no_ops():
+    async def run():
+        await cache.cache_set_bytes(None, "home:k", b"[]", (60, 60))
+        await cache.cache_set_many_bytes(None, [("home:a", b"[]")], (60, 60))
+        return (await cache.cache_get_bytes(None, "home:k"),
+                await cache.cache_get_many_bytes(None, ["home:a", "home:b"]))
+
+    assert asyncio.run(run()) == (None, [None, None])
+    assert cache.local_cache.size == 0
+
+
+def test_without_redis_concurrent_calls_still_share_one_compute():
+    calls, compute = counter()
+
+    async def run():
+        return await asyncio.gather(*[
+            cache.cache_get_or_compute_bytes(None, "home:k", compute, (60, 60)) for _ in range(5)])
+
+    assert set(asyncio.run(run())) == {b'{"n":1}'}
+    assert len(calls) == 1
+
+
+def test_with_redis_local_tier_serves_repeat_reads():
+    calls, compute = counter()
+    r = FakeRedis()
+
+    async def run():
+        first = await cache.cache_get_or_compute_bytes(r, "home:k", compute, (60, 60))
+        second = await cache.cache_get_or_compute_bytes(r, "home:k", compute, (60, 60))
+        return first, second
+
+    assert asyncio.run(run()) == (b'{"n":1}', b'{"n":1}')
+    assert cache.local_cache.get("home:k") == b'{"n":1}'
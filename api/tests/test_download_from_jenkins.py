@@ -0,0 +1,181 @@
+import threading
+
+import pytest
+
+from app.services import download_from_jenkins as jenkins
+from app.services.import_data import import_from_jenkins
+from tests.jenkins_stub import DETAIL_CSV, JenkinsStub, summary_zip
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    # 重试不等待；每个用例用新的 Session，重试配置随之生效
+    monkeypatch.setattr(jenkins, "JENKINS_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(jenkins, "_session", None)
+    with JenkinsStub() as s:
+        yield s
+    monkeypatch.setattr(jenkins, "_session", None)
+
+
+def test_each_console_fetched_once_per_call(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA", "SceneB"])
+
+    od_tag, dir_name, urls, msg = jenkins.collect_check_urls([trigger])
+
+    assert od_tag == "SIMPL_OD_dev-job-ESEE-353"
+    assert dir_name == "77"
+    assert [name for _, name in urls] == ["SceneA", "SceneB"]
+    consoles = [p for p in stub.pages if p.endswith("consoleFull")]
+    assert all(stub.hits[p] == 1 for p in consoles)
+    assert stub.hits["/job/OD_X86_trigger/77/"] == 1
+
+
+def test_console_memo_is_scoped_to_one_call(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA"])
+
+    # 并发的两次解析互不清空对方的缓存，各自读一次
+    results = [None, None]
+
+    def collect(i):
+        results[i] = jenkins.collect_check_urls([trigger])
+
+    threads = [threading.Thread(target=collect, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results[0] == results[1]
+    assert results[0][0] == "SIMPL_OD_dev-job-ESEE-353"
+    assert stub.hits["/job/c/77-0/consoleFull"] == 2
+    assert stub.hits["/job/OD_X86_trigger/77/consoleFull"] == 2
+
+
+def test_retries_transient_errors(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA"])
+    stub.fail["/job/c/77-0/consoleFull"] = 2
+    stub.fail["/job/c/77-0/artifact/SummaryResults.zip"] = 1
+
+    od_tag, _, urls, _ = jenkins.collect_check_urls([trigger])
+    frames = jenkins.download_files(urls, lambda name, archive: name)
+
+    assert urls[0][1] == "SceneA"
+    assert frames == {"SceneA": "SceneA"}
+    assert stub.hits["/job/c/77-0/consoleFull"] == 3
+    assert stub.hits["/job/c/77-0/artifact/SummaryResults.zip"] == 2
+
+
+def test_gives_up_after_retries(stub, monkeypatch):
+    monkeypatch.setattr(jenkins, "JENKINS_RETRIES", 1)
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA"])
+    stub.fail["/job/c/77-0/artifact/SummaryResults.zip"] = 5
+
+    _, _, urls, _ = jenkins.collect_check_urls([trigger])
+
+    assert jenkins.download_files(urls, lambda name, archive: name) == {}
+    assert stub.hits["/job/c/77-0/artifact/SummaryResults.zip"] == 2
+
+
+def test_results_keep_trigger_and_scene_order(stub):
+    scenes = [f"Scene{i}" for i in range(6)]
+    first = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", scenes[:3])
+    second = stub.add_trigger(78, "SIMPL_OD_dev", "ESEE-354", scenes[3:])
+    # 前面的场景响应更慢，结果仍按 trigger / 场景顺序
+    for i in range(3):
+        stub.delay[f"/job/c/77-{i}/consoleFull"] = 0.1 * (3 - i)
+
+    od_tag, dir_name, urls, _ = jenkins.collect_check_urls([first, second])
+
+    assert od_tag == "SIMPL_OD_dev-job-ESEE-353"
+    assert dir_name == "77_78"
+    assert [name for _, name in urls] == scenes
+
+
+def test_concurrency_bounded_by_worker_pool(stub):
+    scenes = [f"Scene{i}" for i in range(3 * jenkins.JENKINS_WORKERS)]
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", scenes)
+    for path in stub.pages:
+        stub.delay[path] = 0.02
+
+    _, _, urls, _ = jenkins.collect_check_urls([trigger])
+    jenkins.download_files(urls, lambda name, archive: name)
+
+    assert 1 < stub.max_in_flight <= jenkins.JENKINS_WORKERS
+
+
+def test_import_from_jenkins_parses_archives(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA", "SceneB"])
+    progress = []
+
+    od_version, records = import_from_jenkins(
+        [trigger], "x86", lambda done, total: progress.append((done, total)))
+
+    assert od_version == "dev"
+    rows = records["stop_bar_detail"]
+    assert [r[2] for r in rows] == ["SceneA", "SceneB"]
+    assert all(r[4] == 1 and r[5] == 10 for r in rows)
+    assert progress[0] == (0, 2) and progress[-1] == (2, 2)
+
+
+def test_import_from_jenkins_parses_summary_kinds(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA"])
+
+    _, records = import_from_jenkins([trigger], "x86")
+
+    # total 行被过滤，od_time 与明细表共用文件名里的时间
+    od_time = records["stop_bar_detail"][0][-1]
+    assert records["stop_bar_summary"] == [("dev", "SceneA", "N", 1, 10, 8, 80.0, od_time)]
+    assert records["advance_detection_summary"] == [
+        ("dev", "SceneA", "Z1", "N", 20, 19, 95.0, od_time)]
+
+
+def test_summary_headers_match_loosely(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA"])
+    stub.pages["/job/c/77-0/artifact/SummaryResults.zip"] = summary_zip("SceneA", files={
+        "stop_bar_statistic_without_time":
+            " direction , LANE,Ground truth,Zone Counted Times,Absolute Rate\nN,2,5,5,100\n",
+    })
+
+    _, records = import_from_jenkins([trigger], "x86")
+
+    assert [r[2:7] for r in records["stop_bar_summary"]] == [("N", 2, 5, 5, 100.0)]
+
+
+def test_kind_with_every_file_rejected_fails_import(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA", "SceneB"])
+    bad = "Direction,Lane,Ground Truth,Counted\nN,1,10,8\n"
+    for i, scene in enumerate(["SceneA", "SceneB"]):
+        stub.pages[f"/job/c/77-{i}/artifact/SummaryResults.zip"] = summary_zip(scene, files={
+            "stop_bar_statistic_with_time": DETAIL_CSV,
+            "stop_bar_statistic_without_time": bad,
+        })
+
+    with pytest.raises(ValueError, match="stop_bar_summary"):
+        import_from_jenkins([trigger], "x86")
+    # 没有要求导入的类型不参与判断
+    _, records = import_from_jenkins([trigger], "x86", kinds=["stop_bar_detail"])
+    assert list(records) == ["stop_bar_detail"]
+
+
+def test_kind_partially_rejected_keeps_good_files(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA", "SceneB"])
+    stub.pages["/job/c/77-1/artifact/SummaryResults.zip"] = summary_zip("SceneB", files={
+        "stop_bar_statistic_with_time": DETAIL_CSV,
+        "advance_detection_statistic_without_time": "Zone,Direction\nZ1,N\n",
+    })
+
+    _, records = import_from_jenkins([trigger], "x86")
+
+    assert [r[1] for r in records["advance_detection_summary"]] == ["SceneA"]
+
+
+def test_corrupt_archive_skips_only_that_scene(stub):
+    trigger = stub.add_trigger(77, "SIMPL_OD_dev", "ESEE-353", ["SceneA", "SceneB", "SceneC"])
+    stub.pages["/job/c/77-1/artifact/SummaryResults.zip"] = b"not a zip"
+    progress = []
+
+    _, records = import_from_jenkins(
+        [trigger], "x86", lambda done, total: progress.append((done, total)))
+
+    assert [r[2] for r in records["stop_bar_detail"]] == ["SceneA", "SceneC"]
+    assert progress[-1] == (3, 3)
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app import db
+from app.cache import read_latest
+
+
+class FakePool:
+    """Replica.check 用到的连接池子集：acquire() 返回执行 REPLICA_HEALTH_SQL 的连接"""
+
+    def __init__(self, row=None, error=None):
+        self.row = row
+        self.error = error
+
+    def acquire(self, timeout=None):
+        pool = self
+
+        @asynccontextmanager
+        async def conn():
+            if pool.error:
+                raise pool.error
+            yield pool
+
+        return conn()
+
+    async def fetchrow(self, sql, timeout=None):
+        return self.row
+
+
+def replica_set(*fresh_as_of, healthy=True):
+    replicas = db.ReplicaSet([f"postgresql://demo@replica{i}:5432/demo" for i in range(len(fresh_as_of))])
+    for replica, fresh in zip(replicas.replicas, fresh_as_of):
+        replica.pool = FakePool()
+        replica.healthy = healthy
+        replica.fresh_as_of = fresh
+    return replicas
+
+
+@pytest.fixture
+def imported_at(monkeypatch):
+    """本进程最近一次得知导入的时间"""
+    changed = [100.0]
+    monkeypatch.setattr(db, "generations_changed_at", lambda: changed[0])
+    return changed
+
+
+def test_pick_round_robins_fresh_replicas(imported_at):
+    replicas = replica_set(200.0, 200.0)
+
+    picked = {replicas.pick().name for _ in range(4)}
+
+    assert picked == {"replica0:5432/demo", "replica1:5432/demo"}
+
+
+def test_pick_skips_replicas_older_than_last_import(imported_at):
+    replicas = replica_set(50.0, 150.0)
+
+    assert {replicas.pick().name for _ in range(3)} == {"replica1:5432/demo"}
+
+    imported_at[0] = 160.0
+    assert replicas.pick() is None
+
+
+def test_pick_returns_none_without_healthy_replica(imported_at):
+    assert replica_set(200.0, 200.0, healthy=False).pick() is None
+
+    replicas = replica_set(200.0)
+    replicas.replicas[0].pool = None
+    assert replicas.pick() is None
+
+
+def test_pick_returns_none_for_read_latest(imported_at):
+    replicas = replica_set(200.0)
+    token = read_latest.set(True)
+    try:
+        assert replicas.pick() is None
+    finally:
+        read_latest.reset(token)
+
+
+def test_check_tracks_replay_freshness():
+    replica = db.Replica("postgresql://demo@replica0:5432/demo")
+
+    replica.pool = FakePool({"in_recovery": True, "caught_up": True, "replay_ts": 10.0})
+    before = time.time()
+    asyncio.run(replica.check())
+    assert replica.healthy and replica.fresh_as_of >= before
+
+    # 还有 WAL 没回放：数据只新到最后回放的事务
+    replica.pool = FakePool({"in_recovery": True, "caught_up": False, "replay_ts": 10.0})
+    asyncio.run(replica.check())
+    assert replica.healthy and replica.fresh_as_of == 10.0
+
+
+def test_check_marks_down_promoted_or_unreachable_replica():
+    replica = db.Replica("postgresql://demo@replica0:5432/demo")
+
+    replica.pool = FakePool({"in_recovery": False, "caught_up": True, "replay_ts": None})
+    asyncio.run(replica.check())
+    assert not replica.healthy and replica.error == "not in recovery"
+
+    replica.healthy = True
+    replica.pool = FakePool(error=OSError("connection refused"))
+    asyncio.run(replica.check())
+    assert not replica.healthy and "connection refused" in replica.error
+
+
+class CountingPool:
+    """profiling_connection 用到的 acquire / release"""
+
+    def __init__(self):
+        self.acquired = 0
+        self.released = 0
+
+    async def acquire(self, timeout=None):
+        self.acquired += 1
+        return self
+
+    async def release(self, conn):
+        self.released += 1
+
+
+def test_profiling_connection_prefers_any_healthy_replica(imported_at):
+    primary = CountingPool()
+    replicas = replica_set(0.0)  # 比最近一次导入旧，pick() 不会选，但执行计划不要求数据最新
+    replicas.replicas[0].pool = CountingPool()
+
+    async def run():
+        async with db.profiling_connection(primary, replicas):
+            pass
+        async with db.profiling_connection(primary, None):
+            pass
+
+    asyncio.run(run())
+    assert replicas.replicas[0].pool.acquired == replicas.replicas[0].pool.released == 1
+    assert primary.acquired == primary.released == 1
+    # 不经过路由类别限流
+    assert all(limiter.active == 0 for limiter in db.limiters.values())
@@ -1,3 +1,7 @@
+-- 本文件可重复执行（全部 IF NOT EXISTS / OR REPLACE，回填幂等）
+-- 新库由 postgres 容器首次启动时执行；已有 pgdata 卷的库不会自动执行，升级时手动跑一次：
+--   docker compose exec -T postgres psql -U demo -d demo -v ON_ERROR_STOP=1 < db/init.sql
+
 CREATE TABLE IF NOT EXISTS public.stop_bar_detail_x86 (
   id           BIGSERIAL PRIMARY KEY,
   
@@ -18,6 +22,9 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_detail_x86 (
   -- 精确到秒
   od_time         TIMESTAMPTZ  NOT NULL,
 
+  -- 版本-分钟键（UTC，截断到分钟），供 (od_version, od_minute) 索引查找
+  od_minute    TIMESTAMP    GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED,
+
   -- 精确到秒
   update_time  TIMESTAMPTZ  NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
@@ -37,6 +44,14 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_detail_x86 (
 CREATE INDEX IF NOT EXISTS idx_stop_bar_detail_time_x86
   ON stop_bar_detail_x86 (od_time);
 
+-- 已部署的库（CREATE TABLE IF NOT EXISTS 不会改表）在这里补上 od_minute 列
+ALTER TABLE public.stop_bar_detail_x86
+  ADD COLUMN IF NOT EXISTS od_minute TIMESTAMP
+  GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_stop_bar_detail_x86_version_minute
+  ON stop_bar_detail_x86 (od_version, od_minute);
+
 
 CREATE TABLE IF NOT EXISTS public.stop_bar_detail_arm (
   id           BIGSERIAL PRIMARY KEY,
@@ -58,6 +73,9 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_detail_arm (
   -- 精确到秒
   od_time         TIMESTAMPTZ  NOT NULL,
 
+  -- 版本-分钟键（UTC，截断到分钟），供 (od_version, od_minute) 索引查找
+  od_minute    TIMESTAMP    GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED,
+
   -- 精确到秒
   update_time  TIMESTAMPTZ  NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
@@ -77,6 +95,14 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_detail_arm (
 CREATE INDEX IF NOT EXISTS idx_stop_bar_detail_time_arm
   ON stop_bar_detail_arm (od_time);
 
+-- 已部署的库（CREATE TABLE IF NOT EXISTS 不会改表）在这里补上 od_minute 列
+ALTER TABLE public.stop_bar_detail_arm
+  ADD COLUMN IF NOT EXISTS od_minute TIMESTAMP
+  GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_stop_bar_detail_arm_version_minute
+  ON stop_bar_detail_arm (od_version, od_minute);
+
 
 CREATE TABLE IF NOT EXISTS public.stop_bar_detail_test (
   id           BIGSERIAL PRIMARY KEY,
@@ -99,6 +125,9 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_detail_test (
   -- 精确到秒
   od_time         TIMESTAMPTZ  NOT NULL,
 
+  -- 版本-分钟键（UTC，截断到分钟），供 (od_version, od_minute) 索引查找
+  od_minute    TIMESTAMP    GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED,
+
   -- 精确到秒
   update_time  TIMESTAMPTZ  NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
@@ -118,6 +147,14 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_detail_test (
 CREATE INDEX IF NOT EXISTS idx_stop_bar_detail_time_test
   ON stop_bar_detail_test (od_time);
 
+-- 已部署的库（CREATE TABLE IF NOT EXISTS 不会改表）在这里补上 od_minute 列
+ALTER TABLE public.stop_bar_detail_test
+  ADD COLUMN IF NOT EXISTS od_minute TIMESTAMP
+  GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_stop_bar_detail_test_version_minute
+  ON stop_bar_detail_test (od_version, od_minute);
+
 
 CREATE TABLE IF NOT EXISTS public.stop_bar_summary_x86 (
   id           BIGSERIAL PRIMARY KEY,
@@ -136,6 +173,9 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_summary_x86 (
   -- 精确到秒
   od_time         TIMESTAMPTZ  NOT NULL,
 
+  -- 版本-分钟键（UTC，截断到分钟），供 (od_version, od_minute) 索引查找
+  od_minute    TIMESTAMP    GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED,
+
   -- 精确到秒
   update_time  TIMESTAMPTZ  NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
@@ -154,6 +194,14 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_summary_x86 (
 CREATE INDEX IF NOT EXISTS idx_stop_bar_summary_x86_time
   ON stop_bar_summary_x86 (od_time);
 
+-- 已部署的库（CREATE TABLE IF NOT EXISTS 不会改表）在这里补上 od_minute 列
+ALTER TABLE public.stop_bar_summary_x86
+  ADD COLUMN IF NOT EXISTS od_minute TIMESTAMP
+  GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_stop_bar_summary_x86_version_minute
+  ON stop_bar_summary_x86 (od_version, od_minute);
+
 
 CREATE TABLE IF NOT EXISTS public.stop_bar_summary_arm (
   id           BIGSERIAL PRIMARY KEY,
@@ -172,6 +220,9 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_summary_arm (
   -- 精确到秒
   od_time         TIMESTAMPTZ  NOT NULL,
 
+  -- 版本-分钟键（UTC，截断到分钟），供 (od_version, od_minute) 索引查找
+  od_minute    TIMESTAMP    GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED,
+
   -- 精确到秒
   update_time  TIMESTAMPTZ  NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
@@ -190,6 +241,14 @@ CREATE TABLE IF NOT EXISTS public.stop_bar_summary_arm (
 CREATE INDEX IF NOT EXISTS idx_stop_bar_summary_arm_time
   ON stop_bar_summary_arm (od_time);
 
+-- 已部署的库（CREATE TABLE IF NOT EXISTS 不会改表）在这里补上 od_minute 列
+ALTER TABLE public.stop_bar_summary_arm
+  ADD COLUMN IF NOT EXISTS od_minute TIMESTAMP
+  GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_stop_bar_summary_arm_version_minute
+  ON stop_bar_summary_arm (od_version, od_minute);
+
 
 CREATE TABLE IF NOT EXISTS public.advance_detection_summary_arm (
   id           BIGSERIAL PRIMARY KEY,
@@ -208,6 +267,9 @@ CREATE TABLE IF NOT EXISTS public.advance_detection_summary_arm (
   -- 精确到秒
   od_time         TIMESTAMPTZ  NOT NULL,
 
+  -- 版本-分钟键（UTC，截断到分钟），供 (od_version, od_minute) 索引查找
+  od_minute    TIMESTAMP    GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED,
+
   -- 精确到秒
   update_time  TIMESTAMPTZ  NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
@@ -226,6 +288,14 @@ CREATE TABLE IF NOT EXISTS public.advance_detection_summary_arm (
 CREATE INDEX IF NOT EXISTS idx_advance_detection_summary_arm_time
   ON advance_detection_summary_arm (od_time);
 
+-- 已部署的库（CREATE TABLE IF NOT EXISTS 不会改表）在这里补上 od_minute 列
+ALTER TABLE public.advance_detection_summary_arm
+  ADD COLUMN IF NOT EXISTS od_minute TIMESTAMP
+  GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_advance_detection_summary_arm_version_minute
+  ON advance_detection_summary_arm (od_version, od_minute);
+
 
 CREATE TABLE IF NOT EXISTS public.advance_detection_summary_x86 (
   id           BIGSERIAL PRIMARY KEY,
@@ -244,6 +314,9 @@ CREATE TABLE IF NOT EXISTS public.advance_detection_summary_x86 (
   -- 精确到秒
   od_time         TIMESTAMPTZ  NOT NULL,
 
+  -- 版本-分钟键（UTC，截断到分钟），供 (od_version, od_minute) 索引查找
+  od_minute    TIMESTAMP    GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED,
+
   -- 精确到秒
   update_time  TIMESTAMPTZ  NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
@@ -260,4 +333,398 @@ CREATE TABLE IF NOT EXISTS public.advance_detection_summary_x86 (
 );
 
 CREATE INDEX IF NOT EXISTS idx_advance_detection_summary_x86_time
-  ON advance_detection_summary_x86 (od_time);
\ No newline at end of file
+  ON advance_detection_summary_x86 (od_time);
+
+-- 已部署的库（CREATE TABLE IF NOT EXISTS 不会改表）在这里补上 od_minute 列
+ALTER TABLE public.advance_detection_summary_x86
+  ADD COLUMN IF NOT EXISTS od_minute TIMESTAMP
+  GENERATED ALWAYS AS (date_trunc('minute', od_time AT TIME ZONE 'UTC')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_advance_detection_summary_x86_version_minute
+  ON advance_detection_summary_x86 (od_version, od_minute);
+
+
+-- =====================================================================
+-- 批量导入的中转表（UNLOGGED，不写 WAL，各平台共用）
+-- COPY 写入后在同一事务里按 load_id 合并进正式表并删除，见 services/bulk_load.py
+-- 不加约束和索引，百分比先存 double precision，合并时再转 NUMERIC(5,2)
+-- =====================================================================
+
+CREATE UNLOGGED TABLE IF NOT EXISTS public.stop_bar_detail_staging (
+  load_id      UUID             NOT NULL,
+  od_version   TEXT             NOT NULL,
+  scene_name   TEXT             NOT NULL,
+  direction    TEXT             NOT NULL,
+  lane         INTEGER          NOT NULL,
+  ground_truth INTEGER          NOT NULL,
+  tp           INTEGER          NOT NULL,
+  fp           INTEGER          NOT NULL,
+  fn           INTEGER          NOT NULL,
+  precision    DOUBLE PRECISION NOT NULL,
+  recall       DOUBLE PRECISION NOT NULL,
+  od_time      TIMESTAMPTZ      NOT NULL
+);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS public.stop_bar_summary_staging (
+  load_id      UUID             NOT NULL,
+  od_version   TEXT             NOT NULL,
+  scene_name   TEXT             NOT NULL,
+  direction    TEXT             NOT NULL,
+  lane         INTEGER          NOT NULL,
+  ground_truth INTEGER          NOT NULL,
+  zone_counted INTEGER          NOT NULL,
+  abs_rate     DOUBLE PRECISION NOT NULL,
+  od_time      TIMESTAMPTZ      NOT NULL
+);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS public.advance_detection_summary_staging (
+  load_id      UUID             NOT NULL,
+  od_version   TEXT             NOT NULL,
+  scene_name   TEXT             NOT NULL,
+  zone_name    TEXT             NOT NULL,
+  direction    TEXT             NOT NULL,
+  ground_truth INTEGER          NOT NULL,
+  zone_counted INTEGER          NOT NULL,
+  abs_rate     DOUBLE PRECISION NOT NULL,
+  od_time      TIMESTAMPTZ      NOT NULL
+);
+
+
+-- =====================================================================
+-- 导入任务队列：API 只负责建任务，worker（app.worker）用 FOR UPDATE SKIP LOCKED 领取执行
+-- 阶段：fetch（下载并解析）-> stage（COPY 进中转表，按 load_id 区分）-> merge（合并 + 重算汇总）
+-- stage 完成后中转数据已提交，merge 失败时重试只重做 merge
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS public.import_job (
+  id           BIGSERIAL   PRIMARY KEY,
+  trigger_urls TEXT[]      NOT NULL,
+  platform     TEXT        NOT NULL,
+  -- 只导入这些数据表，NULL 为全部
+  tables       TEXT[],
+  load_id      UUID        NOT NULL DEFAULT gen_random_uuid(),
+
+  -- queued / running / succeeded / failed
+  status       TEXT        NOT NULL DEFAULT 'queued',
+  -- 当前（或失败时所在）的阶段
+  stage        TEXT,
+  -- 各阶段进度：{"fetch": {"status": "done", "done": 12, "total": 12, "seconds": 3.2}, ...}
+  progress     JSONB       NOT NULL DEFAULT '{}',
+  od_version   TEXT,
+  error        TEXT,
+
+  attempts     INTEGER     NOT NULL DEFAULT 0,
+  max_attempts INTEGER     NOT NULL DEFAULT 3,
+  run_after    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  worker       TEXT,
+  heartbeat_at TIMESTAMPTZ,
+
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at   TIMESTAMPTZ,
+  finished_at  TIMESTAMPTZ,
+  updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+  CONSTRAINT ck_import_job_status CHECK (status IN ('queued', 'running', 'succeeded', 'failed'))
+);
+
+-- worker 领取：排队中的任务按 id 先进先出
+CREATE INDEX IF NOT EXISTS idx_import_job_queued
+  ON public.import_job (run_after, id) WHERE status = 'queued';
+
+-- worker 挂掉后按心跳找回运行中的任务
+CREATE INDEX IF NOT EXISTS idx_import_job_running
+  ON public.import_job (heartbeat_at) WHERE status = 'running';
+
+
+-- =====================================================================
+-- 按 (od_version, od_minute) 预聚合的汇总表：场景 / 方向 / 车道(区域) 三级
+-- 历史 run 不可变，导入时通过 refresh_run_rollups 增量重算，接口只读汇总表
+-- =====================================================================
+
+DO $$
+DECLARE
+  arch TEXT;
+BEGIN
+  FOREACH arch IN ARRAY ARRAY['x86', 'arm'] LOOP
+
+    -- stop_bar_detail
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.stop_bar_detail_scene_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        tp           BIGINT    NOT NULL DEFAULT 0,
+        fp           BIGINT    NOT NULL DEFAULT 0,
+        fn           BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name)
+      )$f$, arch);
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.stop_bar_detail_direction_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        direction    TEXT      NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        tp           BIGINT    NOT NULL DEFAULT 0,
+        fp           BIGINT    NOT NULL DEFAULT 0,
+        fn           BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name, direction)
+      )$f$, arch);
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.stop_bar_detail_lane_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        direction    TEXT      NOT NULL,
+        lane         INTEGER   NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        tp           BIGINT    NOT NULL DEFAULT 0,
+        fp           BIGINT    NOT NULL DEFAULT 0,
+        fn           BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name, direction, lane)
+      )$f$, arch);
+
+    -- stop_bar_summary
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.stop_bar_summary_scene_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        zone_counted BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name)
+      )$f$, arch);
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.stop_bar_summary_direction_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        direction    TEXT      NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        zone_counted BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name, direction)
+      )$f$, arch);
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.stop_bar_summary_lane_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        direction    TEXT      NOT NULL,
+        lane         INTEGER   NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        zone_counted BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name, direction, lane)
+      )$f$, arch);
+
+    -- advance_detection_summary（最细一级是 zone_name，对应其它表的 lane）
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.advance_detection_summary_scene_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        zone_counted BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name)
+      )$f$, arch);
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.advance_detection_summary_direction_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        direction    TEXT      NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        zone_counted BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name, direction)
+      )$f$, arch);
+    EXECUTE format($f$
+      CREATE TABLE IF NOT EXISTS public.advance_detection_summary_zone_rollup_%1$s (
+        od_version   TEXT      NOT NULL,
+        od_minute    TIMESTAMP NOT NULL,
+        scene_name   TEXT      NOT NULL,
+        direction    TEXT      NOT NULL,
+        zone_name    TEXT      NOT NULL,
+        ground_truth BIGINT    NOT NULL DEFAULT 0,
+        zone_counted BIGINT    NOT NULL DEFAULT 0,
+        PRIMARY KEY (od_version, od_minute, scene_name, direction, zone_name)
+      )$f$, arch);
+
+  END LOOP;
+END $$;
+
+
+-- 每个场景最近的若干个 run（按 od_minute DESC, od_version DESC 排名），供 latest 接口共用
+-- 由 refresh_run_rollups 在导入时维护，最多保留 20 个
+CREATE TABLE IF NOT EXISTS public.scene_recent_runs (
+  arch         TEXT      NOT NULL,
+  source       TEXT      NOT NULL,
+  scene_name   TEXT      NOT NULL,
+  rn           INTEGER   NOT NULL,
+  od_version   TEXT      NOT NULL,
+  od_minute    TIMESTAMP NOT NULL,
+  PRIMARY KEY (arch, source, scene_name, rn)
+);
+
+DO $$
+DECLARE
+  arch TEXT;
+  src  TEXT;
+BEGIN
+  FOREACH arch IN ARRAY ARRAY['x86', 'arm'] LOOP
+    FOREACH src IN ARRAY ARRAY['stop_bar_detail', 'stop_bar_summary', 'advance_detection_summary'] LOOP
+      EXECUTE format(
+        'CREATE INDEX IF NOT EXISTS idx_%1$s_scene_rollup_%2$s_recent
+           ON public.%1$s_scene_rollup_%2$s (scene_name, od_minute DESC, od_version DESC)',
+        src, arch);
+    END LOOP;
+  END LOOP;
+END $$;
+
+
+-- OD run 目录：每个平台每个 run 一行，供 /api/home/od_versions 分页读取
+-- 由 refresh_run_rollups 在导入时维护，run 在各数据表中都没有数据时删除
+CREATE TABLE IF NOT EXISTS public.od_run (
+  arch         TEXT        NOT NULL,
+  od_version   TEXT        NOT NULL,
+  od_minute    TIMESTAMP   NOT NULL,
+  tables       TEXT[]      NOT NULL,  -- 有数据的表，如 {stop_bar_detail,stop_bar_summary}
+  scene_count  INTEGER     NOT NULL DEFAULT 0,
+  imported_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (arch, od_version, od_minute)
+);
+
+-- keyset 分页：ORDER BY od_minute DESC, od_version DESC
+CREATE INDEX IF NOT EXISTS idx_od_run_minute_version
+  ON public.od_run (od_minute DESC, od_version DESC, arch);
+
+
+-- 重算某个平台下一个 run（od_version + od_minute）的全部汇总表，幂等
+-- 导入写入明细后在同一事务里调用：SELECT public.refresh_run_rollups('x86', 'daily_build', '2026-01-08 14:09');
+CREATE OR REPLACE FUNCTION public.refresh_run_rollups(
+  p_arch       TEXT,
+  p_od_version TEXT,
+  p_od_minute  TIMESTAMP
+) RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+  spec         RECORD;
+  v_source     TEXT;
+  v_scenes     TEXT[];
+  v_tables     TEXT[] := '{}';
+  v_run_scenes TEXT[] := '{}';
+BEGIN
+  IF p_arch NOT IN ('x86', 'arm') THEN
+    RAISE EXCEPTION 'unknown arch: %', p_arch;
+  END IF;
+
+  -- 多个 worker 可能同时合并：汇总表与 scene_recent_runs 都是先删后插，并发的两个事务都删完再插会违反主键。
+  -- 同一平台的重算按平台串行（锁到事务结束）；每个事务只拿这一把锁，不会互相死锁
+  PERFORM pg_advisory_xact_lock(hashtext('refresh_run_rollups:' || p_arch));
+
+  FOR spec IN
+    SELECT * FROM (VALUES
+      ('stop_bar_detail',           'scene',     'scene_name',                        'ground_truth, tp, fp, fn'),
+      ('stop_bar_detail',           'direction', 'scene_name, direction',             'ground_truth, tp, fp, fn'),
+      ('stop_bar_detail',           'lane',      'scene_name, direction, lane',       'ground_truth, tp, fp, fn'),
+      ('stop_bar_summary',          'scene',     'scene_name',                        'ground_truth, zone_counted'),
+      ('stop_bar_summary',          'direction', 'scene_name, direction',             'ground_truth, zone_counted'),
+      ('stop_bar_summary',          'lane',      'scene_name, direction, lane',       'ground_truth, zone_counted'),
+      ('advance_detection_summary', 'scene',     'scene_name',                        'ground_truth, zone_counted'),
+      ('advance_detection_summary', 'direction', 'scene_name, direction',             'ground_truth, zone_counted'),
+      ('advance_detection_summary', 'zone',      'scene_name, direction, zone_name',  'ground_truth, zone_counted')
+    ) AS t(source, level, keys, metrics)
+  LOOP
+    EXECUTE format(
+      'DELETE FROM public.%1$s_%2$s_rollup_%3$s WHERE od_version = $1 AND od_minute = $2',
+      spec.source, spec.level, p_arch
+    ) USING p_od_version, p_od_minute;
+
+    EXECUTE format(
+      'INSERT INTO public.%1$s_%2$s_rollup_%3$s (od_version, od_minute, %4$s, %5$s)
+       SELECT od_version, od_minute, %4$s, %6$s
+       FROM public.%1$s_%3$s
+       WHERE od_version = $1 AND od_minute = $2
+       GROUP BY od_version, od_minute, %4$s',
+      spec.source, spec.level, p_arch, spec.keys, spec.metrics,
+      (SELECT string_agg(format('SUM(%1$s)', m), ', ')
+         FROM unnest(string_to_array(replace(spec.metrics, ' ', ''), ',')) AS m)
+    ) USING p_od_version, p_od_minute;
+  END LOOP;
+
+  -- 重排受影响场景的最近 run：本 run 涉及的场景 + 之前排名里出现过本 run 的场景
+  FOREACH v_source IN ARRAY ARRAY['stop_bar_detail', 'stop_bar_summary', 'advance_detection_summary'] LOOP
+    EXECUTE format(
+      'SELECT array_agg(scene_name) FROM (
+         SELECT scene_name FROM public.%1$s_scene_rollup_%2$s WHERE od_version = $1 AND od_minute = $2
+         UNION
+         SELECT scene_name FROM public.scene_recent_runs
+         WHERE arch = $3 AND source = $4 AND od_version = $1 AND od_minute = $2
+       ) s',
+      v_source, p_arch
+    ) INTO v_scenes USING p_od_version, p_od_minute, p_arch, v_source;
+
+    CONTINUE WHEN v_scenes IS NULL;
+
+    DELETE FROM public.scene_recent_runs
+    WHERE arch = p_arch AND source = v_source AND scene_name = ANY(v_scenes);
+
+    EXECUTE format(
+      'INSERT INTO public.scene_recent_runs (arch, source, scene_name, rn, od_version, od_minute)
+       SELECT $1, $2, scene_name, rn, od_version, od_minute
+       FROM (
+         SELECT
+           scene_name,
+           od_version,
+           od_minute,
+           row_number() OVER (PARTITION BY scene_name ORDER BY od_minute DESC, od_version DESC) AS rn
+         FROM public.%1$s_scene_rollup_%2$s
+         WHERE scene_name = ANY($3)
+       ) t
+       WHERE rn <= 20',
+      v_source, p_arch
+    ) USING p_arch, v_source, v_scenes;
+  END LOOP;
+
+  -- 更新 od_run 目录
+  FOREACH v_source IN ARRAY ARRAY['stop_bar_detail', 'stop_bar_summary', 'advance_detection_summary'] LOOP
+    EXECUTE format(
+      'SELECT array_agg(scene_name) FROM public.%1$s_scene_rollup_%2$s WHERE od_version = $1 AND od_minute = $2',
+      v_source, p_arch
+    ) INTO v_scenes USING p_od_version, p_od_minute;
+
+    CONTINUE WHEN v_scenes IS NULL;
+    v_tables := v_tables || v_source;
+    v_run_scenes := v_run_scenes || v_scenes;
+  END LOOP;
+
+  IF cardinality(v_tables) = 0 THEN
+    DELETE FROM public.od_run
+    WHERE arch = p_arch AND od_version = p_od_version AND od_minute = p_od_minute;
+  ELSE
+    INSERT INTO public.od_run (arch, od_version, od_minute, tables, scene_count, imported_at)
+    VALUES (p_arch, p_od_version, p_od_minute, v_tables,
+            (SELECT count(DISTINCT s) FROM unnest(v_run_scenes) AS s), now())
+    ON CONFLICT (arch, od_version, od_minute) DO UPDATE
+      SET tables = EXCLUDED.tables,
+          scene_count = EXCLUDED.scene_count,
+          imported_at = EXCLUDED.imported_at;
+  END IF;
+END $$;
+
+
+-- 回填已有数据（新库为空时什么也不做）
+DO $$
+DECLARE
+  run RECORD;
+BEGIN
+  FOR run IN
+    SELECT 'x86' AS arch, od_version, od_minute FROM public.stop_bar_detail_x86
+    UNION SELECT 'x86', od_version, od_minute FROM public.stop_bar_summary_x86
+    UNION SELECT 'x86', od_version, od_minute FROM public.advance_detection_summary_x86
+    UNION SELECT 'arm', od_version, od_minute FROM public.stop_bar_detail_arm
+    UNION SELECT 'arm', od_version, od_minute FROM public.stop_bar_summary_arm
+    UNION SELECT 'arm', od_version, od_minute FROM public.advance_detection_summary_arm
+  LOOP
+    PERFORM public.refresh_run_rollups(run.arch, run.od_version, run.od_minute);
+  END LOOP;
+END $$;
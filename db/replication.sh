@@ -0,0 +1,5 @@
+#!/bin/bash
+# 允许只读副本（docker-compose 的 postgres-replica，--profile replica）用 demo 用户做流复制
+# 与 init.sql 一样只在 pgdata 卷为空时执行；已有的库手动把这一行加进 pg_hba.conf 后 SELECT pg_reload_conf()
+set -e
+echo "host replication ${POSTGRES_USER} all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -8,14 +8,9 @@ import ScenesPlatformView, { type SceneDataState } from "./components/ScenesPlat
 import MultiSelectDropdown from "./components/MultiSelectDropdown";
 import type { BaseInfo, ODVersionItem, ODVersionsResponse } from "./api";
 import {
-    getODVersions,
-    getAllScenes,
-    getSceneData,
-    getMultiVersionSceneData,
-    getSceneDataSpSummary,
-    getMultiVersionSceneDataSpSummary,
-    getSceneDataAdSummary,
-    getMultiVersionSceneDataAdSummary,
+    getAllODVersions,
+    getSceneBundle,
+    type SceneBundlePart,
 } from "./api/home";
 
 const BASEINFO_CONFIGS: { key: string; baseinfo: BaseInfo; title: string }[] = [
@@ -112,12 +107,12 @@ export default function App() {
         }));
     };
 
-    // 加载 OD versions（一次）
+    // 加载 OD versions（一次，逐页取全）
     useEffect(() => {
         let cancelled = false;
         (async () => {
             try {
-                const response: ODVersionsResponse = await getODVersions();
+                const response: ODVersionsResponse = await getAllODVersions();
                 if (cancelled) return;
                 setOdVersions(response.rows);
                 if (response.rows.length > 0) setSelectedOdVersion(response.rows[0].od_version_minute);
@@ -174,60 +169,33 @@ export default function App() {
                     if ((switchedPage || scenesData.length === 0) && sceneNames.length > 0) {
                         setScenesData(sceneNames.map((s) => ({ scene_name: s, data: [], loading: true })));
                     }
-                } else {
-                    const resp = await getAllScenes({ platform, eval_module: evalModule });
-                    if (controller.signal.aborted || seq !== requestSeqRef.current) return;
-
-                    sceneNames = (resp.rows ?? []).map((r: any) => r.scene_name).filter(Boolean);
-                    scenesCacheRef.current[cacheKey] = sceneNames;
-                    scenesLoadedRef.current[cacheKey] = true;
-
-                    setPlatformScenes(sceneNames);
-                    setScenesData(sceneNames.map((s) => ({ scene_name: s, data: [], loading: true })));
                 }
 
-                // 2) data
+                // 2) data：场景列表（未缓存时）与数据一次请求取回
                 const baseinfo = { platform, data_fix: "_FK_" as const };
-
-                const resp =
-                    useMultiVersionMode && activeOdVersions.length > 0
-                        ? evalModule === "stopbar_absolute"
-                            ? await getMultiVersionSceneDataSpSummary({
-                                od_versions: activeOdVersions,
-                                baseinfo,
-                                eval_module: evalModule,
-                            })
-                            : evalModule === "advance_detection_absolute"
-                                ? await getMultiVersionSceneDataAdSummary({
-                                    od_versions: activeOdVersions,
-                                    baseinfo,
-                                    eval_module: evalModule,
-                                })
-                                : await getMultiVersionSceneData({
-                                    od_versions: activeOdVersions,
-                                    baseinfo,
-                                    eval_module: evalModule,
-                                })
-                        : evalModule === "stopbar_absolute"
-                            ? await getSceneDataSpSummary({
-                                od_version: "latest",
-                                baseinfo,
-                                eval_module: evalModule,
-                            })
-                            : evalModule === "advance_detection_absolute"
-                                ? await getSceneDataAdSummary({
-                                    od_version: "latest",
-                                    baseinfo,
-                                    eval_module: evalModule,
-                                })
-                                : await getSceneData({
-                                    od_version: "latest",
-                                    baseinfo,
-                                    eval_module: evalModule,
-                                });
+                const dataPart: SceneBundlePart =
+                    evalModule === "stopbar_absolute"
+                        ? "sp_summary"
+                        : evalModule === "advance_detection_absolute"
+                            ? "ad_summary"
+                            : "detail";
+
+                const bundle = await getSceneBundle({
+                    parts: cachedLoaded ? [dataPart] : ["scenes", dataPart],
+                    od_versions: useMultiVersionMode ? activeOdVersions : [],
+                    baseinfo,
+                });
 
                 if (controller.signal.aborted || seq !== requestSeqRef.current) return;
 
+                if (!cachedLoaded) {
+                    sceneNames = (bundle.scenes?.rows ?? []).map((r: any) => r.scene_name).filter(Boolean);
+                    scenesCacheRef.current[cacheKey] = sceneNames;
+                    scenesLoadedRef.current[cacheKey] = true;
+                    setPlatformScenes(sceneNames);
+                }
+
+                const resp = bundle[dataPart] ?? { rows: [] };
                 const rows = resp.rows ?? [];
                 setAllSceneData(rows);
 
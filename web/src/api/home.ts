@@ -3,6 +3,7 @@
  */
 
 import { postJSON, getJSON, type BaseInfo } from "./common";
+import { decodeColumnar, postColumnarRows, type ColumnarPayload } from "./query";
 
 export interface HomeSeriesRequest {
   od_version: string;
@@ -29,6 +30,22 @@ export interface HomeAPIResponse {
 export interface ODVersionItem {
   od_version_minute: string;
   od_time_minute: string;
+  /** 出现过该版本的平台 */
+  platforms?: string[];
+  /** 有数据的表，如 stop_bar_detail / stop_bar_summary */
+  tables?: string[];
+  scene_count?: number;
+  imported_at?: string;
+}
+
+export interface ODVersionsQuery {
+  platforms?: string[];
+  /** 只返回该时间（UTC）之后的版本，如 2026-01-08_22:09 */
+  since?: string;
+  /** 上一页最后一行的 od_version_minute */
+  after?: string;
+  /** 每页行数，默认 200；返回行数小于 limit 表示没有更多 */
+  limit?: number;
 }
 
 export interface ODVersionsResponse {
@@ -47,6 +64,8 @@ export interface AllScenesResponse {
 
 export interface SceneDataRequest {
   od_version: string;
+  /** 每个场景取最近几个 run，默认 5，最大 20 */
+  num?: number;
   baseinfo: BaseInfo;
   /** 评测模块：stopbar_pr / advance_detection_pr / stopbar_absolute / advance_detection_absolute / perception_pr */
   eval_module?: string;
@@ -70,8 +89,33 @@ export interface MultiVersionSceneDataResponse {
 /**
  * 获取OD版本列表
  */
-export function getODVersions(): Promise<ODVersionsResponse> {
-  return getJSON<ODVersionsResponse>(`/api/home/od_versions`);
+export function getODVersions(query: ODVersionsQuery = {}): Promise<ODVersionsResponse> {
+  const qs = new URLSearchParams();
+  for (const p of query.platforms ?? []) qs.append("platforms", p);
+  if (query.since) qs.set("since", query.since);
+  if (query.after) qs.set("after", query.after);
+  if (query.limit) qs.set("limit", String(query.limit));
+  const s = qs.toString();
+  return getJSON<ODVersionsResponse>(`/api/home/od_versions${s ? `?${s}` : ""}`);
+}
+
+/** getAllODVersions 每页取的行数（接口上限 1000） */
+const OD_VERSIONS_FETCH_PAGE_SIZE = 1000;
+
+/**
+ * 获取全部OD版本：按 after 逐页拉取，直到某页不满 limit
+ */
+export async function getAllODVersions(query: Omit<ODVersionsQuery, "after" | "limit"> = {}): Promise<ODVersionsResponse> {
+  const rows: ODVersionItem[] = [];
+  let after: string | undefined;
+  for (;;) {
+    const page = await getODVersions({ ...query, after, limit: OD_VERSIONS_FETCH_PAGE_SIZE });
+    const pageRows = page.rows ?? [];
+    rows.push(...pageRows);
+    if (pageRows.length < OD_VERSIONS_FETCH_PAGE_SIZE) break;
+    after = pageRows[pageRows.length - 1].od_version_minute;
+  }
+  return { rows };
 }
 
 /**
@@ -108,14 +152,14 @@ export function getAllScenes(req: AllScenesRequest): Promise<AllScenesResponse>
  * 获取所有场景的数据
  */
 export function getSceneData(req: SceneDataRequest): Promise<SceneDataResponse> {
-  return postJSON<SceneDataResponse>("/api/scene/scene_data", req);
+  return postColumnarRows("/api/scene/scene_data", req);
 }
 
 /**
  * 获取多版本场景数据
  */
 export function getMultiVersionSceneData(req: MultiVersionSceneDataRequest): Promise<MultiVersionSceneDataResponse> {
-  return postJSON<MultiVersionSceneDataResponse>("/api/scene/multi_version_scene_data", req);
+  return postColumnarRows("/api/scene/multi_version_scene_data", req);
 }
 
 
@@ -145,4 +189,46 @@ export function getSceneDataAdSummary(req: SceneDataRequest): Promise<SceneDataR
  */
 export function getMultiVersionSceneDataAdSummary(req: MultiVersionSceneDataRequest): Promise<MultiVersionSceneDataResponse> {
   return postJSON<MultiVersionSceneDataResponse>("/api/scene/multi_version_scene_data_ad_summary", req);
-}
\ No newline at end of file
+}
+
+export type SceneBundlePart = "scenes" | "detail" | "sp_summary" | "ad_summary";
+
+export interface SceneBundleRequest {
+  parts: SceneBundlePart[];
+  /** 为空时取每个场景最近 num 个 run */
+  od_versions?: string[];
+  num?: number;
+  baseinfo: BaseInfo;
+}
+
+export type SceneBundleResponse = Partial<Record<SceneBundlePart, { rows: Record<string, any>[] }>>;
+
+/**
+ * 一次请求获取场景列表与各类场景数据（数据部分为列式，这里还原为 rows）
+ */
+export async function getSceneBundle(req: SceneBundleRequest): Promise<SceneBundleResponse> {
+  const resp = await postJSON<Record<string, any>>("/api/scene/bundle?format=columnar", req);
+  const out: SceneBundleResponse = {};
+  for (const part of req.parts) {
+    const v = resp[part];
+    if (!v) continue;
+    out[part] = v.format === "columnar" ? { rows: decodeColumnar(v as ColumnarPayload) } : v;
+  }
+  return out;
+}
+
+export interface ScenePlatformCompareRequest {
+  platforms?: string[];
+  part?: "detail" | "sp_summary" | "ad_summary";
+  /** 为空时取每个场景最近 num 个 run */
+  od_versions?: string[];
+  num?: number;
+  data_fix?: string;
+}
+
+/**
+ * 多平台对比：各平台的场景数据合并返回，每行带 platform 字段
+ */
+export function getScenePlatformCompare(req: ScenePlatformCompareRequest): Promise<SceneDataResponse> {
+  return postJSON<SceneDataResponse>("/api/scene/platform_compare", req);
+}
@@ -11,14 +11,31 @@ export {
   querySceneDirectionsPR,
   queryDirectionLanesPR,
   getODVersions,
+  getAllODVersions,
   getAllScenes,
+  getScenePlatformCompare,
   type HomeSeriesRequest,
   type SceneDirectionPRRequest,
   type DirectionLanesPRRequest,
   type HomeAPIResponse,
   type ODVersionItem,
   type ODVersionsResponse,
+  type ODVersionsQuery,
+  type ScenePlatformCompareRequest,
 } from "./home";
 
 // 导出详情查询 API
-export { queryDetail } from "./query";
+export { queryDetail, decodeColumnar, postColumnarRows, type ColumnarPayload } from "./query";
+
+// 导出数据导入任务 API
+export {
+  createImportJob,
+  getImportJob,
+  retryImportJob,
+  watchImportJob,
+  type ImportJobRequest,
+  type ImportJob,
+  type ImportJobStatus,
+  type ImportJobStage,
+  type ImportJobStageProgress,
+} from "./selftest";
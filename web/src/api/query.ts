@@ -10,4 +10,46 @@ import { postJSON } from "./common";
  */
 export function queryDetail(req: DetailRequest): Promise<DetailResponse> {
   return postJSON<DetailResponse>("/api/detail", req);
-}
\ No newline at end of file
+}
+
+/**
+ * 列式结果（?format=columnar）：每列一个数组，字符串列为字典下标
+ */
+export interface ColumnarPayload {
+  format: "columnar";
+  length: number;
+  columns: string[];
+  data: Record<string, any[]>;
+  dicts: Record<string, string[]>;
+}
+
+/**
+ * 列式结果还原为行对象，供现有按行处理的组件使用
+ */
+export function decodeColumnar(payload: ColumnarPayload): Record<string, any>[] {
+  const { length, columns, data, dicts } = payload;
+  const cols = columns.map((name) => {
+    const values = data[name] ?? [];
+    const dict = dicts[name];
+    return { name, values, dict };
+  });
+  const rows: Record<string, any>[] = new Array(length);
+  for (let i = 0; i < length; i++) {
+    const row: Record<string, any> = {};
+    for (const { name, values, dict } of cols) {
+      const v = values[i];
+      row[name] = dict && v !== null && v !== undefined ? dict[v] : v;
+    }
+    rows[i] = row;
+  }
+  return rows;
+}
+
+/**
+ * 以列式格式请求行数据接口，返回 { rows }
+ */
+export async function postColumnarRows(url: string, body: any): Promise<{ rows: Record<string, any>[] }> {
+  const sep = url.includes("?") ? "&" : "?";
+  const payload = await postJSON<ColumnarPayload>(`${url}${sep}format=columnar`, body);
+  return { rows: decodeColumnar(payload) };
+}
@@ -0,0 +1,81 @@
+/**
+ * 自测 / 数据导入相关的 API 接口
+ */
+
+import { postJSON, getJSON } from "./common";
+
+export interface ImportJobRequest {
+  /** trigger 链接，多个用空格 / 逗号 / 换行分隔 */
+  link_str: string;
+  platform: "x86" | "arm";
+  /** 只导入某一类 CSV，如 stop_bar_statistic_with_time；为空时全部导入 */
+  key_str?: string;
+}
+
+export type ImportJobStatus = "queued" | "running" | "succeeded" | "failed";
+export type ImportJobStage = "fetch" | "stage" | "merge";
+
+export interface ImportJobStageProgress {
+  status: "running" | "done" | "failed";
+  /** fetch 阶段：已完成 / 总场景数 */
+  done?: number;
+  total?: number;
+  rows?: number;
+  seconds?: number;
+  rows_per_second?: number;
+  error?: string;
+}
+
+export interface ImportJob {
+  id: number;
+  trigger_urls: string[];
+  platform: string;
+  tables: string[] | null;
+  status: ImportJobStatus;
+  stage: ImportJobStage | null;
+  progress: Partial<Record<ImportJobStage, ImportJobStageProgress>>;
+  od_version: string | null;
+  error: string | null;
+  attempts: number;
+  max_attempts: number;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+  updated_at: string;
+}
+
+/**
+ * 新建导入任务（后台 worker 执行）
+ */
+export function createImportJob(req: ImportJobRequest): Promise<ImportJob> {
+  return postJSON<ImportJob>("/api/selftest/import_jobs", req);
+}
+
+/**
+ * 查询导入任务
+ */
+export function getImportJob(jobId: number): Promise<ImportJob> {
+  return getJSON<ImportJob>(`/api/selftest/import_jobs/${jobId}`);
+}
+
+/**
+ * 重试失败的导入任务
+ */
+export function retryImportJob(jobId: number): Promise<ImportJob> {
+  return postJSON<ImportJob>(`/api/selftest/import_jobs/${jobId}/retry`, {});
+}
+
+/**
+ * 订阅导入任务进度（SSE），任务结束后自动关闭；返回取消订阅的函数
+ */
+export function watchImportJob(jobId: number, onUpdate: (job: ImportJob) => void): () => void {
+  const es = new EventSource(`/api/selftest/import_jobs/${jobId}/events`);
+  es.onmessage = (e) => {
+    const job = JSON.parse(e.data) as ImportJob;
+    onUpdate(job);
+    if (job.status === "succeeded" || job.status === "failed") es.close();
+  };
+  // 任务已被删除，服务端关闭了流，不要自动重连
+  es.addEventListener("gone", () => es.close());
+  return () => es.close();
+}
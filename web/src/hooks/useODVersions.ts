@@ -1,6 +1,6 @@
 import { useEffect, useState } from "react";
 import type { ODVersionItem, ODVersionsResponse } from "../api";
-import { getODVersions } from "../api/home";
+import { getAllODVersions } from "../api/home";
 
 export function useODVersions() {
   const [odVersions, setOdVersions] = useState<ODVersionItem[]>([]);
@@ -13,7 +13,7 @@ export function useODVersions() {
       setLoading(true);
       setError(undefined);
       try {
-        const resp: ODVersionsResponse = await getODVersions();
+        const resp: ODVersionsResponse = await getAllODVersions();
         if (cancelled) return;
         setOdVersions(resp.rows ?? []);
       } catch (e: any) {
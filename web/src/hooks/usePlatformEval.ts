@@ -1,12 +1,6 @@
 import { useEffect, useMemo, useState } from "react";
 import type { Platform, SceneData } from "../types/eval";
-import {
-  getAllScenes,
-  getSceneData,
-  getMultiVersionSceneData,
-  getSceneDataSpSummary,
-  getMultiVersionSceneDataSpSummary,
-} from "../api/home";
+import { getSceneBundle } from "../api/home";
 
 export function usePlatformEval(params: {
   platform: Platform;
@@ -32,42 +26,23 @@ export function usePlatformEval(params: {
       setErrorScenes(undefined);
 
       try {
-        // 1) scenes list
-        const sceneResp = await getAllScenes({ platform, eval_module: evalModule });
-        const sceneNames = (sceneResp.rows ?? [])
+        // 场景列表 + 数据一次请求取回
+        const isStopbarAbsolute = evalModule === "stopbar_absolute";
+        const dataPart = isStopbarAbsolute ? "sp_summary" : "detail";
+        const bundle = await getSceneBundle({
+          parts: ["scenes", dataPart],
+          od_versions: useMultiVersionMode && selectedOdVersions.length > 0 ? selectedOdVersions : [],
+          baseinfo: { platform, data_fix: "_FK_" },
+        });
+        const sceneNames = (bundle.scenes?.rows ?? [])
           .map((r: any) => r.scene_name)
           .filter(Boolean);
+        const dataResp = bundle[dataPart] ?? { rows: [] };
 
         if (cancelled) return;
 
         setPlatformScenes(sceneNames);
 
-        // 先把卡片置为 loading
-        setScenesData(
-          sceneNames.map((name: string) => ({
-            scene_name: name,
-            data: [],
-            loading: true,
-          }))
-        );
-
-        // 2) data rows
-        const isStopbarAbsolute = evalModule === "stopbar_absolute";
-        const dataResp =
-          useMultiVersionMode && selectedOdVersions.length > 0
-            ? await (isStopbarAbsolute ? getMultiVersionSceneDataSpSummary : getMultiVersionSceneData)({
-                od_versions: selectedOdVersions,
-                baseinfo: { platform, data_fix: "_FK_" },
-                eval_module: evalModule, // 传递 eval_module 参数
-              })
-            : await (isStopbarAbsolute ? getSceneDataSpSummary : getSceneData)({
-                od_version: "latest",
-                baseinfo: { platform, data_fix: "_FK_" },
-                eval_module: evalModule, // 传递 eval_module 参数
-              });
-
-        if (cancelled) return;
-
         const rows = dataResp.rows ?? [];
         setAllSceneData(rows);
 
@@ -1,6 +1,7 @@
 import React, { useEffect, useMemo, useState } from "react";
 import type { ODVersionItem } from "../api";
 import { getAllScenes } from "../api/home";
+import { createImportJob, watchImportJob, type ImportJob } from "../api/selftest";
 import SelfTestConfigForm from "../components/selftest/SelfTestConfigForm";
 import ImportDataModal from "../components/selftest/ImportDataModal";
 
@@ -22,6 +23,9 @@ export default function SelfTestPage(props: { odVersions: ODVersionItem[] }) {
     const [triggerLink, setTriggerLink] = useState("");
     const [importPlatform, setImportPlatform] = useState<"" | "arm" | "x86">("");
     const [appData, setAppData] = useState("");
+    // 最近一次提交的导入任务及其进度
+    const [importJob, setImportJob] = useState<ImportJob | null>(null);
+    const [importError, setImportError] = useState("");
 
     // ====== 拉取 scenes：平台变化时重新拉取 ======
     useEffect(() => {
@@ -54,15 +58,24 @@ export default function SelfTestPage(props: { odVersions: ODVersionItem[] }) {
         };
     }, [platform]);
 
+    // ====== 订阅导入任务进度：任务结束或页面卸载时取消 ======
+    const importJobId = importJob?.id;
+    useEffect(() => {
+        if (importJobId === undefined) return;
+        return watchImportJob(importJobId, setImportJob);
+    }, [importJobId]);
+
     // ====== 事件 ======
     const handleImportConfirm = () => {
-        // 这里接入你后续真正的导入逻辑（现在保留日志）
-        console.log("Trigger Link:", triggerLink);
-        console.log("导入平台:", importPlatform);
-        console.log("应用数据:", appData);
+        if (!importPlatform) return;
+        // 导入在后台 worker 里执行，这里只建任务
+        setImportError("");
+        createImportJob({ link_str: triggerLink, platform: importPlatform, key_str: appData || undefined })
+            .then(setImportJob)
+            .catch((e) => setImportError(String(e)));
 
         // ✅（推荐）导入平台可同步给自测平台，省得用户再选
-        if (importPlatform) setPlatform(importPlatform);
+        setPlatform(importPlatform);
 
         setShowImportModal(false);
         setTriggerLink("");
@@ -112,6 +125,27 @@ export default function SelfTestPage(props: { odVersions: ODVersionItem[] }) {
                 onConfirm={handleImportConfirm}
             />
 
+            {(importJob || importError) && (
+                <div style={{ padding: "8px 16px", fontSize: 13, color: importError || importJob?.status === "failed" ? "#c00" : "#333" }}>
+                    {importError ? (
+                        <span>导入任务创建失败：{importError}</span>
+                    ) : importJob ? (
+                        <span>
+                            导入任务 #{importJob.id}：{importJob.status}
+                            {importJob.stage ? `（${importJob.stage}` : ""}
+                            {importJob.stage === "fetch" && importJob.progress.fetch?.total
+                                ? ` ${importJob.progress.fetch.done ?? 0}/${importJob.progress.fetch.total}`
+                                : ""}
+                            {importJob.stage ? "）" : ""}
+                            {importJob.progress.merge?.rows_per_second
+                                ? `，${importJob.progress.merge.rows} 行，${importJob.progress.merge.rows_per_second} 行/秒`
+                                : ""}
+                            {importJob.error ? `，${importJob.error}` : ""}
+                        </span>
+                    ) : null}
+                </div>
+            )}
+
             <div style={{ padding: 16, textAlign: "center", color: "#666" }}>
                 {readyToCompare ? (
                     <div>